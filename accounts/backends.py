@@ -0,0 +1,77 @@
+"""
+Authentication backend that caches the authenticated user.
+
+``AuthenticationMiddleware`` loads ``request.user`` through the backend's
+``get_user()`` on every request. ``CachedModelBackend`` keeps the loaded
+user in the cache so warm requests skip that query; together with the
+cached_db session engine an authenticated request costs no auth queries.
+The signal handlers in ``accounts.signals`` invalidate a user's entry
+whenever the row is saved (profile edits, password changes, theme toggles,
+last_login) or deleted.
+
+Its ``aauthenticate()`` checks the password on the hashing pool from
+``accounts.hashers`` instead of on the event loop.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from . import hashers
+
+
+CACHE_KEY = 'accounts:user:{user_id}'
+# Bounds staleness if a worker's local cache misses an invalidation
+CACHE_TIMEOUT = 300
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def invalidate(*user_ids):
+    """Drop cached users, now and again once the transaction commits"""
+    keys = [_cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() is served from the cache when warm"""
+    
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so an unknown username takes as long as a wrong
+            # password (Django #20760)
+            await hashers.amake_password(password)
+            return None
+        if await hashers.acheck_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+    
+    def get_user(self, user_id):
+        key = _cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, CACHE_TIMEOUT)
+        return user
+    
+    async def aget_user(self, user_id):
+        key = _cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, CACHE_TIMEOUT)
+        return user
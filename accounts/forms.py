@@ -1,7 +1,10 @@
+from asgiref.sync import sync_to_async
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.contrib.auth import authenticate
+from django.contrib.auth import authenticate, aauthenticate
+from django.core.exceptions import ValidationError
 from .models import User, UserProfile
+from . import hashers
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -48,6 +51,13 @@ class CustomUserCreationForm(UserCreationForm):
         if User.objects.filter(email=email).exists():
             raise forms.ValidationError('This email address is already in use.')
         return email
+    
+    async def asave(self):
+        """Save the new user, hashing the password on the hashing pool"""
+        user = self.instance
+        user.password = await hashers.amake_password(self.cleaned_data['password1'])
+        await user.asave()
+        return user
 
 
 class CustomAuthenticationForm(AuthenticationForm):
@@ -85,6 +95,34 @@ class CustomAuthenticationForm(AuthenticationForm):
             except User.DoesNotExist:
                 raise forms.ValidationError('No account found with this email address.')
         return username
+    
+    def clean(self):
+        # ais_valid() authenticates itself once the fields are clean
+        if getattr(self, '_defer_authentication', False):
+            return self.cleaned_data
+        return super().clean()
+    
+    async def ais_valid(self):
+        """
+        is_valid() for async views: the fields are cleaned in a thread and
+        the password is checked on the hashing pool, not the event loop.
+        """
+        self._defer_authentication = True
+        if not await sync_to_async(self.is_valid)():
+            return False
+        self.user_cache = await aauthenticate(
+            self.request,
+            username=self.cleaned_data['username'],
+            password=self.cleaned_data['password'],
+        )
+        try:
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+        except ValidationError as error:
+            self.add_error(None, error)
+            return False
+        return True
 
 
 class UserProfileForm(forms.ModelForm):
@@ -0,0 +1,61 @@
+"""
+Password hashing.
+
+``PBKDF2PasswordHasher`` takes its iteration count from the
+``PBKDF2_ITERATIONS`` setting, which ``manage.py calibrate_hashers`` measures
+for the target login latency. Stored hashes made with a different count are
+re-encoded the next time their owner logs in.
+
+Hashing is CPU-bound and hashlib releases the GIL while it runs. The async
+helpers below run it on a small dedicated thread pool, so a burst of logins
+hashes in parallel and leaves the event loop, and the single thread Django
+uses for sync_to_async calls, free for other requests.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the calibrated iteration count"""
+    
+    @property
+    def iterations(self):
+        return getattr(settings, 'PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+def pool_size():
+    """Threads in the hashing pool"""
+    return getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or min(8, os.cpu_count() or 1)
+
+
+_hashing_executor = ThreadPoolExecutor(max_workers=pool_size(), thread_name_prefix='password-hash')
+
+
+async def _run_in_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hashing_executor, functools.partial(func, *args))
+
+
+async def amake_password(password):
+    """make_password() on the hashing pool"""
+    return await _run_in_pool(hashers.make_password, password)
+
+
+async def acheck_user_password(user, raw_password):
+    """
+    ``user.check_password()`` with the hashing on the pool. If the stored
+    hash uses an outdated hasher or work factor it is replaced and saved.
+    """
+    needs_upgrade = []
+    is_correct = await _run_in_pool(
+        hashers.check_password, raw_password, user.password, needs_upgrade.append,
+    )
+    if is_correct and needs_upgrade:
+        await _run_in_pool(user.set_password, raw_password)
+        await user.asave(update_fields=['password'])
+    return is_correct
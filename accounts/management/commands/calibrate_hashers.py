@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hashers, get_random_string
+from django.core.management.base import BaseCommand
+
+from accounts.hashers import PBKDF2PasswordHasher, pool_size
+
+
+# Attributes that set each hasher's work factor
+WORK_FACTORS = ('iterations', 'time_cost', 'memory_cost', 'parallelism', 'rounds', 'work_factor')
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every configured password hasher on this machine and calibrate "
+        "PBKDF2_ITERATIONS so one password check takes about --target-ms"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help="Time one password check should take")
+        parser.add_argument('--samples', type=int, default=5, help="Hashes timed per measurement")
+    
+    def handle(self, target_ms, samples, **options):
+        self.samples = samples
+        password = get_random_string(16)
+        
+        for hasher in get_hashers():
+            try:
+                if getattr(hasher, 'library', None):
+                    hasher._load_library()
+            except ValueError:
+                library = hasher.library[0] if isinstance(hasher.library, tuple) else hasher.library
+                self.stdout.write(f"{hasher.algorithm:<20} skipped, {library} is not installed")
+                continue
+            factors = ', '.join(
+                f"{name}={getattr(hasher, name)}" for name in WORK_FACTORS if hasattr(hasher, name)
+            )
+            elapsed = self.time_hash(lambda: hasher.encode(password, hasher.salt()))
+            self.stdout.write(f"{hasher.algorithm:<20} {elapsed * 1000:8.1f} ms  {factors}")
+        
+        # PBKDF2 time is linear in the iteration count, so one probe at the
+        # current setting is enough to scale from
+        hasher = PBKDF2PasswordHasher()
+        probe = hasher.iterations
+        elapsed = self.time_hash(lambda: hasher.encode(password, hasher.salt(), probe))
+        iterations = max(10_000, int(round(probe * target_ms / (elapsed * 1000), -4)))
+        calibrated = self.time_hash(lambda: hasher.encode(password, hasher.salt(), iterations))
+        
+        workers = pool_size()
+        self.stdout.write('')
+        self.stdout.write(
+            f"{iterations} iterations take {calibrated * 1000:.1f} ms "
+            f"(currently {probe}, {elapsed * 1000:.1f} ms)"
+        )
+        self.stdout.write(
+            f"With {workers} hashing worker(s) that is about {workers / calibrated:.0f} logins/sec per process"
+        )
+        if iterations < probe // 2:
+            self.stdout.write(self.style.WARNING(
+                "This is well below the configured count; check the target before lowering it"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"PBKDF2_ITERATIONS = {iterations}"))
+    
+    def time_hash(self, func):
+        """Median seconds per call of ``func``"""
+        samples = []
+        for _ in range(self.samples):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
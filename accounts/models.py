@@ -36,6 +36,10 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            # Signup, login by email and profile edits look users up by email
+            models.Index(fields=['email'], name='user_email_idx'),
+        ]
     
     def __str__(self):
         return self.username
@@ -0,0 +1,80 @@
+"""
+User preference updates.
+
+Preferences live on two models: ``User`` (the theme) and ``UserProfile``
+(privacy and D&D settings). ``update_preferences()`` validates a set of
+changes and writes only the columns that changed, so a toggle from one tab
+can't overwrite a profile edit made in another, and a toggle that lands on
+the value already stored costs no write at all. The new state is returned
+from the validated values rather than by reloading the rows.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import User, UserProfile
+
+
+# Preference name -> model it is stored on
+PREFERENCE_FIELDS = {
+    'theme_preference': User,
+    'profile_public': UserProfile,
+    'show_email': UserProfile,
+    'favorite_dnd_edition': UserProfile,
+}
+
+
+def clean_preferences(values):
+    """
+    Validate ``{name: raw value}`` and convert each value to its Python
+    type. Raises ValidationError for unknown names or invalid values.
+    """
+    cleaned = {}
+    for name, raw in values.items():
+        model = PREFERENCE_FIELDS.get(name)
+        if model is None:
+            raise ValidationError(f"Unknown preference: {name}")
+        field = model._meta.get_field(name)
+        if field.get_internal_type() == 'BooleanField' and isinstance(raw, str):
+            # Form posts send checkbox state as text
+            raw = raw.lower() in ('1', 'true', 'on', 'yes')
+        try:
+            cleaned[name] = field.clean(raw, None)
+        except ValidationError as error:
+            raise ValidationError({name: error.messages})
+    return cleaned
+
+
+def get_preferences(user):
+    """The current value of every preference for ``user``"""
+    preferences = {name: getattr(user, name) for name, model in PREFERENCE_FIELDS.items() if model is User}
+    profile_fields = [name for name, model in PREFERENCE_FIELDS.items() if model is UserProfile]
+    profile = UserProfile.objects.filter(user=user).values(*profile_fields).first()
+    if profile is None:
+        profile = {name: UserProfile._meta.get_field(name).get_default() for name in profile_fields}
+    preferences.update(profile)
+    return preferences
+
+
+def update_preferences(user, values):
+    """
+    Apply ``{name: value}`` to ``user`` and its profile, writing only the
+    changed columns. Returns the cleaned values that are now stored.
+    """
+    cleaned = clean_preferences(values)
+    user_changes = {
+        name: value for name, value in cleaned.items()
+        if PREFERENCE_FIELDS[name] is User and getattr(user, name) != value
+    }
+    profile_changes = {name: value for name, value in cleaned.items() if PREFERENCE_FIELDS[name] is UserProfile}
+    
+    with transaction.atomic():
+        if user_changes:
+            for name, value in user_changes.items():
+                setattr(user, name, value)
+            # update_fields keeps the write to these columns and still sends
+            # post_save, which drops the cached user
+            user.save(update_fields=list(user_changes))
+        if profile_changes:
+            if not UserProfile.objects.filter(user=user).update(**profile_changes):
+                UserProfile.objects.create(user=user, **profile_changes)
+    return cleaned
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core import fragments
+
+from . import backends
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user(sender, instance, update_fields=None, **kwargs):
+    backends.invalidate(instance.pk)
+    # World cards show their owner's username; last_login and preference
+    # saves name their fields and leave the cards alone
+    if update_fields is None or 'username' in update_fields:
+        fragments.bump(User, instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    backends.invalidate(instance.pk)
+    fragments.bump(User, instance.pk)
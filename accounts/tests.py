@@ -1,3 +1,240 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher
+from django.conf import settings
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import changes, search
+from core.access import WorldAccess
+from core.models import World, WorldUser, Category, Entry, WorldChange
+
+from .hashers import PBKDF2PasswordHasher
+from .models import User, UserProfile
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedAuthenticationTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', password='old-password')
+        self.client.force_login(self.user)
+        self.settings_url = reverse('accounts:profile_settings')
+    
+    def test_warm_requests_run_no_auth_queries(self):
+        # dashboard_redirect runs no queries of its own
+        url = reverse('accounts:dashboard_redirect')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(queries), 0)
+    
+    def test_saving_the_user_refreshes_the_cached_copy(self):
+        self.client.get(self.settings_url)
+        User.objects.filter(pk=self.user.pk).update(theme_preference='light')
+        self.assertEqual(self.client.get(self.settings_url).context['user'].theme_preference, 'dark')
+        
+        user = User.objects.get(pk=self.user.pk)
+        user.save()
+        self.assertEqual(self.client.get(self.settings_url).context['user'].theme_preference, 'light')
+    
+    def test_password_change_ends_other_sessions(self):
+        other = Client()
+        other.force_login(self.user)
+        self.assertEqual(other.get(self.settings_url).status_code, 200)
+        
+        self.client.post(reverse('accounts:password_change'), {
+            'current_password': 'old-password',
+            'new_password1': 'new-password',
+            'new_password2': 'new-password',
+        })
+        self.assertRedirects(other.get(self.settings_url), f"{reverse('accounts:login')}?next={self.settings_url}")
+    
+    def test_deleted_account_is_not_served_from_cache(self):
+        other = Client()
+        other.force_login(self.user)
+        self.assertEqual(other.get(self.settings_url).status_code, 200)
+        
+        self.client.post(reverse('accounts:delete_account'), {'confirm_delete': 'DELETE'})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(other.get(self.settings_url).status_code, 302)
+    
+    def test_production_requires_a_shared_cache(self):
+        # Sessions and cached users are only invalidated in the cache that saw the change
+        def load_settings(**env):
+            environ = {key: value for key, value in os.environ.items() if not key.startswith('DJANGO_CACHE_')}
+            return subprocess.run(
+                [sys.executable, '-c', 'import plot_hook_backend.settings'],
+                cwd=settings.BASE_DIR, env={**environ, 'DJANGO_DEBUG': '0', **env}, capture_output=True, text=True,
+            )
+        
+        self.assertIn("DJANGO_CACHE_BACKEND", load_settings().stderr)
+        shared = load_settings(DJANGO_CACHE_BACKEND='django.core.cache.backends.filebased.FileBasedCache', DJANGO_CACHE_LOCATION='/tmp/plot-hook-cache')
+        self.assertEqual(shared.returncode, 0, shared.stderr)
+
+
+class PreferenceTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+    
+    def post_preferences(self, data):
+        return self.client.post(reverse('accounts:preferences'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    
+    def test_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_preferences({'theme_preference': 'light', 'show_email': 'true'})
+        self.assertEqual(response.json()['preferences'], {'theme_preference': 'light', 'show_email': True})
+        
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        user_update = next(sql for sql in updates if 'accounts_user' in sql)
+        self.assertIn('"theme_preference"', user_update)
+        self.assertNotIn('"password"', user_update)
+        self.assertNotIn('"bio"', user_update)
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.theme_preference, 'light')
+        self.assertTrue(self.user.profile.show_email)
+    
+    def test_repeated_toggle_to_the_same_theme_skips_the_write(self):
+        self.client.post(reverse('accounts:toggle_theme'), {'theme': 'light'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('accounts:toggle_theme'), {'theme': 'light'})
+        self.assertEqual(response.json()['theme'], 'light')
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+    
+    def test_rejects_unknown_and_invalid_preferences(self):
+        self.assertEqual(self.post_preferences({'is_staff': 'true'}).status_code, 400)
+        self.assertEqual(self.post_preferences({'theme_preference': 'neon'}).status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_staff)
+    
+    def test_settings_form_post_redirects_back(self):
+        response = self.client.post(reverse('accounts:preferences'), {
+            'favorite_dnd_edition': '5e', 'profile_public': 'false',
+        })
+        self.assertRedirects(response, reverse('accounts:profile_settings'))
+        self.assertEqual(
+            UserProfile.objects.values_list('favorite_dnd_edition', 'profile_public').get(user=self.user),
+            ('5e', False),
+        )
+
+
+@override_settings(PBKDF2_ITERATIONS=1000)
+class LoginTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', password='correct-horse')
+        self.login_url = reverse('accounts:login')
+    
+    def login(self, username='dm', password='correct-horse', **extra):
+        return self.client.post(self.login_url, {'username': username, 'password': password, **extra})
+    
+    def test_login_by_username_or_email(self):
+        self.assertRedirects(self.login(), reverse('core:dashboard'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+        self.assertTrue(self.client.session.get_expire_at_browser_close())
+        
+        self.client.logout()
+        self.assertRedirects(
+            self.login('dm@example.com', remember_me='on'), reverse('core:dashboard'), fetch_redirect_response=False,
+        )
+        self.assertFalse(self.client.session.get_expire_at_browser_close())
+    
+    def test_wrong_password_shows_the_form_again(self):
+        response = self.login(password='wrong')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertEqual(self.login('nobody').status_code, 200)
+    
+    def test_outdated_hashes_are_upgraded_on_login(self):
+        for encoded in (
+            PBKDF2PasswordHasher().encode('correct-horse', 'saltsalt', iterations=500),
+            PBKDF2SHA1PasswordHasher().encode('correct-horse', 'saltsalt', iterations=500),
+        ):
+            User.objects.filter(pk=self.user.pk).update(password=encoded)
+            self.client.logout()
+            self.assertEqual(self.login().status_code, 302)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+            self.assertTrue(self.user.check_password('correct-horse'))
+    
+    def test_signup_hashes_with_the_calibrated_hasher(self):
+        response = self.client.post(reverse('accounts:signup'), {
+            'username': 'player', 'email': 'player@example.com',
+            'password1': 'a-long-passphrase', 'password2': 'a-long-passphrase',
+        })
+        self.assertRedirects(response, self.login_url)
+        player = User.objects.get(username='player')
+        self.assertTrue(player.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(UserProfile.objects.filter(user=player).exists())
+        self.assertEqual(self.login('player', 'a-long-passphrase').status_code, 302)
+
+
+class ProfileTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', bio="Runs the table")
+        self.profile = UserProfile.objects.create(user=self.user, discord_username='dm#1234')
+    
+    def test_own_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertContains(response, "Runs the table")
+        self.assertContains(response, 'dm@example.com')
+    
+    def test_public_profile_respects_privacy_settings(self):
+        url = reverse('accounts:public_profile', args=[self.user.username])
+        response = self.client.get(url)
+        self.assertContains(response, 'dm#1234')
+        self.assertNotContains(response, 'dm@example.com')
+        
+        UserProfile.objects.filter(pk=self.profile.pk).update(profile_public=False)
+        self.assertRedirects(self.client.get(url), reverse('core:landing'))
+
+
+class AccountDeletionTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.other = User.objects.create_user(username='other', email='other@example.com')
+        self.client.force_login(self.user)
+    
+    def test_owned_worlds_go_and_joined_worlds_lose_a_member(self):
+        owned = World.objects.create(name="Atlas", owner=self.user)
+        WorldUser.objects.create(world=owned, user=self.other, role='player')
+        parent = Category.objects.create(world=owned, name="Coast")
+        Category.objects.create(world=owned, parent=parent, name="Harbour")
+        entry = Entry.objects.create(world=owned, category=parent, author=self.other, title="Harbour master")
+        joined = World.objects.create(name="Elsewhere", owner=self.other)
+        membership = WorldUser.objects.create(world=joined, user=self.user, role='player')
+        self.assertEqual(WorldAccess(self.other).world_ids(), sorted([owned.id, joined.id]))
+        
+        response = self.client.post(reverse('accounts:delete_account'), {'confirm_delete': 'DELETE'})
+        self.assertRedirects(response, reverse('core:landing'), fetch_redirect_response=False)
+        self.assertFalse(World.objects.filter(pk=owned.pk).exists())
+        self.assertFalse(Category.objects.filter(world_id=owned.pk).exists())
+        self.assertFalse(Entry.objects.filter(pk=entry.pk).exists())
+        self.assertFalse(WorldUser.objects.filter(world_id__in=[owned.pk, joined.pk]).exists())
+        self.assertEqual(World.objects.get(pk=joined.pk).member_count, 0)
+        self.assertEqual(WorldAccess(self.other).world_ids(), [joined.id])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.INDEX_TABLE} WHERE world_id = %s", [owned.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(
+            set(WorldChange.objects.filter(action=changes.DELETE).values_list('kind', 'object_id', 'user_id')),
+            {
+                (changes.WORLD, owned.id, self.user.id),
+                (changes.WORLD, owned.id, self.other.id),
+                (changes.MEMBERSHIP, membership.id, self.user.id),
+            },
+        )
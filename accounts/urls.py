@@ -5,8 +5,8 @@ app_name = 'accounts'
 
 urlpatterns = [
     # Authentication
-    path('signup/', views.SignUpView.as_view(), name='signup'),
-    path('login/', views.CustomLoginView.as_view(), name='login'),
+    path('signup/', views.signup_view, name='signup'),
+    path('login/', views.login_view, name='login'),
     path('logout/', views.CustomLogoutView.as_view(), name='logout'),
     
     # Profile management
@@ -21,6 +21,7 @@ urlpatterns = [
     
     # AJAX endpoints
     path('toggle-theme/', views.toggle_theme, name='toggle_theme'),
+    path('preferences/', views.update_preferences, name='preferences'),
     
     # Redirects
     path('dashboard/', views.dashboard_redirect, name='dashboard_redirect'),
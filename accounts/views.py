@@ -1,57 +1,70 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout, authenticate, alogin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.contrib.auth.views import LoginView, LogoutView
+from django.contrib.auth.views import LogoutView
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, UpdateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
 from django.http import JsonResponse
+from django.core.exceptions import ValidationError
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import never_cache
+from django.views.decorators.debug import sensitive_post_parameters
+from asgiref.sync import sync_to_async
+
+from core.db_routers import read_only
+from core.deletion import delete_owned_worlds
 
 from .forms import (
     CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm,
     ExtendedProfileForm, PasswordChangeForm
 )
 from .models import User, UserProfile
+from . import preferences
 
 
-class SignUpView(CreateView):
+@sensitive_post_parameters()
+@never_cache
+async def signup_view(request):
     """User registration view"""
-    form_class = CustomUserCreationForm
-    template_name = 'accounts/signup.html'
-    success_url = reverse_lazy('accounts:login')
-    
-    def form_valid(self, form):
-        response = super().form_valid(form)
-        
-        # Create user profile
-        UserProfile.objects.create(user=self.object)
-        
-        messages.success(
-            self.request,
-            'Account created successfully! Please log in to continue.'
-        )
-        return response
+    if request.method == 'POST':
+        form = CustomUserCreationForm(request.POST)
+        # Field validation queries the database; the password is hashed on
+        # the hashing pool by asave()
+        if await sync_to_async(form.is_valid)():
+            user = await form.asave()
+            
+            # Create user profile
+            await UserProfile.objects.acreate(user=user)
+            
+            messages.success(
+                request,
+                'Account created successfully! Please log in to continue.'
+            )
+            return redirect('accounts:login')
+    else:
+        form = CustomUserCreationForm()
+    return await sync_to_async(render)(request, 'accounts/signup.html', {'form': form})
 
 
-class CustomLoginView(LoginView):
-    """Custom login view"""
-    form_class = CustomAuthenticationForm
-    template_name = 'accounts/login.html'
-    
-    def form_valid(self, form):
-        remember_me = form.cleaned_data.get('remember_me')
-        if not remember_me:
-            # Set session to expire when browser closes
-            self.request.session.set_expiry(0)
-        
-        return super().form_valid(form)
-    
-    def get_success_url(self):
-        return reverse_lazy('core:dashboard')
+@sensitive_post_parameters()
+@never_cache
+async def login_view(request):
+    """Log in with a username or email, checking the password off the event loop"""
+    if request.method == 'POST':
+        form = CustomAuthenticationForm(request, data=request.POST)
+        if await form.ais_valid():
+            await alogin(request, form.get_user())
+            if not form.cleaned_data.get('remember_me'):
+                # Set session to expire when browser closes
+                await request.session.aset_expiry(0)
+            return redirect('core:dashboard')
+    else:
+        form = CustomAuthenticationForm(request)
+    return await sync_to_async(render)(request, 'accounts/login.html', {'form': form})
 
 
 class CustomLogoutView(LogoutView):
@@ -64,6 +77,7 @@ class CustomLogoutView(LogoutView):
         return response
 
 
+@read_only
 @login_required
 def profile_view(request):
     """User profile view"""
@@ -86,8 +100,6 @@ def profile_edit(request):
         # Handle simple form from profile settings page
         username = request.POST.get('username')
         email = request.POST.get('email')
-        first_name = request.POST.get('first_name', '')
-        last_name = request.POST.get('last_name', '')
         
         # Basic validation
         if username and email:
@@ -101,12 +113,14 @@ def profile_edit(request):
                 messages.error(request, 'Email is already taken.')
                 return redirect('accounts:profile_settings')
             
-            # Update user information
-            user.username = username
-            user.email = email
-            user.first_name = first_name
-            user.last_name = last_name
-            user.save()
+            # Update user information, writing only the columns that changed
+            # (User has no first_name/last_name columns)
+            changes = {'username': username, 'email': email}
+            changed_fields = [name for name, value in changes.items() if getattr(user, name) != value]
+            for name in changed_fields:
+                setattr(user, name, changes[name])
+            if changed_fields:
+                user.save(update_fields=changed_fields)
             
             messages.success(request, 'Profile updated successfully!')
             return redirect('accounts:profile_settings')
@@ -147,7 +161,9 @@ def delete_account(request):
         if confirm_delete == 'DELETE':
             user = request.user
             logout(request)
-            user.delete()
+            with transaction.atomic():
+                delete_owned_worlds(user)
+                user.delete()
             messages.success(request, 'Your account has been deleted.')
             return redirect('core:landing')
         else:
@@ -158,6 +174,7 @@ def delete_account(request):
     return redirect('accounts:profile_settings')
 
 
+@read_only
 def public_profile(request, username):
     """Public profile view for other users"""
     user = get_object_or_404(User, username=username)
@@ -178,34 +195,70 @@ def public_profile(request, username):
 @login_required
 @require_POST
 @csrf_exempt
-def toggle_theme(request):
-    """Toggle user theme preference"""
-    user = request.user
-    current_theme = user.theme_preference
+async def toggle_theme(request):
+    """Toggle user theme preference, or set it to the posted ``theme``"""
+    user = await request.auser()
+    # Clients that debounce clicks post the theme they ended on; setting it
+    # is idempotent, so a burst of toggles costs at most one write
+    theme = request.POST.get('theme') or ('light' if user.theme_preference == 'dark' else 'dark')
     
-    if current_theme == 'dark':
-        user.theme_preference = 'light'
-    else:
-        user.theme_preference = 'dark'
-    
-    user.save()
+    try:
+        updated = await sync_to_async(preferences.update_preferences)(user, {'theme_preference': theme})
+    except ValidationError as error:
+        return JsonResponse({
+            'success': False,
+            'error': ' '.join(error.messages)
+        }, status=400)
     
     return JsonResponse({
         'success': True,
-        'theme': user.theme_preference
+        'theme': updated['theme_preference']
     })
 
 
+@login_required
+@require_POST
+async def update_preferences(request):
+    """Update theme, privacy and D&D preferences from AJAX or the settings form"""
+    user = await request.auser()
+    values = {name: value for name, value in request.POST.items() if name != 'csrfmiddlewaretoken'}
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    
+    try:
+        updated = await sync_to_async(preferences.update_preferences)(user, values)
+    except ValidationError as error:
+        if is_ajax:
+            return JsonResponse({
+                'success': False,
+                'error': ' '.join(error.messages)
+            }, status=400)
+        for message in error.messages:
+            messages.error(request, message)
+        return redirect('accounts:profile_settings')
+    
+    if is_ajax:
+        return JsonResponse({
+            'success': True,
+            'preferences': updated
+        })
+    messages.success(request, 'Preferences saved.')
+    return redirect('accounts:profile_settings')
+
+
 @login_required
 def dashboard_redirect(request):
     """Redirect to dashboard after login"""
     return redirect('core:dashboard')
 
 
+@read_only
 @login_required
 def profile_settings(request):
     """Profile settings page"""
     context = {
         'user': request.user,
+        'preferences': preferences.get_preferences(request.user),
+        'theme_choices': User._meta.get_field('theme_preference').choices,
+        'edition_choices': UserProfile._meta.get_field('favorite_dnd_edition').choices,
     }
     return render(request, 'accounts/profile_settings.html', context)
@@ -0,0 +1,131 @@
+"""
+World access resolution.
+
+A user's role in every world they can reach is kept in a membership map,
+``{world_id: role}``, cached per user across requests. ``WorldAccess``
+answers permission questions from that map, so a warm check costs no
+queries. The signal handlers in ``core.signals`` invalidate a user's map
+whenever their ``WorldUser`` rows or the ownership of a world changes.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import World, WorldUser
+
+
+ROLE_OWNER = 'owner'
+AUTHOR_ROLES = (ROLE_OWNER, 'creator', 'co_creator')
+
+CACHE_KEY = 'core:world_access:{user_id}'
+# Bounds staleness if a worker's local cache misses an invalidation
+CACHE_TIMEOUT = 300
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def get_membership_map(user):
+    """Return ``{world_id: role}`` for every world ``user`` owns or belongs to"""
+    key = _cache_key(user.pk)
+    memberships = cache.get(key)
+    if memberships is None:
+        memberships = dict(
+            WorldUser.objects.filter(user=user, world__is_active=True).order_by().values_list('world_id', 'role')
+        )
+        for world_id in World.objects.filter(owner=user, is_active=True).order_by().values_list('id', flat=True):
+            memberships[world_id] = ROLE_OWNER
+        cache.set(key, memberships, CACHE_TIMEOUT)
+    return memberships
+
+
+async def aget_membership_map(user):
+    """Async counterpart of get_membership_map() for async views"""
+    key = _cache_key(user.pk)
+    memberships = await cache.aget(key)
+    if memberships is None:
+        memberships = {
+            world_id: role
+            async for world_id, role in WorldUser.objects.filter(user=user, world__is_active=True).order_by().values_list('world_id', 'role')
+        }
+        async for world_id in World.objects.filter(owner=user, is_active=True).order_by().values_list('id', flat=True):
+            memberships[world_id] = ROLE_OWNER
+        await cache.aset(key, memberships, CACHE_TIMEOUT)
+    return memberships
+
+
+def invalidate(*user_ids):
+    """Drop cached membership maps, now and again once the transaction commits"""
+    keys = [_cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class WorldAccess:
+    """A user's roles across worlds, resolved once per request"""
+    
+    def __init__(self, user):
+        self.user = user
+        self._memberships = None
+    
+    @classmethod
+    def for_request(cls, request):
+        access = getattr(request, '_world_access', None)
+        if access is None or access.user is not request.user:
+            access = cls(request.user)
+            request._world_access = access
+        return access
+    
+    @classmethod
+    async def afor_request(cls, request):
+        """Async counterpart of for_request(); loads the membership map up front"""
+        access = getattr(request, '_world_access', None)
+        if access is None or access._memberships is None:
+            access = await cls.afor_user(await request.auser())
+            request._world_access = access
+        return access
+    
+    @classmethod
+    async def afor_user(cls, user):
+        """A WorldAccess with the user's current membership map loaded"""
+        access = cls(user)
+        access._memberships = await aget_membership_map(user) if user.is_authenticated else {}
+        return access
+    
+    @property
+    def memberships(self):
+        if self._memberships is None:
+            if self.user.is_authenticated:
+                self._memberships = get_membership_map(self.user)
+            else:
+                self._memberships = {}
+        return self._memberships
+    
+    def role(self, world_id):
+        """The user's role in the world, or None without access"""
+        return self.memberships.get(world_id)
+    
+    def can_view(self, world_id):
+        return world_id in self.memberships
+    
+    def is_owner(self, world_id):
+        return self.role(world_id) == ROLE_OWNER
+    
+    def is_member(self, world_id):
+        """Whether the user belongs to the world without owning it"""
+        return self.can_view(world_id) and not self.is_owner(world_id)
+    
+    def can_see_hidden(self, world_id):
+        """Owners, creators and co-creators can see hidden content"""
+        return self.role(world_id) in AUTHOR_ROLES
+    
+    def world_ids(self):
+        return sorted(self.memberships)
+    
+    def owned_world_ids(self):
+        return sorted(world_id for world_id, role in self.memberships.items() if role == ROLE_OWNER)
+    
+    def member_world_ids(self):
+        return sorted(world_id for world_id, role in self.memberships.items() if role != ROLE_OWNER)
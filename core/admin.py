@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import World, WorldUser, Category
+from .models import World, WorldUser, Category, Entry, CrossReference, Media, MediaFile
 
 
 @admin.register(World)
@@ -43,17 +43,18 @@ class WorldUserAdmin(admin.ModelAdmin):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'world', 'parent', 'is_hidden', 'sort_order']
+    list_display = ['name', 'world', 'parent', 'is_hidden', 'rank']
     list_filter = ['is_hidden', 'created_at', 'world']
     search_fields = ['name', 'description', 'world__name']
-    readonly_fields = ['created_at', 'updated_at']
+    # Ranks are set by reordering (core.reordering), not typed in
+    readonly_fields = ['rank', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'description', 'world')
         }),
         ('Organization', {
-            'fields': ('parent', 'sort_order')
+            'fields': ('parent', 'rank')
         }),
         ('Visibility', {
             'fields': ('is_hidden',)
@@ -66,3 +67,65 @@ class CategoryAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('world', 'parent')
+
+
+@admin.register(Entry)
+class EntryAdmin(admin.ModelAdmin):
+    list_display = ['title', 'world', 'category', 'entry_type', 'author', 'is_hidden', 'updated_at']
+    list_filter = ['entry_type', 'is_hidden', 'world']
+    search_fields = ['title', 'summary', 'world__name']
+    raw_id_fields = ['world', 'category', 'parent_entry', 'author']
+    readonly_fields = ['summary', 'content_size', 'created_at', 'updated_at']
+    
+    fieldsets = (
+        ('Basic Information', {
+            'fields': ('title', 'entry_type', 'world', 'author')
+        }),
+        ('Organization', {
+            'fields': ('category', 'parent_entry')
+        }),
+        ('Content', {
+            'fields': ('summary', 'content_size', 'metadata')
+        }),
+        ('Visibility', {
+            'fields': ('is_hidden',)
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('world', 'category', 'author')
+
+
+@admin.register(CrossReference)
+class CrossReferenceAdmin(admin.ModelAdmin):
+    list_display = ['source_entry', 'target_entry', 'reference_type', 'created_at']
+    list_filter = ['reference_type']
+    search_fields = ['source_entry__title', 'target_entry__title', 'context']
+    raw_id_fields = ['source_entry', 'target_entry']
+    readonly_fields = ['created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('source_entry', 'target_entry')
+
+
+@admin.register(Media)
+class MediaAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'world', 'entry', 'mime_type', 'file_size', 'uploaded_by', 'created_at']
+    list_filter = ['mime_type']
+    search_fields = ['filename', 'original_filename', 'world__name']
+    raw_id_fields = ['file', 'world', 'entry', 'uploaded_by']
+    readonly_fields = ['created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('world', 'entry', 'uploaded_by')
+
+
+@admin.register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    list_display = ['digest', 'size', 'ref_count', 'created_at']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'size', 'ref_count', 'created_at']
@@ -0,0 +1,338 @@
+"""
+Static asset build and serving.
+
+``collectstatic`` is the build step. With ``CompressedManifestStaticFilesStorage``
+as the staticfiles storage it minifies JS and CSS, gives every file a
+content-hashed name recorded in ``staticfiles.json`` (which ``{% static %}``
+reads), and writes a gzip copy next to each text asset.
+
+``core.middleware.StaticAssetMiddleware`` then serves STATIC_ROOT through
+``serve()``: the gzip copy when the browser accepts it, and hashed names with
+a one-year immutable Cache-Control so browsers never revalidate them.
+
+The minifiers only remove comments and whitespace. They keep a newline
+wherever dropping it could change how JavaScript inserts semicolons.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from functools import cached_property
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names can change in place, so browsers must revalidate them
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml')
+
+# Tokens after which a ``/`` starts a regular expression rather than a division
+REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+REGEX_PUNCTUATORS = set('(,=:[!&|?{};+-*%<>~^}')
+
+# A newline after these, or before these, can never end a statement
+NEWLINE_NOT_NEEDED_AFTER = set('{([,;:=?&|')
+NEWLINE_NOT_NEEDED_BEFORE = set('}]),.;?:')
+
+
+def _is_word_char(char):
+    return char.isalnum() or char in '_$\\' or ord(char) > 127
+
+
+def _scan_string(source, start):
+    """Index just past the quoted string starting at ``start``"""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if char == '\n':
+            break
+        i += 1
+    raise ValueError(f"Unterminated string at offset {start}")
+
+
+def _scan_template(source, start):
+    """
+    Scan template literal text from ``start``. Returns the index just past
+    the closing backtick or the next ``${``, and whether the literal closed.
+    """
+    i = start
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '`':
+            return i + 1, True
+        if char == '$' and source.startswith('{', i + 1):
+            return i + 2, False
+        i += 1
+    raise ValueError(f"Unterminated template literal at offset {start}")
+
+
+def _scan_regex(source, start):
+    """Index just past the regular expression literal (and flags) at ``start``"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            break
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            while i < len(source) and _is_word_char(source[i]):
+                i += 1
+            return i
+        i += 1
+    raise ValueError(f"Unterminated regular expression at offset {start}")
+
+
+def minify_js(source):
+    """Strip comments and redundant whitespace from JavaScript"""
+    out = []
+    # Brace depth inside each open ``${ ... }`` of a template literal
+    templates = []
+    # Whitespace skipped since the last token: '', ' ' or '\n'
+    gap = ''
+    last = ''
+    
+    def emit(token):
+        nonlocal gap
+        if gap and out:
+            previous, first = out[-1][-1], token[0]
+            if gap == '\n' and previous not in NEWLINE_NOT_NEEDED_AFTER and first not in NEWLINE_NOT_NEEDED_BEFORE:
+                out.append('\n')
+            elif (_is_word_char(previous) and _is_word_char(first)) or (previous in '+-' and first == previous):
+                out.append(' ')
+        gap = ''
+        out.append(token)
+    
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char.isspace():
+            if char == '\n':
+                gap = '\n'
+            elif not gap:
+                gap = ' '
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = len(source) if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end == -1:
+                raise ValueError(f"Unterminated comment at offset {i}")
+            if '\n' in source[i:end]:
+                gap = '\n'
+            elif not gap:
+                gap = ' '
+            i = end + 2
+        elif char in '"\'':
+            end = _scan_string(source, i)
+            emit(source[i:end])
+            last, i = '"', end
+        elif char == '`' or (char == '}' and templates and templates[-1] == 0):
+            if char == '}':
+                templates.pop()
+            end, closed = _scan_template(source, i + 1)
+            emit(source[i:end])
+            if not closed:
+                templates.append(0)
+            last, i = ('"' if closed else '{'), end
+        elif char == '/' and (last == '' or last in REGEX_KEYWORDS or last in REGEX_PUNCTUATORS):
+            end = _scan_regex(source, i)
+            emit(source[i:end])
+            last, i = '"', end
+        elif _is_word_char(char):
+            end = i
+            while end < len(source) and _is_word_char(source[end]):
+                end += 1
+            emit(source[i:end])
+            last, i = source[i:end], end
+        else:
+            if templates and char == '{':
+                templates[-1] += 1
+            elif templates and char == '}':
+                templates[-1] -= 1
+            emit(char)
+            last, i = char, i + 1
+    return ''.join(out) + '\n'
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from CSS"""
+    out = []
+    gap = False
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char.isspace():
+            gap = True
+            i += 1
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end == -1:
+                raise ValueError(f"Unterminated comment at offset {i}")
+            gap = True
+            i = end + 2
+            continue
+        if char in '"\'':
+            end = _scan_string(source, i)
+            token = source[i:end]
+        else:
+            end = i + 1
+            token = char
+        
+        previous = out[-1][-1] if out else ''
+        if token == '}' and previous == ';':
+            out.pop()
+            previous = out[-1][-1] if out else ''
+        # A space is only significant between two values or selector parts;
+        # a space before ':' is kept because it is one in ``a :hover``
+        if gap and out and previous not in '{};,>:' and token not in '{};,>':
+            out.append(' ')
+        gap = False
+        out.append(token)
+        i = end
+    return ''.join(out) + '\n'
+
+
+MINIFIERS = {
+    '.js': minify_js,
+    '.css': minify_css,
+}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that minifies before hashing and gzips after"""
+    
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic hasn't run (development, tests): use source names
+            return name
+        return super().stored_name(name)
+    
+    @cached_property
+    def immutable_names(self):
+        """Every content-hashed name in the manifest"""
+        return frozenset(self.hashed_files.values())
+    
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        
+        # Minify the collected copies in place and hash those instead of
+        # the sources, so the hash covers what is served
+        paths = dict(paths)
+        for name in paths:
+            minify = MINIFIERS.get(posixpath.splitext(name)[1])
+            if minify is None:
+                continue
+            storage, path = paths[name]
+            with storage.open(path) as source_file:
+                source = source_file.read().decode('utf-8')
+            try:
+                minified = minify(source)
+            except ValueError as error:
+                yield name, None, error
+                return
+            self.delete(name)
+            self._save(name, ContentFile(minified.encode('utf-8')))
+            paths[name] = (self, name)
+        
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        
+        self.__dict__.pop('immutable_names', None)
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compressed_name = self.write_gzip(name)
+                if compressed_name:
+                    yield name, compressed_name, True
+    
+    def write_gzip(self, name):
+        """Write ``name``.gz if it is smaller; returns its name or None"""
+        with self.open(name) as original:
+            content = original.read()
+        # mtime=0 keeps the output identical between builds
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        compressed_name = f"{name}.gz"
+        if self.exists(compressed_name):
+            self.delete(compressed_name)
+        if len(compressed) >= len(content):
+            return None
+        self._save(compressed_name, ContentFile(compressed))
+        return compressed_name
+
+
+def _static_prefix():
+    return settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f"/{settings.STATIC_URL}"
+
+
+def serve(request):
+    """
+    Respond to a GET/HEAD for a file in STATIC_ROOT, or return None to let
+    the request through.
+    """
+    prefix = _static_prefix()
+    if request.method not in ('GET', 'HEAD') or not request.path.startswith(prefix):
+        return None
+    name = posixpath.normpath(unquote(request.path[len(prefix):])).lstrip('/')
+    if name.endswith('.gz'):
+        return None
+    try:
+        path = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+    
+    compressed_path = f"{path}.gz"
+    has_gzip = os.path.isfile(compressed_path)
+    use_gzip = has_gzip and 'gzip' in request.headers.get('Accept-Encoding', '')
+    served_path = compressed_path if use_gzip else path
+    stat = os.stat(served_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(
+            open(served_path, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    if has_gzip:
+        response['Vary'] = 'Accept-Encoding'
+    immutable = name in getattr(staticfiles_storage, 'immutable_names', ())
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response
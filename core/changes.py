@@ -0,0 +1,175 @@
+"""
+The change log clients sync from.
+
+Every create, update and delete of a World, WorldUser or Category appends a
+``WorldChange`` row, from the signal handlers in ``core.signals`` or, for
+bulk writes that send no signals, from the code doing them. A row's id is
+its sequence number, and a client keeps the last one it has seen as its
+cursor.
+
+``changes_since()`` answers ``/api/sync/``: the changes after a cursor in
+the worlds a user can reach, plus the user's own changes, such as leaving a
+world, that they would otherwise lose sight of with their access. The
+changes are resolved against the current rows, so a client gets each
+changed world card and category once, as it is now, or its id to remove.
+
+``compact()`` keeps the log small. It drops every change that a later one
+to the same object supersedes, which no cursor can miss, and then every
+change older than the retention period. Cursors from before the dropped
+range get ``reset`` and must reload.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import World, Category, WorldChange, ChangeLogHorizon
+
+
+WORLD = 'world'
+MEMBERSHIP = 'membership'
+CATEGORY = 'category'
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+SYNC_PAGE_SIZE = 500
+COMPACT_BATCH_SIZE = 1000
+DEFAULT_RETENTION_DAYS = 30
+
+
+def record(kind, world_id, object_id, action, user_id=None):
+    WorldChange.objects.create(kind=kind, world_id=world_id, object_id=object_id, action=action, user_id=user_id)
+
+
+def record_many(kind, action, rows):
+    """Record ``action`` for each (world_id, object_id, user_id) in one statement"""
+    WorldChange.objects.bulk_create([
+        WorldChange(kind=kind, world_id=world_id, object_id=object_id, action=action, user_id=user_id)
+        for world_id, object_id, user_id in rows
+    ], batch_size=COMPACT_BATCH_SIZE)
+
+
+def latest_sequence():
+    """The cursor of a client that is up to date
+    
+    Never behind the horizon, which stays put when compaction empties the
+    log, so a freshly loaded page isn't told to reset.
+    """
+    stored_horizon = ChangeLogHorizon.objects.filter(pk=1).values('sequence')
+    return WorldChange.objects.aggregate(
+        sequence=Greatest(Coalesce(Max('id'), 0), Coalesce(Subquery(stored_horizon), 0)),
+    )['sequence']
+
+
+def horizon():
+    return ChangeLogHorizon.objects.filter(pk=1).values_list('sequence', flat=True).first() or 0
+
+
+def serialize_world(world):
+    return {
+        'id': world.id,
+        'name': world.name,
+        'theme_color': world.theme_color,
+        'role': world.role,
+        'owner': world.owner.username,
+        'member_count': world.member_count,
+        'category_count': world.category_count,
+        'last_activity_at': world.last_activity_at.isoformat(),
+    }
+
+
+CATEGORY_SYNC_FIELDS = ('id', 'world_id', 'parent_id', 'name', 'description', 'rank', 'is_hidden')
+
+
+def changes_since(access, since, page_size=SYNC_PAGE_SIZE):
+    """
+    The changes after cursor ``since`` that the user of a ``WorldAccess``
+    may see, at most ``page_size`` log entries at a time.
+    """
+    if since < horizon():
+        return {'cursor': latest_sequence(), 'reset': True, 'has_more': False,
+                'worlds': [], 'removed_worlds': [], 'categories': [], 'removed_categories': []}
+    
+    world_ids = set(access.world_ids())
+    entries = list(
+        WorldChange.objects.filter(Q(world_id__in=world_ids) | Q(user_id=access.user.pk), id__gt=since)
+        .order_by('id').values_list('id', 'kind', 'world_id', 'object_id', 'action')[:page_size + 1]
+    )
+    has_more = len(entries) > page_size
+    entries = entries[:page_size]
+    
+    touched = set()
+    # Category id -> its last action in this page
+    categories = {}
+    for _, kind, world_id, object_id, action in entries:
+        touched.add(world_id)
+        if kind == CATEGORY and world_id in world_ids:
+            categories[object_id] = action
+    
+    visible = touched & world_ids
+    worlds = []
+    if visible:
+        worlds = [serialize_world(world) for world in World.objects.for_dashboard(access.user).filter(pk__in=visible)]
+    
+    rows = []
+    wanted = [category_id for category_id, action in categories.items() if action != DELETE]
+    if wanted:
+        rows = [
+            row for row in Category.objects.filter(pk__in=wanted, world_id__in=visible).order_by().values(*CATEGORY_SYNC_FIELDS)
+            if not row['is_hidden'] or access.can_see_hidden(row['world_id'])
+        ]
+    present = {row['id'] for row in rows}
+    
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'reset': False,
+        'has_more': has_more,
+        'worlds': worlds,
+        # Deleted, left or no longer shared with the user
+        'removed_worlds': sorted(touched - {world['id'] for world in worlds}),
+        'categories': rows,
+        'removed_categories': sorted(set(categories) - present),
+    }
+
+
+def _superseded_ids(upto):
+    """Ids of changes up to ``upto`` with a later change to the same object for the same audience"""
+    table = WorldChange._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM ("
+            f"SELECT id, ROW_NUMBER() OVER (PARTITION BY kind, object_id, user_id ORDER BY id DESC) AS newer "
+            f"FROM {table}"
+            f") WHERE newer > 1 AND id <= %s",
+            [upto],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def compact(retention_days=DEFAULT_RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Drop superseded changes, then changes older than ``retention_days``, in
+    batches of ``batch_size`` per transaction. Returns how many were dropped.
+    """
+    upto = latest_sequence()
+    superseded = _superseded_ids(upto)
+    for start in range(0, len(superseded), batch_size):
+        with transaction.atomic():
+            WorldChange.objects.filter(pk__in=superseded[start:start + batch_size]).delete()
+    dropped = len(superseded)
+    
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    while True:
+        with transaction.atomic():
+            expired = list(WorldChange.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not expired:
+                break
+            # Move the horizon first, so no client syncs past the gap
+            ChangeLogHorizon.objects.update_or_create(pk=1, defaults={'sequence': expired[-1]})
+            WorldChange.objects.filter(pk__in=expired).delete()
+        dropped += len(expired)
+    return dropped
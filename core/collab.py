@@ -0,0 +1,679 @@
+"""
+Real-time collaborative editing of entry documents over WebSockets.
+
+Clients speak the prosemirror-collab protocol: each keeps the version of the
+document it has seen and submits its unconfirmed steps against that
+version. A broker holds the authoritative step log of every open document
+and accepts a submission only if its version is current. A client whose
+submission is refused is sent the steps it missed with the refusal, rebases
+and resends.
+
+Accepted steps are not sent to sockets one submission at a time. Each
+worker's ``Hub`` buffers them per document and flushes them at most once
+every ``COLLAB_TICK_MS``, so a table of typing players costs each socket
+one message per tick, while a lone typist's steps go out without waiting.
+Cursor and selection updates are coalesced the same way, keeping only each
+client's latest.
+
+The broker is pluggable through ``COLLAB_BROKER``:
+
+- ``LocalBroker`` (the default) keeps logs in this process. It suits a
+  single ASGI worker.
+- ``SocketBroker`` connects every worker to one ``BrokerServer``, which
+  ``manage.py collab_broker`` runs on a Unix socket. Each document then
+  has a single authority however many workers serve it.
+
+Python can't apply Prosemirror steps, so the broker can't rebuild the
+document itself. Editors periodically send a ``snapshot`` of the document
+at a version. The broker then drops the steps before it, and the snapshot
+is saved to the entry. A document's log is forgotten ``DOCUMENT_TTL``
+seconds after its last subscriber leaves.
+
+The broker also numbers a document's clients, so the client IDs attached
+to steps are unique among its editors whichever worker they reached.
+Access is checked again on every client message, so a socket loses edit
+rights, or is closed, once the user's role in the world changes.
+"""
+import asyncio
+import itertools
+import json
+import re
+from collections import defaultdict
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from django.utils.module_loading import import_string
+
+from .access import WorldAccess
+from .models import Entry
+
+
+ENTRY_PATH = re.compile(r'^/ws/entries/(?P<entry_id>\d+)/$')
+
+DEFAULT_BROKER = {'BACKEND': 'core.collab.LocalBroker'}
+DEFAULT_TICK_MS = 16
+DOCUMENT_TTL = 600
+
+MAX_MESSAGE_BYTES = 1024 * 1024
+MAX_STEPS_PER_MESSAGE = 1000
+# A socket this many messages behind is closed; the client reconnects
+MAX_OUTBOX = 256
+
+CLOSE_FORBIDDEN = 4403
+CLOSE_TOO_FAR_BEHIND = 4408
+CLOSE_TOO_LARGE = 1009
+CLOSE_BROKER_LOST = 1012
+
+class DocumentLog:
+    """The authoritative history of one document: a snapshot and the steps after it"""
+    
+    def __init__(self, doc):
+        self.base_version = 0
+        self.doc = doc
+        self.steps = []
+        self.client_ids = []
+        self._next_client_id = itertools.count(1)
+    
+    @property
+    def version(self):
+        return self.base_version + len(self.steps)
+    
+    def append(self, version, steps, client_id):
+        """Accept ``steps`` if ``version`` is current; returns whether they were"""
+        if version != self.version:
+            return False
+        self.steps.extend(steps)
+        self.client_ids.extend([client_id] * len(steps))
+        return True
+    
+    def since(self, version):
+        """Steps after ``version`` as a steps message, or None if they were dropped"""
+        if not self.base_version <= version <= self.version:
+            return None
+        offset = version - self.base_version
+        return {'version': version, 'steps': self.steps[offset:], 'clientIDs': self.client_ids[offset:]}
+    
+    def snapshot(self, version, doc):
+        """Replace the steps up to ``version`` with ``doc``; returns whether it was newer"""
+        if not self.base_version < version <= self.version:
+            return False
+        offset = version - self.base_version
+        del self.steps[:offset]
+        del self.client_ids[:offset]
+        self.base_version = version
+        self.doc = doc
+        return True
+    
+    def state(self):
+        """Everything a joining client needs, as an init message"""
+        return {'doc': self.doc, **self.since(self.base_version)}
+    
+    def join(self):
+        """The init message for a new client, with an ID no other client of the document has"""
+        return {'clientID': next(self._next_client_id), **self.state()}
+
+
+class LocalBroker:
+    """
+    Step authority and pub/sub for the documents of this process.
+    
+    Subscribers are callables taking ``(doc_id, message)``; a message is
+    either accepted steps or ``{'presence': {client_id: selection}}``.
+    """
+    
+    def __init__(self, ttl=DOCUMENT_TTL):
+        self.ttl = ttl
+        self.logs = {}
+        self.subscribers = defaultdict(set)
+        self._expiry = {}
+    
+    async def open(self, doc_id, callback, load):
+        """
+        Subscribe ``callback`` to ``doc_id`` and return the document's state
+        with a new client ID. ``load()`` supplies the document if this broker
+        doesn't hold it.
+        """
+        if doc_id not in self.logs:
+            doc = await load()
+            if doc is None:
+                return None
+            self.logs.setdefault(doc_id, DocumentLog(doc))
+        expiry = self._expiry.pop(doc_id, None)
+        if expiry is not None:
+            expiry.cancel()
+        self.subscribers[doc_id].add(callback)
+        return self.logs[doc_id].join()
+    
+    async def close(self, doc_id, callback):
+        subscribers = self.subscribers[doc_id]
+        subscribers.discard(callback)
+        if not subscribers:
+            del self.subscribers[doc_id]
+            loop = asyncio.get_running_loop()
+            self._expiry[doc_id] = loop.call_later(self.ttl, self._forget, doc_id)
+    
+    def _forget(self, doc_id):
+        self._expiry.pop(doc_id, None)
+        if not self.subscribers.get(doc_id):
+            self.logs.pop(doc_id, None)
+    
+    async def submit(self, doc_id, version, steps, client_id):
+        """Append steps if ``version`` is current; returns (accepted, current version)"""
+        log = self.logs.get(doc_id)
+        if log is None:
+            return False, None
+        if not log.append(version, steps, client_id):
+            return False, log.version
+        self._publish(doc_id, {'version': version, 'steps': steps, 'clientIDs': [client_id] * len(steps)})
+        return True, log.version
+    
+    async def since(self, doc_id, version):
+        log = self.logs.get(doc_id)
+        return log.since(version) if log else None
+    
+    async def snapshot(self, doc_id, version, doc):
+        log = self.logs.get(doc_id)
+        return bool(log and log.snapshot(version, doc))
+    
+    async def publish(self, doc_id, message):
+        """Send an ephemeral message, such as presence, to every subscriber"""
+        self._publish(doc_id, message)
+    
+    def _publish(self, doc_id, message):
+        for callback in list(self.subscribers.get(doc_id, ())):
+            callback(doc_id, message)
+
+
+class BrokerServer:
+    """Serves one LocalBroker to many workers over a Unix socket, one JSON object per line"""
+    
+    def __init__(self, path, ttl=DOCUMENT_TTL):
+        self.path = path
+        self.broker = LocalBroker(ttl)
+        self.server = None
+        self._handlers = {}
+    
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+    
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path, limit=2 * MAX_MESSAGE_BYTES)
+    
+    async def close(self):
+        """Stop listening, hang up on every worker and wait for their handlers"""
+        self.server.close()
+        for writer in self._handlers.values():
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self.server.wait_closed()
+    
+    async def _handle(self, reader, writer):
+        def push(doc_id, message):
+            writer.write(_encode({'event': doc_id, 'message': message}))
+        
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        opened = set()
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                op, doc_id = request['op'], request['doc']
+                if op == 'open':
+                    initial = request.get('initial')
+                    
+                    async def load():
+                        return initial
+                    
+                    result = await self.broker.open(doc_id, push, load)
+                    if result is not None:
+                        opened.add(doc_id)
+                elif op == 'close':
+                    opened.discard(doc_id)
+                    result = await self.broker.close(doc_id, push)
+                elif op == 'submit':
+                    result = await self.broker.submit(doc_id, request['version'], request['steps'], request['client'])
+                elif op == 'since':
+                    result = await self.broker.since(doc_id, request['version'])
+                elif op == 'snapshot':
+                    result = await self.broker.snapshot(doc_id, request['version'], request['snapshot'])
+                elif op == 'publish':
+                    result = await self.broker.publish(doc_id, request['message'])
+                else:
+                    result = None
+                writer.write(_encode({'id': request['id'], 'result': result}))
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError, KeyError):
+            pass
+        finally:
+            for doc_id in opened:
+                await self.broker.close(doc_id, push)
+            writer.close()
+            self._handlers.pop(task, None)
+
+
+class SocketBroker:
+    """A worker's connection to a BrokerServer, with the LocalBroker interface"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.callbacks = {}
+        self._ids = itertools.count(1)
+        self._waiting = {}
+        self._writer = None
+        self._connecting = None
+    
+    async def _connection(self):
+        if self._writer is None:
+            if self._connecting is None:
+                self._connecting = asyncio.ensure_future(self._connect())
+            await self._connecting
+        return self._writer
+    
+    async def _connect(self):
+        reader, writer = await asyncio.open_unix_connection(self.path, limit=2 * MAX_MESSAGE_BYTES)
+        self._writer = writer
+        asyncio.ensure_future(self._read(reader))
+    
+    async def _read(self, reader):
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if 'event' in message:
+                    callback = self.callbacks.get(message['event'])
+                    if callback is not None:
+                        callback(message['event'], message['message'])
+                else:
+                    self._waiting.pop(message['id']).set_result(message['result'])
+        finally:
+            # Fail pending calls and drop the subscriptions; the next call
+            # reconnects and reconnecting clients subscribe again
+            self._writer, self._connecting = None, None
+            for future in self._waiting.values():
+                future.set_exception(ConnectionError("Collaboration broker connection lost"))
+            self._waiting.clear()
+            callbacks, self.callbacks = self.callbacks, {}
+            for doc_id, callback in callbacks.items():
+                callback(doc_id, {'lost': True})
+    
+    async def _call(self, op, doc_id, **args):
+        writer = await self._connection()
+        request_id = next(self._ids)
+        future = self._waiting[request_id] = asyncio.get_running_loop().create_future()
+        writer.write(_encode({'id': request_id, 'op': op, 'doc': doc_id, **args}))
+        await writer.drain()
+        return await future
+    
+    async def open(self, doc_id, callback, load):
+        self.callbacks[doc_id] = callback
+        state = await self._call('open', doc_id)
+        if state is None:
+            # Only load the document when the server doesn't hold it
+            initial = await load()
+            if initial is not None:
+                state = await self._call('open', doc_id, initial=initial)
+        return state
+    
+    async def close(self, doc_id, callback):
+        self.callbacks.pop(doc_id, None)
+        await self._call('close', doc_id)
+    
+    async def submit(self, doc_id, version, steps, client_id):
+        return tuple(await self._call('submit', doc_id, version=version, steps=steps, client=client_id))
+    
+    async def since(self, doc_id, version):
+        return await self._call('since', doc_id, version=version)
+    
+    async def snapshot(self, doc_id, version, doc):
+        return await self._call('snapshot', doc_id, version=version, snapshot=doc)
+    
+    async def publish(self, doc_id, message):
+        await self._call('publish', doc_id, message=message)
+
+
+def _encode(message):
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+class Connection:
+    """One client socket: its identity, the version it has seen and its outbox"""
+    
+    def __init__(self, send, user, entry, can_edit):
+        self.send = send
+        self.user = user
+        self.entry = entry
+        self.can_edit = can_edit
+        self.client_id = None
+        self.version = None
+        self.catching_up = False
+        self.closed = False
+        self.outbox = asyncio.Queue()
+    
+    def push(self, message):
+        if self.closed:
+            return
+        if self.outbox.qsize() >= MAX_OUTBOX:
+            self.close(CLOSE_TOO_FAR_BEHIND)
+            return
+        self.outbox.put_nowait(message)
+    
+    def push_steps(self, message):
+        """Send the part of a steps message this client hasn't seen"""
+        skip = self.version - message['version']
+        if skip < len(message['steps']):
+            self.push({
+                'type': 'steps',
+                'version': self.version,
+                'steps': message['steps'][skip:],
+                'clientIDs': message['clientIDs'][skip:],
+            })
+            self.version = message['version'] + len(message['steps'])
+    
+    def close(self, code):
+        self.closed = True
+        while not self.outbox.empty():
+            self.outbox.get_nowait()
+        self.outbox.put_nowait({'close': code})
+    
+    async def write(self):
+        """Drain the outbox into the socket until the connection closes"""
+        while True:
+            message = await self.outbox.get()
+            if 'close' in message:
+                await self.send({'type': 'websocket.close', 'code': message['close']})
+                return
+            await self.send({'type': 'websocket.send', 'text': json.dumps(message, separators=(',', ':'))})
+
+
+class Channel:
+    """A worker's sockets on one document and what they haven't been sent yet"""
+    
+    def __init__(self):
+        self.connections = set()
+        self.steps = None
+        self.presence = {}
+        self.flush_scheduled = False
+        self.flushed_at = float('-inf')
+
+
+class Hub:
+    """Batches a worker's broker messages per document and flushes them every tick"""
+    
+    def __init__(self, broker, tick=DEFAULT_TICK_MS / 1000):
+        self.broker = broker
+        self.tick = tick
+        self.channels = {}
+    
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'COLLAB_BROKER', DEFAULT_BROKER)
+        broker = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        return cls(broker, getattr(settings, 'COLLAB_TICK_MS', DEFAULT_TICK_MS) / 1000)
+    
+    async def join(self, doc_id, connection, load):
+        """Add ``connection`` to the document; returns its init message or None"""
+        channel = self.channels.setdefault(doc_id, Channel())
+        state = await self.broker.open(doc_id, self.deliver, load)
+        if state is None:
+            if not channel.connections:
+                self.channels.pop(doc_id, None)
+            return None
+        connection.client_id = state['clientID']
+        connection.version = state['version'] + len(state['steps'])
+        channel.connections.add(connection)
+        return state
+    
+    async def leave(self, doc_id, connection):
+        channel = self.channels.get(doc_id)
+        if channel is None or connection not in channel.connections:
+            return
+        channel.connections.discard(connection)
+        await self.broker.publish(doc_id, {'presence': {connection.client_id: None}})
+        # Another socket may have left or joined while that was sent
+        if not channel.connections and self.channels.get(doc_id) is channel:
+            del self.channels[doc_id]
+            await self.broker.close(doc_id, self.deliver)
+    
+    def deliver(self, doc_id, message):
+        """Broker callback: buffer ``message`` until the next flush"""
+        channel = self.channels.get(doc_id)
+        if channel is None:
+            return
+        if 'lost' in message:
+            # The broker forgot this worker; clients must reconnect and resync
+            del self.channels[doc_id]
+            for connection in channel.connections:
+                connection.close(CLOSE_BROKER_LOST)
+            return
+        if 'presence' in message:
+            channel.presence.update(message['presence'])
+        elif channel.steps and channel.steps['version'] + len(channel.steps['steps']) == message['version']:
+            channel.steps['steps'].extend(message['steps'])
+            channel.steps['clientIDs'].extend(message['clientIDs'])
+        else:
+            if channel.steps:
+                self._send_steps(doc_id, channel)
+            channel.steps = {'version': message['version'], 'steps': list(message['steps']), 'clientIDs': list(message['clientIDs'])}
+        if not channel.flush_scheduled:
+            # A quiet document flushes on the next loop iteration; a busy
+            # one at most once per tick
+            channel.flush_scheduled = True
+            loop = asyncio.get_running_loop()
+            loop.call_later(max(0, channel.flushed_at + self.tick - loop.time()), self.flush, doc_id)
+    
+    def flush(self, doc_id):
+        channel = self.channels.get(doc_id)
+        if channel is None:
+            return
+        channel.flush_scheduled = False
+        channel.flushed_at = asyncio.get_running_loop().time()
+        if channel.steps:
+            self._send_steps(doc_id, channel)
+        if channel.presence:
+            presence, channel.presence = channel.presence, {}
+            for connection in channel.connections:
+                connection.push({'type': 'presence', 'clients': presence})
+    
+    def _send_steps(self, doc_id, channel):
+        message, channel.steps = channel.steps, None
+        for connection in channel.connections:
+            if connection.catching_up:
+                continue
+            if connection.version < message['version']:
+                # It missed steps, e.g. ones accepted while it was joining
+                connection.catching_up = True
+                asyncio.ensure_future(self._catch_up(doc_id, connection))
+            else:
+                connection.push_steps(message)
+    
+    async def _catch_up(self, doc_id, connection):
+        try:
+            missed = await self.broker.since(doc_id, connection.version)
+        finally:
+            connection.catching_up = False
+        if missed is None:
+            connection.close(CLOSE_TOO_FAR_BEHIND)
+        else:
+            connection.push_steps(missed)
+
+
+class SocketRequest:
+    """The parts of an HttpRequest that session authentication and WorldAccess read"""
+    
+    def __init__(self, scope):
+        headers = dict(scope.get('headers') or ())
+        cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+        self.session = import_module(settings.SESSION_ENGINE).SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+        self.headers = headers
+    
+    async def auser(self):
+        if not hasattr(self, 'user'):
+            self.user = await auth.aget_user(self)
+        return self.user
+    
+    def is_same_origin(self):
+        """Whether the Host is allowed and the browser's Origin (if sent) matches it"""
+        host = self.headers.get(b'host', b'').decode('latin-1')
+        domain, _ = split_domain_port(host)
+        allowed = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+        if not domain or not validate_host(domain, allowed):
+            return False
+        origin = self.headers.get(b'origin')
+        return origin is None or urlsplit(origin.decode('latin-1')).netloc == host
+
+
+def load_entry_document(entry_id):
+    entry = Entry.objects.filter(pk=entry_id).first()
+    return entry.content if entry else None
+
+
+def save_entry_document(entry_id, document):
+    entry = Entry.objects.for_listing().filter(pk=entry_id).first()
+    if entry is not None:
+        entry.content = document
+        entry.save(update_fields=['updated_at'])
+
+
+class CollabApplication:
+    """ASGI application for ``/ws/entries/<id>/`` collaboration sockets"""
+    
+    def __init__(self, hub=None):
+        self._hub = hub
+    
+    @property
+    def hub(self):
+        if self._hub is None:
+            self._hub = Hub.from_settings()
+        return self._hub
+    
+    async def authorize(self, scope):
+        """(user, entry, can_edit) for an allowed socket, or None"""
+        match = ENTRY_PATH.match(scope['path'])
+        request = SocketRequest(scope)
+        if match is None or not request.is_same_origin():
+            return None
+        entry = await Entry.objects.filter(pk=int(match['entry_id'])).values('id', 'world_id', 'is_hidden').afirst()
+        if entry is None:
+            return None
+        user = await request.auser()
+        can_edit = await self.permission(user, entry)
+        if can_edit is None:
+            return None
+        return user, entry, can_edit
+    
+    async def permission(self, user, entry):
+        """Whether ``user`` can edit ``entry``, or None if they can't open it"""
+        access = await WorldAccess.afor_user(user)
+        can_edit = access.can_see_hidden(entry['world_id'])
+        if not access.can_view(entry['world_id']) or (entry['is_hidden'] and not can_edit):
+            return None
+        return can_edit
+    
+    async def __call__(self, scope, receive, send):
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        authorized = await self.authorize(scope)
+        if authorized is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+            return
+        user, entry, can_edit = authorized
+        entry_id = entry['id']
+        doc_id = f'entry:{entry_id}'
+        
+        async def load():
+            return await sync_to_async(load_entry_document)(entry_id)
+        
+        connection = Connection(send, user, entry, can_edit)
+        state = await self.hub.join(doc_id, connection, load)
+        if state is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+            return
+        # Queued before anything can await, so init precedes every step
+        connection.push({'type': 'init', 'clientID': connection.client_id, 'canEdit': can_edit, **state})
+        writer = None
+        disconnected = False
+        try:
+            await send({'type': 'websocket.accept'})
+            writer = asyncio.ensure_future(connection.write())
+            disconnected = await self.receive_messages(receive, doc_id, entry_id, connection)
+        finally:
+            await self.hub.leave(doc_id, connection)
+            if writer is None or disconnected:
+                connection.closed = True
+                if writer is not None:
+                    writer.cancel()
+            else:
+                if not connection.closed:
+                    connection.close(1000)
+                await writer
+    
+    async def receive_messages(self, receive, doc_id, entry_id, connection):
+        """Handle client messages; returns True if the client disconnected"""
+        while not connection.closed:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                return True
+            text = event.get('text') or (event.get('bytes') or b'').decode('utf-8', 'replace')
+            if len(text) > MAX_MESSAGE_BYTES:
+                connection.close(CLOSE_TOO_LARGE)
+                return False
+            try:
+                message = json.loads(text)
+                kind = message['type']
+            except (ValueError, TypeError, KeyError):
+                connection.push({'type': 'error', 'error': 'Messages must be JSON objects with a type'})
+                continue
+            # Membership may have changed since the socket connected
+            connection.can_edit = await self.permission(connection.user, connection.entry)
+            if connection.can_edit is None:
+                connection.close(CLOSE_FORBIDDEN)
+                return False
+            await self.handle(message, kind, doc_id, entry_id, connection)
+        return False
+    
+    async def handle(self, message, kind, doc_id, entry_id, connection):
+        if kind == 'presence':
+            await self.hub.broker.publish(doc_id, {'presence': {connection.client_id: message.get('selection')}})
+            return
+        if kind not in ('steps', 'snapshot'):
+            connection.push({'type': 'error', 'error': f'Unknown message type: {kind}'})
+            return
+        if not connection.can_edit:
+            connection.push({'type': 'error', 'error': 'You can only view this entry.'})
+            return
+        version = message.get('version')
+        if not isinstance(version, int):
+            connection.push({'type': 'error', 'error': 'version must be an integer'})
+            return
+        
+        if kind == 'steps':
+            steps = message.get('steps')
+            if not isinstance(steps, list) or not 0 < len(steps) <= MAX_STEPS_PER_MESSAGE:
+                connection.push({'type': 'error', 'error': f'steps must be a list of 1 to {MAX_STEPS_PER_MESSAGE}'})
+                return
+            accepted, current = await self.hub.broker.submit(doc_id, version, steps, connection.client_id)
+            if not accepted:
+                # Send the steps it missed now rather than at the next flush,
+                # so the client can rebase and resend straight away
+                missed = await self.hub.broker.since(doc_id, connection.version)
+                if missed is not None:
+                    connection.push_steps(missed)
+                connection.push({'type': 'conflict', 'version': current})
+        else:
+            doc = message.get('doc')
+            if not isinstance(doc, dict) or doc.get('type') != 'doc':
+                connection.push({'type': 'error', 'error': 'doc must be a Prosemirror document'})
+                return
+            if await self.hub.broker.snapshot(doc_id, version, doc):
+                await sync_to_async(save_entry_document)(entry_id, doc)
+
+
+websocket_application = CollabApplication()
@@ -0,0 +1,68 @@
+"""
+Read/write routing between the ``default`` and ``replica`` connections.
+
+Views decorated with ``read_only`` send their reads through the read-only
+``replica`` connection. Everything else, all writes, and any read made
+while ``default`` is inside a transaction stay on ``default`` so a request
+always sees its own uncommitted changes.
+"""
+import contextvars
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+READ_ALIAS = 'replica'
+WRITE_ALIAS = 'default'
+
+_read_only = contextvars.ContextVar('read_only_view', default=False)
+
+
+def read_only(view_func):
+    """Mark a view as read-only so its queries may use the replica"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _view_wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await view_func(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+    else:
+        @wraps(view_func)
+        def _view_wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return view_func(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+    return _view_wrapper
+
+
+def read_alias():
+    """The alias reads should use right now"""
+    if (
+        _read_only.get()
+        and READ_ALIAS in settings.DATABASES
+        and not connections[WRITE_ALIAS].in_atomic_block
+    ):
+        return READ_ALIAS
+    return WRITE_ALIAS
+
+
+class ReadReplicaRouter:
+    
+    def db_for_read(self, model, **hints):
+        return read_alias()
+    
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases point at the same database
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
@@ -0,0 +1,230 @@
+"""
+World deletion.
+
+Deleting a world through Django's collector loads every category and
+membership into Python to cascade them, which holds the SQLite write lock
+for as long as that takes. Instead ``soft_delete_world()`` only marks the
+world inactive, which hides it from every page, API and search at once,
+and the rows are removed afterwards by ``purge_deleted_worlds()`` in
+bounded batches of raw DELETEs, each in its own short transaction.
+
+The purge runs on a background thread after the deleting transaction
+commits (unless ``WORLD_PURGE_IN_BACKGROUND`` is False), and can also be
+run with ``manage.py purge_deleted_worlds``. Stored media files that only
+the purged worlds used are garbage collected afterwards (see core.media).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import access, changes, fragments, media, search
+from .models import World, WorldUser, Category, Entry, EntryBlob, CrossReference, Media
+
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 1000
+
+_purge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='world-purge')
+
+
+def soft_delete_world(world):
+    """Hide ``world`` everywhere and schedule its rows for purging"""
+    with transaction.atomic():
+        World.objects.filter(pk=world.pk).update(is_active=False, deleted_at=timezone.now())
+        member_ids = list(WorldUser.objects.filter(world=world).order_by().values_list('user_id', flat=True))
+        access.invalidate(world.owner_id, *member_ids)
+        # Logged for each user, who can no longer see the world to sync it
+        changes.record_many(changes.WORLD, changes.DELETE, [
+            (world.pk, world.pk, user_id) for user_id in [world.owner_id, *member_ids]
+        ])
+        if search.is_available():
+            search.remove_world(world.pk)
+        schedule_purge()
+
+
+def schedule_purge():
+    """Run the purge on the background thread once the transaction commits"""
+    if getattr(settings, 'WORLD_PURGE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _purge_executor.submit(_purge_in_background))
+
+
+def _purge_in_background():
+    try:
+        purge_deleted_worlds()
+    except Exception:
+        logger.exception("Purging deleted worlds failed")
+    finally:
+        connections.close_all()
+
+
+def _returning_ids(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def purge_world(world_id, batch_size=PURGE_BATCH_SIZE):
+    """
+    Remove a soft-deleted world and everything in it, ``batch_size`` rows
+    per transaction. Media go first, releasing their stored files, then
+    entries, after their cross references and blobs and with their parent
+    links cleared, then categories deepest first so no batch leaves a child
+    pointing at a deleted parent. Returns the number of batches run.
+    """
+    media_table = Media._meta.db_table
+    entry_table = Entry._meta.db_table
+    blob_table = EntryBlob._meta.db_table
+    reference_table = CrossReference._meta.db_table
+    category_table = Category._meta.db_table
+    membership_table = WorldUser._meta.db_table
+    delete_media = (
+        f"DELETE FROM {media_table} WHERE id IN ("
+        f"SELECT id FROM {media_table} WHERE world_id = %s LIMIT %s"
+        f") RETURNING file_id"
+    )
+    delete_references = (
+        f"DELETE FROM {reference_table} WHERE id IN ("
+        f"SELECT {reference_table}.id FROM {reference_table} "
+        f"JOIN {entry_table} ON {entry_table}.id = {reference_table}.source_entry_id "
+        f"WHERE {entry_table}.world_id = %s LIMIT %s"
+        f") RETURNING id"
+    )
+    delete_blobs = (
+        f"DELETE FROM {blob_table} WHERE id IN ("
+        f"SELECT {blob_table}.id FROM {blob_table} "
+        f"JOIN {entry_table} ON {entry_table}.id = {blob_table}.entry_id "
+        f"WHERE {entry_table}.world_id = %s LIMIT %s"
+        f") RETURNING id"
+    )
+    detach_entries = (
+        f"UPDATE {entry_table} SET parent_entry_id = NULL WHERE id IN ("
+        f"SELECT id FROM {entry_table} WHERE world_id = %s AND parent_entry_id IS NOT NULL LIMIT %s"
+        f") RETURNING id"
+    )
+    delete_entries = (
+        f"DELETE FROM {entry_table} WHERE id IN ("
+        f"SELECT id FROM {entry_table} WHERE world_id = %s LIMIT %s"
+        f") RETURNING id"
+    )
+    delete_categories = (
+        f"DELETE FROM {category_table} WHERE id IN ("
+        f"SELECT id FROM {category_table} WHERE world_id = %s ORDER BY depth DESC LIMIT %s"
+        f") RETURNING id"
+    )
+    delete_memberships = (
+        f"DELETE FROM {membership_table} WHERE id IN ("
+        f"SELECT id FROM {membership_table} WHERE world_id = %s LIMIT %s"
+        f") RETURNING id"
+    )
+    
+    batches = 0
+    while True:
+        with transaction.atomic():
+            digests = _returning_ids(delete_media, [world_id, batch_size])
+            media.release(digests)
+        if not digests:
+            break
+        batches += 1
+    for statement in (delete_references, delete_blobs, detach_entries, delete_entries):
+        while True:
+            with transaction.atomic():
+                row_ids = _returning_ids(statement, [world_id, batch_size])
+            if not row_ids:
+                break
+            batches += 1
+    while True:
+        with transaction.atomic():
+            category_ids = _returning_ids(delete_categories, [world_id, batch_size])
+            if category_ids and search.is_available():
+                search.remove_categories(category_ids)
+        if not category_ids:
+            break
+        batches += 1
+    while True:
+        with transaction.atomic():
+            membership_ids = _returning_ids(delete_memberships, [world_id, batch_size])
+        if not membership_ids:
+            break
+        batches += 1
+    
+    # Nothing is left to cascade, so the collector only checks and moves on
+    with transaction.atomic():
+        World.objects.filter(pk=world_id, deleted_at__isnull=False).delete()
+    return batches + 1
+
+
+def purge_deleted_worlds(batch_size=PURGE_BATCH_SIZE):
+    """Purge every soft-deleted world; returns the ids purged"""
+    world_ids = list(
+        World.objects.filter(deleted_at__isnull=False).order_by('deleted_at').values_list('id', flat=True)
+    )
+    for world_id in world_ids:
+        purge_world(world_id, batch_size)
+    if world_ids:
+        # Files only the purged worlds used can go now
+        media.collect_garbage(sweep=False)
+    return world_ids
+
+
+def delete_owned_worlds(user):
+    """
+    Delete every world ``user`` owns, and the user's memberships elsewhere,
+    ahead of deleting the account. Left to the collector, the cascade would
+    fire the counter, search index and change log handlers once per row;
+    this issues a fixed number of statements however large the worlds are.
+    Stored files the worlds used are left for ``media.collect_garbage()``.
+    """
+    membership_table = WorldUser._meta.db_table
+    owned = f"SELECT id FROM {World._meta.db_table} WHERE owner_id = %s"
+    in_entries = f"SELECT id FROM {Entry._meta.db_table} WHERE world_id IN ({owned})"
+    with transaction.atomic():
+        world_ids = list(World.objects.filter(owner=user).order_by().values_list('id', flat=True))
+        memberships = list(
+            WorldUser.objects.filter(Q(world_id__in=world_ids) | Q(user=user)).order_by()
+            .values_list('pk', 'world_id', 'user_id')
+        )
+        joined = [(pk, world_id) for pk, world_id, user_id in memberships if world_id not in world_ids]
+        member_ids = {user_id for _, world_id, user_id in memberships if world_id in world_ids}
+        
+        # The same entries the handlers would log: each user loses the
+        # owned worlds, and the worlds the user joined lose a member
+        changes.record_many(changes.WORLD, changes.DELETE, [
+            (world_id, world_id, user_id)
+            for world_id in world_ids for user_id in {user.pk, *member_ids}
+        ])
+        changes.record_many(changes.MEMBERSHIP, changes.DELETE, [
+            (world_id, pk, user.pk) for pk, world_id in joined
+        ])
+        World.objects.adjust_counters([world_id for _, world_id in joined], 'member_count', -1)
+        access.invalidate(user.pk, *member_ids)
+        
+        digests = _returning_ids(
+            f"DELETE FROM {Media._meta.db_table} WHERE world_id IN ({owned}) RETURNING file_id", [user.pk],
+        )
+        media.release(digests)
+        for sql in (
+            f"DELETE FROM {CrossReference._meta.db_table} "
+            f"WHERE source_entry_id IN ({in_entries}) OR target_entry_id IN ({in_entries})",
+            f"DELETE FROM {EntryBlob._meta.db_table} WHERE entry_id IN ({in_entries})",
+            f"DELETE FROM {Entry._meta.db_table} WHERE world_id IN ({owned})",
+        ):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user.pk] * sql.count('%s'))
+        category_ids = _returning_ids(
+            f"DELETE FROM {Category._meta.db_table} WHERE world_id IN ({owned}) RETURNING id", [user.pk],
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {membership_table} WHERE world_id IN ({owned}) OR user_id = %s", [user.pk, user.pk],
+            )
+            cursor.execute(f"DELETE FROM {World._meta.db_table} WHERE owner_id = %s", [user.pk])
+        if search.is_available():
+            search.remove_categories(category_ids)
+            search.remove_worlds(world_ids)
+        fragments.bump(World, *world_ids)
+    return world_ids
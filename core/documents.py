@@ -0,0 +1,220 @@
+"""
+Storage format for Prosemirror entry documents.
+
+``Entry`` keeps its document out of list queries: the JSON is stored
+zlib-compressed in ``content_data``, which the default manager defers, and
+the ``plaintext`` and ``summary`` columns are filled in on save so previews
+and search never have to decompress anything.
+
+Large embedded values, such as images pasted as ``data:`` URIs, would make
+every document read pay for them. ``pack()`` moves any node attribute
+longer than ``BLOB_THRESHOLD`` characters out of the document into an
+``EntryBlob`` row keyed by its SHA-256 digest and leaves a
+``{"$blob": digest}`` reference in its place. ``unpack()`` reverses both
+steps.
+
+Mentions of other entries are ``mention`` nodes whose ``attrs.id`` is the
+target entry's id. ``pack()`` collects them with the text of the block each
+appears in, and ``Entry.save()`` diffs that set against the stored
+``CrossReference`` rows.
+"""
+import hashlib
+import json
+import zlib
+from typing import NamedTuple
+
+
+BLOB_THRESHOLD = 16 * 1024
+BLOB_REF = '$blob'
+
+COMPRESSION_LEVEL = 6
+
+SUMMARY_LENGTH = 280
+CONTEXT_LENGTH = 200
+
+# Node types whose text runs into the next block without a line break
+INLINE_NODES = {'text', 'hard_break', 'hardBreak', 'image', 'mention'}
+
+
+def _split_blobs(node, blobs):
+    """Copy of ``node`` with long attribute values replaced by blob references"""
+    if isinstance(node, list):
+        return [_split_blobs(child, blobs) for child in node]
+    if not isinstance(node, dict):
+        return node
+    result = {}
+    for key, value in node.items():
+        if key == 'attrs' and isinstance(value, dict):
+            attrs = {}
+            for name, attr in value.items():
+                if isinstance(attr, str) and len(attr) > BLOB_THRESHOLD:
+                    data = attr.encode('utf-8')
+                    digest = hashlib.sha256(data).hexdigest()
+                    blobs[digest] = data
+                    attr = {BLOB_REF: digest}
+                attrs[name] = attr
+            result[key] = attrs
+        else:
+            result[key] = _split_blobs(value, blobs)
+    return result
+
+
+def _join_blobs(node, blobs):
+    """Replace blob references in ``node`` (in place) with their values"""
+    if isinstance(node, list):
+        for child in node:
+            _join_blobs(child, blobs)
+    elif isinstance(node, dict):
+        attrs = node.get('attrs')
+        if isinstance(attrs, dict):
+            for name, attr in attrs.items():
+                if isinstance(attr, dict) and set(attr) == {BLOB_REF}:
+                    attrs[name] = blobs[attr[BLOB_REF]].decode('utf-8')
+        for key, value in node.items():
+            if key != 'attrs':
+                _join_blobs(value, blobs)
+
+
+def _collect_text(node, parts):
+    if isinstance(node, list):
+        for child in node:
+            _collect_text(child, parts)
+        return
+    if not isinstance(node, dict):
+        return
+    node_type = node.get('type')
+    if node_type == 'text':
+        parts.append(node.get('text', ''))
+    elif node_type in ('hard_break', 'hardBreak'):
+        parts.append('\n')
+    elif node_type == 'mention':
+        label = (node.get('attrs') or {}).get('label')
+        if label:
+            parts.append(f"@{label}")
+    _collect_text(node.get('content') or [], parts)
+    if node_type not in INLINE_NODES and parts and parts[-1] != '\n':
+        parts.append('\n')
+
+
+def plaintext(document):
+    """The text of ``document``, one line per block"""
+    parts = []
+    _collect_text(document, parts)
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def summarize(text, length=SUMMARY_LENGTH):
+    """The start of ``text`` on one line, cut at a word boundary"""
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text.rfind(' ', 0, length)
+    return text[:cut if cut > 0 else length].rstrip(' .,;:') + '…'
+
+
+class Packed(NamedTuple):
+    """A document ready for storage"""
+    data: bytes
+    size: int
+    blobs: dict
+    text: str
+    mentions: dict
+
+
+def _mention_target(node):
+    try:
+        return int((node.get('attrs') or {}).get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def mentions(document):
+    """
+    ``{entry_id: context}`` for every entry ``document`` mentions, where
+    context is the text of the block holding its first mention.
+    """
+    found = {}
+    
+    def visit(node, block):
+        if isinstance(node, list):
+            for child in node:
+                visit(child, block)
+            return
+        if not isinstance(node, dict):
+            return
+        if node.get('type') == 'mention':
+            target = _mention_target(node)
+            if target is not None and target not in found:
+                found[target] = summarize(plaintext(block), CONTEXT_LENGTH)
+            return
+        children = node.get('content') or []
+        if node.get('type') not in INLINE_NODES and any(
+            isinstance(child, dict) and child.get('type') in INLINE_NODES for child in children
+        ):
+            block = node
+        visit(children, block)
+    
+    visit(document, document)
+    return found
+
+
+def parse_mentions(rows):
+    """
+    ``[(entry_id, mentions)]`` for ``(entry_id, content_data)`` rows. Only
+    needs the stored bytes, so reindex worker processes can run it.
+    """
+    return [(entry_id, mentions(load(data))) for entry_id, data in rows]
+
+
+def pack(document):
+    """
+    Prepare ``document`` for storage: the compressed JSON, its uncompressed
+    size, a ``{digest: bytes}`` dict of split-out blobs, the plaintext and
+    the mentioned entries.
+    """
+    blobs = {}
+    stripped = _split_blobs(document, blobs)
+    encoded = json.dumps(stripped, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return Packed(
+        zlib.compress(encoded, COMPRESSION_LEVEL), len(encoded), blobs, plaintext(document), mentions(document),
+    )
+
+
+def load(data):
+    """Decompress stored document JSON; blob references are left in place"""
+    if not data:
+        return {}
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def blob_digests(document):
+    """Digests of every blob ``document`` references"""
+    digests = set()
+    
+    def visit(node):
+        if isinstance(node, list):
+            for child in node:
+                visit(child)
+        elif isinstance(node, dict):
+            if set(node) == {BLOB_REF}:
+                digests.add(node[BLOB_REF])
+                return
+            for value in node.values():
+                visit(value)
+    
+    visit(document)
+    return digests
+
+
+def unpack(data, fetch_blobs):
+    """
+    Decompress stored document JSON and restore its blobs. ``fetch_blobs``
+    is called with the referenced digests, only if there are any, and
+    returns a ``{digest: bytes}`` dict.
+    """
+    document = load(data)
+    digests = blob_digests(document)
+    if digests:
+        _join_blobs(document, fetch_blobs(digests))
+    return document
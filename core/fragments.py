@@ -0,0 +1,99 @@
+"""
+Versioned fragment caching.
+
+World and category cards are cached with the ``{% fragment %}`` tag from
+``core.templatetags.fragments``. A fragment's key includes the current
+version of every model instance it renders, and saving or deleting an
+instance (or changing a world's counters) bumps its version. A changed card
+therefore misses and is rendered again, while unchanged cards are served
+from the cache. Entries under old versions are never deleted; nothing asks
+for them any more and they age out.
+
+Versions live in the ``fragments`` cache next to the fragments. A version
+that is missing, for example because it was evicted, starts again from the
+current time rather than from zero, so it can't match a fragment cached
+under an earlier version.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import models, transaction
+
+from . import metrics
+
+
+CACHE_ALIAS = 'fragments'
+VERSION_KEY = 'fragment-version:{label}:{pk}'
+FRAGMENT_KEY = 'fragment:{name}:{digest}'
+DEFAULT_TIMEOUT = 3600
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(model, pk):
+    return VERSION_KEY.format(label=model._meta.label_lower, pk=pk)
+
+
+def _bump_keys(keys):
+    cache = _cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump(model, *pks):
+    """Invalidate the cached fragments of these instances, now and on commit"""
+    keys = [_version_key(model, pk) for pk in pks if pk is not None]
+    if not keys:
+        return
+    _bump_keys(keys)
+    # A request that read the old row before this transaction commits could
+    # cache it under the new version; bumping again after commit discards it
+    transaction.on_commit(lambda: _bump_keys(keys))
+
+
+def versions(instances):
+    """The current version of each model instance, in one cache round trip"""
+    cache = _cache()
+    keys = [_version_key(type(instance), instance.pk) for instance in instances]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # add() keeps whichever version another request set first
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def fragment_key(name, vary_on):
+    """
+    Cache key for fragment ``name``. Model instances in ``vary_on`` are
+    keyed by their version and any other values by their string form.
+    """
+    instances = [value for value in vary_on if isinstance(value, models.Model)]
+    instance_versions = iter(versions(instances))
+    parts = []
+    for value in vary_on:
+        if isinstance(value, models.Model):
+            parts.append(f"{value._meta.label_lower}.{value.pk}.{next(instance_versions)}")
+        else:
+            parts.append(str(value))
+    digest = hashlib.md5(':'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return FRAGMENT_KEY.format(name=name, digest=digest)
+
+
+def get_or_render(name, vary_on, render, timeout=DEFAULT_TIMEOUT):
+    """Return the cached fragment, or ``render()`` it and cache the result"""
+    cache = _cache()
+    key = fragment_key(name, vary_on)
+    content = cache.get(key)
+    metrics.record_fragment(name, hit=content is not None)
+    if content is None:
+        content = render()
+        cache.set(key, content, timeout)
+    return content
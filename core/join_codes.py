@@ -0,0 +1,55 @@
+"""
+Join code generation.
+
+Codes are produced by permuting a counter: each value drawn from
+``JoinCodeSequence`` goes through a keyed Feistel permutation of the code
+space and is then encoded in base 36. Distinct counter values always give
+distinct codes, so allocation needs no existence check or retry loop, and
+the key makes consecutive codes unrelated to each other.
+"""
+import hashlib
+import hmac
+import string
+
+
+ALPHABET = string.digits + string.ascii_uppercase
+CODE_LENGTH = 8
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+
+# The Feistel network works on 42 bits, the smallest even width covering
+# CODE_SPACE; values outside the space are cycle-walked back into it
+HALF_BITS = 21
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+def _round(key, round_number, value):
+    digest = hmac.new(key, f"{round_number}:{value}".encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big') & HALF_MASK
+
+
+def permute(value, key):
+    """Map ``value`` in ``[0, CODE_SPACE)`` to a unique value in the same range"""
+    if not 0 <= value < CODE_SPACE:
+        raise ValueError("Join code space exhausted.")
+    key = key.encode()
+    while True:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for round_number in range(ROUNDS):
+            left, right = right, left ^ _round(key, round_number, right)
+        value = (left << HALF_BITS) | right
+        if value < CODE_SPACE:
+            return value
+
+
+def encode(value):
+    """Encode ``value`` as a fixed-width base-36 code"""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def codes_for(values, key):
+    return [encode(permute(value, key)) for value in values]
@@ -0,0 +1,118 @@
+"""Shared helpers for the ``bench_*`` management commands"""
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+def resident_bytes():
+    """This process's resident set size, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+class PeakMemory:
+    """Samples the resident set size on a thread and keeps the peak above the starting point"""
+    
+    def __enter__(self):
+        self.baseline = resident_bytes()
+        self.peak = self.baseline
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def _sample(self):
+        while not self._done.wait(0.002):
+            current = resident_bytes()
+            if current is not None and current > self.peak:
+                self.peak = current
+    
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+    
+    def __str__(self):
+        if self.baseline is None:
+            return "peak RSS n/a"
+        return f"peak RSS +{(self.peak - self.baseline) / 2**20:6.1f} MB"
+
+
+class QueryCounter:
+    """
+    Counts the statements run on the default connection. Unlike
+    CaptureQueriesContext, which reads connection.queries_log, it keeps
+    counting past the log's 9000 entries.
+    """
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+    
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+class Rollback(Exception):
+    """Raised to discard the data a benchmark created"""
+
+
+class BenchmarkCommand(BaseCommand):
+    """Base command that runs a benchmark inside a rolled-back transaction"""
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', action='store_true', help="Keep the generated data instead of rolling back")
+        parser.add_argument('--repeat', type=int, default=20, help="Samples per measurement")
+    
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                self.run(**options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+    
+    def run(self, **options):
+        raise NotImplementedError
+    
+    @contextmanager
+    def step(self, label):
+        """Time a one-off step and report its query count"""
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<40} {elapsed * 1000:10.2f} ms  {queries.count:6d} queries")
+    
+    def measure(self, label, func):
+        """Run ``func`` repeatedly and report median/p95 latency and queries per call"""
+        samples = []
+        with QueryCounter() as queries:
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        self.stdout.write(
+            f"{label:<40} p50 {statistics.median(samples) * 1000:8.2f} ms  "
+            f"p95 {p95 * 1000:8.2f} ms  {queries.count // self.repeat:6d} queries"
+        )
+        return samples
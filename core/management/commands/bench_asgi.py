@@ -0,0 +1,93 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from core.models import World, WorldUser, Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec and p99 latency of the JSON APIs served through "
+        "Django's WSGI handler (thread pool) and ASGI handler (event loop)"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16, help="Simultaneous clients")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per client per route")
+    
+    def handle(self, concurrency, requests, **options):
+        # Both handlers use their own threads and connections, so the
+        # fixture data is committed and removed afterwards
+        users = self.seed(concurrency)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                routes = [
+                    ('api_worlds', 'get', reverse('core:api_worlds')),
+                    ('search', 'get', reverse('core:search') + '?q=lore'),
+                    ('toggle_theme', 'post', reverse('accounts:toggle_theme')),
+                ]
+                for name, method, url in routes:
+                    self.report(name, 'wsgi', *self.run_wsgi(users, method, url, requests))
+                    self.report(name, 'asgi', *asyncio.run(self.run_asgi(users, method, url, requests)))
+        finally:
+            World.objects.filter(owner__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+    
+    def seed(self, count):
+        users = [
+            User.objects.create_user(username=f'bench_asgi_{i}', password='unused')
+            for i in range(count)
+        ]
+        for index, user in enumerate(users):
+            for number in range(10):
+                world = World.objects.create(name=f"Lore world {index}-{number}", owner=user)
+                Category.objects.create(world=world, name="Lore")
+                WorldUser.objects.create(world=world, user=users[(index + 1) % count], role='player')
+        return users
+    
+    def run_wsgi(self, users, method, url, requests):
+        def worker(user):
+            client = Client()
+            client.force_login(user)
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                getattr(client, method)(url)
+                samples.append(time.perf_counter() - start)
+            close_old_connections()
+            return samples
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            samples = [sample for result in pool.map(worker, users) for sample in result]
+        return samples, time.perf_counter() - start
+    
+    async def run_asgi(self, users, method, url, requests):
+        async def worker(user):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                await getattr(client, method)(url)
+                samples.append(time.perf_counter() - start)
+            return samples
+        
+        start = time.perf_counter()
+        results = await asyncio.gather(*(worker(user) for user in users))
+        return [sample for result in results for sample in result], time.perf_counter() - start
+    
+    def report(self, route, mode, samples, elapsed):
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(
+            f"{route:<14} {mode}  {len(samples) / elapsed:8.1f} req/s  "
+            f"p50 {statistics.median(samples) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms"
+        )
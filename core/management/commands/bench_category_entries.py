@@ -0,0 +1,109 @@
+import base64
+import json
+import random
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import documents
+from core.management.benchmark import BenchmarkCommand
+from core.models import World, Category, Entry, EntryBlob
+
+
+WORDS = (
+    "dragon tavern ranger ancient ruin river oath crown shadow merchant temple "
+    "storm blade harbor goblin wizard forest tower relic council frost ember "
+    "pilgrim siege lantern marsh rune guild bridge ember cavern beacon warden"
+).split()
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark category entry listings against large Prosemirror documents"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--entries', type=int, default=5000, help="Entries in the category")
+        parser.add_argument('--kb', type=int, default=50, help="Approximate document size in KB")
+        parser.add_argument('--image-every', type=int, default=10, help="Embed a data: URI image in every Nth entry (0 for none)")
+    
+    def run(self, entries, kb, image_every, **options):
+        rng = random.Random(42)
+        owner = get_user_model().objects.create_user(username='bench_entries_owner', password='unused')
+        world = World.objects.create(name='Benchmark World', owner=owner)
+        category = Category.objects.create(world=world, name='Bestiary')
+        
+        with self.step(f"create {entries} entries of ~{kb} KB"):
+            batch = []
+            blobs = []
+            for i in range(entries):
+                with_image = image_every and i % image_every == 0
+                packed = documents.pack(self._document(rng, kb * 1024, with_image))
+                batch.append(Entry(
+                    title=f"Entry {i:05d}", entry_type='npc', world=world, category=category, author=owner,
+                    content_data=packed.data, content_size=packed.size,
+                    plaintext=packed.text, summary=documents.summarize(packed.text),
+                ))
+                blobs.append(packed.blobs)
+                if len(batch) == 500:
+                    self._save(batch, blobs)
+                    batch, blobs = [], []
+            self._save(batch, blobs)
+        
+        stored = Entry.objects.filter(category=category).aggregate(
+            documents=Sum('content_size'), compressed=Sum(Length('content_data')),
+        )
+        blob_bytes = EntryBlob.objects.filter(entry__category=category).aggregate(total=Sum(Length('data')))['total'] or 0
+        self.stdout.write(
+            f"documents {stored['documents'] / 2**20:.1f} MB, stored {stored['compressed'] / 2**20:.1f} MB "
+            f"compressed + {blob_bytes / 2**20:.1f} MB blobs"
+        )
+        
+        listing = category.entries.filter(is_hidden=False)
+        self.measure("first page, listing columns", lambda: list(listing.for_listing()[:50]))
+        self.measure("first page, full rows", lambda: list(listing.with_content()[:50]))
+        self.repeat, repeat = max(1, self.repeat // 4), self.repeat
+        self.measure(f"all {entries}, listing columns", lambda: list(listing.for_listing()))
+        self.measure(f"all {entries}, full rows", lambda: list(listing.with_content()))
+        self.repeat = repeat
+        
+        sample = listing.first()
+        self.measure("open one entry (lazy content)", lambda: Entry.objects.get(pk=sample.pk).content)
+        
+        client = Client()
+        client.force_login(owner)
+        last_page = (entries + 49) // 50
+        url = reverse('core:category_detail', args=[world.id, category.id])
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.measure("category page 1", lambda: client.get(url))
+            self.measure(f"category page {last_page}", lambda: client.get(url, {'page': last_page}))
+    
+    def _save(self, batch, blobs):
+        created = Entry.objects.bulk_create(batch)
+        EntryBlob.objects.bulk_create([
+            EntryBlob(entry=entry, digest=digest, data=data)
+            for entry, entry_blobs in zip(created, blobs) for digest, data in entry_blobs.items()
+        ])
+    
+    def _document(self, rng, size, with_image):
+        """A Prosemirror document of headings and paragraphs about ``size`` bytes of JSON"""
+        content = []
+        if with_image:
+            pixels = base64.b64encode(rng.randbytes(24 * 1024)).decode()
+            content.append({'type': 'image', 'attrs': {'src': f"data:image/png;base64,{pixels}", 'alt': "Portrait"}})
+        length = len(json.dumps(content))
+        while length < size:
+            if rng.random() < 0.1:
+                node = {'type': 'heading', 'attrs': {'level': 2}, 'content': [
+                    {'type': 'text', 'text': ' '.join(rng.choices(WORDS, k=4)).title()},
+                ]}
+            else:
+                node = {'type': 'paragraph', 'content': [
+                    {'type': 'text', 'text': ' '.join(rng.choices(WORDS, k=60)) + '. '},
+                    {'type': 'text', 'marks': [{'type': 'bold'}], 'text': rng.choice(WORDS)},
+                ]}
+            content.append(node)
+            length += len(json.dumps(node))
+        return {'type': 'doc', 'content': content}
@@ -0,0 +1,63 @@
+import random
+
+from accounts.models import User
+from core.management.benchmark import BenchmarkCommand
+from core.models import World, Category
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark category tree queries on a large, deep tree"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--size', type=int, default=10000, help="Number of categories")
+        parser.add_argument('--depth', type=int, default=12, help="Maximum tree depth")
+    
+    def run(self, size, depth, **options):
+        rng = random.Random(42)
+        owner = User.objects.create_user(username='bench_tree_owner', password='unused')
+        world = World.objects.create(name='Benchmark World', owner=owner)
+        
+        with self.step(f"create {size} categories"):
+            # A spine guarantees the requested depth; the rest attach at random
+            nodes = []
+            parent = None
+            for level in range(depth):
+                parent = Category.objects.create(world=world, parent=parent, name=f"spine-{level}")
+                nodes.append(parent)
+            while len(nodes) < size:
+                parent = rng.choice(nodes)
+                if parent.depth >= depth - 1:
+                    parent = None
+                nodes.append(Category.objects.create(world=world, parent=parent, name=f"node-{len(nodes)}"))
+        
+        root = nodes[0]
+        deepest = nodes[depth - 1]
+        
+        self.measure("ancestors of deepest node", deepest.get_ancestors)
+        self.measure("ancestors (legacy parent walk)", lambda: self._legacy_ancestors(Category.objects.get(pk=deepest.pk)))
+        self.measure("descendants of root", lambda: list(root.get_descendants()))
+        self.measure("descendant count of root", root.get_descendant_count)
+        self.repeat, repeat = 1, self.repeat
+        self.measure("descendants (legacy recursion)", lambda: self._legacy_descendants(root))
+        self.repeat = repeat
+        
+        subtree = nodes[depth // 2]
+        with self.step(f"move subtree of {subtree.get_descendant_count()} nodes"):
+            subtree.parent = None
+            subtree.save()
+    
+    def _legacy_ancestors(self, category):
+        ancestors = []
+        current = category.parent
+        while current:
+            ancestors.append(current)
+            current = current.parent
+        return list(reversed(ancestors))
+    
+    def _legacy_descendants(self, category):
+        descendants = []
+        for subcategory in category.subcategories.all():
+            descendants.append(subcategory)
+            descendants.extend(self._legacy_descendants(subcategory))
+        return descendants
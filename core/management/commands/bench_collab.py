@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.test import Client, override_settings
+
+from accounts.models import User
+from core.collab import BrokerServer, CollabApplication, Hub, LocalBroker, SocketBroker
+from core.models import World, WorldUser, Entry
+
+
+class SimulatedEditor:
+    """A prosemirror-collab client typing into one document"""
+    
+    def __init__(self, name, cookie, rate, rng):
+        self.name = name
+        self.cookie = cookie
+        self.rate = rate
+        self.rng = rng
+        self.inbox = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self.client_id = None
+        self.version = 0
+        self.unconfirmed = []
+        self.in_flight = 0
+        self.behind_until = None
+        self.confirm_latencies = []
+        self.delivery_latencies = []
+        self.messages = 0
+        self.conflicts = 0
+        self.typed = 0
+    
+    def scope(self, entry_id):
+        return {
+            'type': 'websocket',
+            'path': f'/ws/entries/{entry_id}/',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'origin', b'http://testserver'),
+                (b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.cookie}'.encode()),
+            ],
+        }
+    
+    async def receive(self):
+        return await self.inbox.get()
+    
+    async def send(self, event):
+        if event['type'] == 'websocket.close':
+            self.ready.set()
+            return
+        if event['type'] != 'websocket.send':
+            return
+        message = json.loads(event['text'])
+        now = time.perf_counter()
+        self.messages += 1
+        if message['type'] == 'init':
+            self.client_id = message['clientID']
+            self.version = message['version'] + len(message['steps'])
+            self.ready.set()
+        elif message['type'] == 'steps':
+            for step, client_id in zip(message['steps'], message['clientIDs']):
+                if client_id == self.client_id:
+                    self.unconfirmed.pop(0)
+                    self.in_flight -= 1
+                    self.confirm_latencies.append(now - step['t'])
+                else:
+                    self.delivery_latencies.append(now - step['t'])
+            self.version = message['version'] + len(message['steps'])
+            if self.behind_until is not None and self.version >= self.behind_until:
+                self.behind_until = None
+            self.submit()
+        elif message['type'] == 'conflict':
+            self.conflicts += 1
+            self.in_flight = 0
+            self.behind_until = message['version']
+            if self.version >= self.behind_until:
+                self.behind_until = None
+                self.submit()
+    
+    def submit(self):
+        """Send every unconfirmed step, unless a submission is outstanding"""
+        if self.in_flight or self.behind_until is not None or not self.unconfirmed:
+            return
+        self.in_flight = len(self.unconfirmed)
+        self.push({'type': 'steps', 'version': self.version, 'steps': list(self.unconfirmed)})
+    
+    def push(self, message):
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+    
+    async def type_for(self, seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(self.rate))
+            self.typed += 1
+            position = self.rng.randint(1, 1000)
+            self.unconfirmed.append({
+                'stepType': 'replace', 'from': position, 'to': position,
+                'slice': {'content': [{'type': 'text', 'text': 'a'}]},
+                't': time.perf_counter(),
+            })
+            self.push({'type': 'presence', 'selection': {'anchor': position + 1, 'head': position + 1}})
+            self.submit()
+    
+    async def settle(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while self.unconfirmed and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        self.inbox.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test collaborative editing: a DM and players type into one entry "
+        "over the WebSocket application and step latency is reported"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=8, help="Players typing alongside the DM")
+        parser.add_argument('--seconds', type=float, default=10, help="How long everyone types")
+        parser.add_argument('--rate', type=float, default=6, help="Keystrokes per second per editor")
+        parser.add_argument('--tick-ms', type=float, default=None, help="Flush interval (default COLLAB_TICK_MS)")
+        parser.add_argument('--workers', type=int, default=1, help="Simulated ASGI workers; more than one shares a socket broker")
+    
+    def handle(self, players, seconds, rate, tick_ms, workers, **options):
+        tick = (tick_ms if tick_ms is not None else settings.COLLAB_TICK_MS) / 1000
+        users, cookies, entry = self.seed(players)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                editors = asyncio.run(self.simulate(cookies, entry.id, seconds, rate, tick, workers))
+        finally:
+            World.objects.filter(owner=users[0]).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        self.report(editors, seconds, tick, workers)
+    
+    def seed(self, players):
+        dm = User.objects.create_user(username='bench_collab_dm', password='unused')
+        world = World.objects.create(name="Collaboration benchmark", owner=dm)
+        entry = Entry.objects.create(world=world, author=dm, title="Session notes", content={'type': 'doc', 'content': []})
+        users = [dm]
+        for i in range(players):
+            player = User.objects.create_user(username=f'bench_collab_player_{i}', password='unused')
+            # Editing takes an author role, so the players join as co-creators
+            WorldUser.objects.create(world=world, user=player, role='co_creator')
+            users.append(player)
+        cookies = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return users, cookies, entry
+    
+    async def simulate(self, cookies, entry_id, seconds, rate, tick, workers):
+        server = None
+        if workers > 1:
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'collab.sock')
+            server = BrokerServer(path)
+            await server.start()
+            apps = [CollabApplication(Hub(SocketBroker(path), tick)) for _ in range(workers)]
+        else:
+            apps = [CollabApplication(Hub(LocalBroker(), tick))]
+        
+        rng = random.Random(7)
+        editors = [
+            SimulatedEditor('dm' if i == 0 else f'player {i}', cookie, rate, random.Random(rng.random()))
+            for i, cookie in enumerate(cookies)
+        ]
+        tasks = []
+        for i, editor in enumerate(editors):
+            editor.inbox.put_nowait({'type': 'websocket.connect'})
+            app = apps[i % len(apps)]
+            tasks.append(asyncio.ensure_future(app(editor.scope(entry_id), editor.receive, editor.send)))
+            await editor.ready.wait()
+        
+        await asyncio.gather(*(editor.type_for(seconds) for editor in editors))
+        await asyncio.gather(*(editor.settle(5) for editor in editors))
+        await asyncio.gather(*tasks)
+        if server is not None:
+            await server.close()
+            os.unlink(path)
+            os.rmdir(directory)
+        return editors
+    
+    def report(self, editors, seconds, tick, workers):
+        def percentiles(samples):
+            samples = sorted(samples)
+            if not samples:
+                return "no samples"
+            pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+            return (
+                f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {pick(0.95):7.2f} ms  "
+                f"p99 {pick(0.99):7.2f} ms  max {samples[-1] * 1000:7.2f} ms"
+            )
+        
+        typed = sum(editor.typed for editor in editors)
+        confirmed = sum(len(editor.confirm_latencies) for editor in editors)
+        messages = sum(editor.messages for editor in editors)
+        self.stdout.write(
+            f"{len(editors)} editors, {workers} worker(s), {tick * 1000:g} ms tick, {seconds:g}s: "
+            f"{typed} keystrokes, {confirmed} confirmed, {sum(editor.conflicts for editor in editors)} conflicts"
+        )
+        self.stdout.write(f"{'keystroke -> own confirmation':<34} {percentiles([s for e in editors for s in e.confirm_latencies])}")
+        self.stdout.write(f"{'keystroke -> other editors':<34} {percentiles([s for e in editors for s in e.delivery_latencies])}")
+        self.stdout.write(
+            f"{'messages per editor per second':<34} {messages / len(editors) / seconds:7.1f} "
+            f"(steps delivered per message: {sum(len(e.delivery_latencies) + len(e.confirm_latencies) for e in editors) / max(messages, 1):.1f})"
+        )
@@ -0,0 +1,115 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from core.models import World, WorldUser, Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Run many concurrent readers against the world pages while a writer "
+        "repeatedly joins and leaves a world, and report throughput, tail "
+        "latency and lock errors"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=16, help="Concurrent reader threads")
+        parser.add_argument('--seconds', type=float, default=10.0, help="Duration of the run")
+    
+    def handle(self, readers, seconds, **options):
+        self.stdout.write(
+            f"journal_mode={self.pragma('journal_mode')} "
+            f"replica={'replica' in connections.settings}"
+        )
+        owner, writer, players, world = self.seed(readers)
+        stop = threading.Event()
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                with ThreadPoolExecutor(max_workers=readers + 1) as pool:
+                    write_future = pool.submit(self.write_loop, writer, world, stop)
+                    read_futures = [pool.submit(self.read_loop, player, world, stop) for player in players]
+                    time.sleep(seconds)
+                    stop.set()
+                    write_samples, write_errors = write_future.result()
+                    read_results = [future.result() for future in read_futures]
+        finally:
+            World.objects.filter(owner=owner).delete()
+            User.objects.filter(pk__in=[owner.pk, writer.pk, *[player.pk for player in players]]).delete()
+        
+        read_samples = [sample for samples, _ in read_results for sample in samples]
+        read_errors = sum(errors for _, errors in read_results)
+        self.report("readers", read_samples, read_errors, seconds)
+        self.report("writer (join+leave)", write_samples, write_errors, seconds)
+    
+    def pragma(self, name):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+    
+    def seed(self, readers):
+        owner = User.objects.create_user(username='bench_conc_owner', password='unused')
+        writer = User.objects.create_user(username='bench_conc_writer', password='unused')
+        players = [User.objects.create_user(username=f'bench_conc_{i}', password='unused') for i in range(readers)]
+        world = World.objects.create(name="Concurrency World", owner=owner)
+        parent = None
+        for depth in range(6):
+            parent = Category.objects.create(world=world, parent=parent, name=f"Level {depth}")
+        for player in players:
+            WorldUser.objects.create(world=world, user=player, role='player')
+        return owner, writer, players, world
+    
+    def read_loop(self, user, world, stop):
+        client = Client()
+        client.force_login(user)
+        urls = [reverse('core:dashboard'), reverse('core:world_detail', args=[world.id])]
+        samples, errors = [], 0
+        try:
+            while not stop.is_set():
+                for url in urls:
+                    start = time.perf_counter()
+                    try:
+                        response = client.get(url)
+                        errors += response.status_code >= 500
+                    except Exception:
+                        errors += 1
+                    samples.append(time.perf_counter() - start)
+        finally:
+            close_old_connections()
+        return samples, errors
+    
+    def write_loop(self, user, world, stop):
+        client = Client()
+        client.force_login(user)
+        samples, errors = [], 0
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    joined = client.post(reverse('core:join_world'), {'join_code': world.join_code})
+                    left = client.post(reverse('core:leave_world', args=[world.id]))
+                    errors += not (joined.json().get('success') and left.json().get('success'))
+                except Exception:
+                    errors += 1
+                samples.append(time.perf_counter() - start)
+        finally:
+            close_old_connections()
+        return samples, errors
+    
+    def report(self, label, samples, errors, seconds):
+        if not samples:
+            self.stdout.write(f"{label:<22} no requests completed")
+            return
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(
+            f"{label:<22} {len(samples) / seconds:8.1f} ops/s  "
+            f"p50 {statistics.median(samples) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  "
+            f"errors {errors}"
+        )
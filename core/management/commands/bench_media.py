@@ -0,0 +1,147 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import Client, override_settings
+from django.test.client import ClientHandler
+from django.urls import reverse
+
+from core import media
+from core.management.benchmark import BenchmarkCommand, PeakMemory
+from core.models import World, MediaFile
+
+
+BOUNDARY = 'BenchMediaBoundary'
+
+
+class MultipartBody(io.RawIOBase):
+    """A multipart/form-data body around a file on disk, read as the server consumes it"""
+    
+    def __init__(self, path, name):
+        head = (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        self.size = len(head) + os.path.getsize(path) + len(tail)
+        self.parts = [io.BytesIO(head), open(path, 'rb'), io.BytesIO(tail)]
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        while self.parts:
+            count = self.parts[0].readinto(buffer)
+            if count:
+                return count
+            self.parts.pop(0).close()
+        return 0
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark streaming media uploads, deduplication and range serving with large files"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--mb', type=int, default=200, help="Size of the uploaded file in MB")
+    
+    def run(self, mb, **options):
+        owner = get_user_model().objects.create_user(username='bench_media_owner', password='unused')
+        worlds = [World.objects.create(name=f"Media World {i}", owner=owner) for i in range(2)]
+        client = Client()
+        client.force_login(owner)
+        cookie = '; '.join(f'{name}={morsel.value}' for name, morsel in client.cookies.items())
+        handler = ClientHandler(enforce_csrf_checks=False)
+        
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            MEDIA_ROOT=root, MEDIA_MAX_UPLOAD_SIZE=(mb + 1) * 2**20, ALLOWED_HOSTS=['testserver'],
+        ):
+            source = os.path.join(root, 'handout.bin')
+            with open(source, 'wb') as file:
+                for _ in range(mb):
+                    file.write(os.urandom(2**20))
+            
+            start = time.perf_counter()
+            sha256 = hashlib.sha256()
+            with open(source, 'rb') as file, open(os.path.join(root, 'copy.bin'), 'wb') as copy:
+                while chunk := file.read(media.CHUNK_SIZE):
+                    sha256.update(chunk)
+                    copy.write(chunk)
+                os.fsync(copy.fileno())
+            os.remove(os.path.join(root, 'copy.bin'))
+            self.report("hash and copy on disk (ceiling)", mb, time.perf_counter() - start)
+            
+            for world, label in zip(worlds, ("upload, new file", "upload, same file to another world")):
+                body = MultipartBody(source, 'handout.bin')
+                environ = self.environ('POST', reverse('core:upload_media', args=[world.id]), cookie, {
+                    'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+                    'CONTENT_LENGTH': str(body.size),
+                    'wsgi.input': io.BufferedReader(body, media.CHUNK_SIZE),
+                })
+                with PeakMemory() as memory:
+                    start = time.perf_counter()
+                    response = handler(environ)
+                    elapsed = time.perf_counter() - start
+                result = json.loads(response.content)
+                self.report(label, mb, elapsed, memory, f"deduplicated={result['deduplicated']}")
+            
+            stored = MediaFile.objects.get()
+            self.stdout.write(
+                f"stored {sum(f.stat().st_size for f in os.scandir(os.path.dirname(media.blob_path(stored.digest)))) / 2**20:.0f} MB "
+                f"once for {stored.ref_count} media rows, digest matches: {stored.digest == sha256.hexdigest()}"
+            )
+            
+            url = result['media']['url']
+            with PeakMemory() as memory:
+                start = time.perf_counter()
+                response = handler(self.environ('GET', url, cookie))
+                # Exhausting the stream closes the response
+                received = sum(len(chunk) for chunk in response.streaming_content)
+                elapsed = time.perf_counter() - start
+            self.report("download whole file", received / 2**20, elapsed, memory)
+            
+            middle = mb * 2**19
+            etag = response['ETag']
+            self.measure("1 MB range from the middle", lambda: self.drain(handler(self.environ(
+                'GET', url, cookie, {'HTTP_RANGE': f'bytes={middle}-{middle + 2**20 - 1}'},
+            ))))
+            self.measure("conditional GET (304)", lambda: handler(self.environ(
+                'GET', url, cookie, {'HTTP_IF_NONE_MATCH': etag},
+            )))
+            shutil.rmtree(media.blob_root())
+    
+    def environ(self, method, path, cookie, extra=None):
+        return {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_COOKIE': cookie,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            **(extra or {}),
+        }
+    
+    def drain(self, response):
+        for _ in response.streaming_content:
+            pass
+    
+    def report(self, label, mb, elapsed, memory=None, note=''):
+        line = f"{label:<40} {elapsed * 1000:10.1f} ms  {mb / elapsed:8.1f} MB/s"
+        if memory is not None:
+            line += f"  {memory}"
+        self.stdout.write(f"{line}  {note}".rstrip())
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import CommandError
+from django.test import override_settings
+
+from core.management.benchmark import BenchmarkCommand
+from core.query_budget import ROUTES, check_budgets, profile_routes, unbudgeted_routes
+from core.query_plans import check_plans, explain_routes
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Profile every named route at several data scales and emit query "
+        "counts, duplicate queries, wall time and response size as JSON"
+    )
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(repeat=3)
+        parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 50], help="Data scales to seed")
+        parser.add_argument('--route', action='append', dest='routes', help="Only profile this route (repeatable)")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+        parser.add_argument('--check', action='store_true', help="Exit non-zero if a budget is violated")
+        parser.add_argument(
+            '--plans', action='store_true',
+            help="Also explain every query at the largest scale and report full scans and temporary sorts",
+        )
+    
+    def run(self, scales, routes, output, check, plans, **options):
+        selected = [route for route in ROUTES if not routes or route.name in routes]
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            results = profile_routes(sorted(scales), repeat=self.repeat, routes=selected)
+            if plans:
+                plan_violations = check_plans(explain_routes(max(scales), routes=selected))
+        violations = check_budgets(results, routes=selected)
+        if plans:
+            violations += plan_violations
+        if not routes:
+            violations += [f"{name} has no query budget" for name in unbudgeted_routes()]
+        report = json.dumps({
+            'scales': sorted(scales),
+            'budgets': {route.name: {scale: route.budget_at(scale) for scale in sorted(scales)} for route in selected},
+            'routes': results,
+            'violations': violations,
+        }, indent=2)
+        
+        if output:
+            with open(output, 'w') as f:
+                f.write(report + '\n')
+        else:
+            self.stdout.write(report)
+        if check and violations:
+            raise CommandError(f"{len(violations)} query budget violation(s):\n" + '\n'.join(violations))
@@ -0,0 +1,68 @@
+import itertools
+import random
+
+from accounts.models import User
+from core import search
+from core.access import WorldAccess
+from core.management.benchmark import BenchmarkCommand
+from core.models import World, WorldUser, Category
+
+
+WORDS = (
+    "dragon castle forest river goblin tavern wizard kingdom shadow crypt "
+    "mountain temple harbor merchant guild thief paladin ruins swamp desert "
+    "empire rebellion artifact prophecy necromancer elven dwarven orcish "
+    "citadel labyrinth oracle storm frost ember serpent throne ancient"
+).split()
+SYLLABLES = "ka ri mor dun el tha vos an gri lo be shi zar qua ne ul".split()
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark full-text search latency on a large index"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--worlds', type=int, default=1000, help="Number of worlds")
+        parser.add_argument('--categories', type=int, default=99, help="Categories per world")
+        parser.add_argument('--memberships', type=int, default=50, help="Worlds the searching user belongs to")
+    
+    def run(self, worlds, categories, memberships, **options):
+        rng = random.Random(42)
+        # Zipf-distributed vocabulary: a few common words, a long tail of rare ones
+        vocabulary = WORDS + sorted({
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(8000)
+        })
+        rng.shuffle(vocabulary)
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+        
+        def text(count):
+            return ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=count))
+        
+        owner = User.objects.create_user(username='bench_search_owner', password='unused')
+        player = User.objects.create_user(username='bench_search_player', password='unused')
+        
+        with self.step(f"seed {worlds} worlds x {categories} categories"):
+            created = World.objects.bulk_create([
+                World(name=text(2), description=text(20), owner=owner, join_code=f"BS{i:06d}")
+                for i in range(worlds)
+            ])
+            for world in created:
+                Category.objects.bulk_create([
+                    Category(world=world, name=f"{text(2)} {i}", description=text(30), is_hidden=(i % 10 == 0))
+                    for i in range(categories)
+                ])
+            WorldUser.objects.bulk_create([
+                WorldUser(world=world, user=player, role='player') for world in created[:memberships]
+            ])
+        
+        with self.step("rebuild index"):
+            search.rebuild_index()
+        
+        # The most frequent word is the worst case: it matches most rows
+        for term in (vocabulary[0], vocabulary[0][:3], "drag", "ancient dragon", "frost serpent throne"):
+            for user in (owner, player):
+                self.measure(
+                    f"'{term}' as {user.username.rsplit('_', 1)[-1]}",
+                    lambda: search.search(WorldAccess(user), term),
+                )
+        self.measure(f"'{vocabulary[0]}' page 5 as owner", lambda: search.search(WorldAccess(owner), vocabulary[0], page=5))
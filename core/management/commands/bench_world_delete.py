@@ -0,0 +1,85 @@
+import time
+
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from core.deletion import purge_world
+from core.management.benchmark import BenchmarkCommand
+from core.models import World, WorldUser, Category
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark delete_world request latency and the background purge against world size"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000],
+            help="Categories per world",
+        )
+        parser.add_argument('--members', type=int, default=200, help="Members per world")
+        parser.add_argument(
+            '--legacy', action='store_true',
+            help="Also time the old collector-based world.delete() on an identical world",
+        )
+    
+    def run(self, sizes, members, legacy, **options):
+        owner = User.objects.create_user(username='bench_delete_owner', password='unused')
+        players = User.objects.bulk_create([
+            User(username=f'bench_delete_player_{i}', password='unused') for i in range(members)
+        ])
+        client = Client()
+        client.force_login(owner)
+        
+        for size in sizes:
+            world = self.create_world(owner, players, size)
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                start = time.perf_counter()
+                response = client.post(reverse('core:delete_world', args=[world.id]))
+                request_ms = (time.perf_counter() - start) * 1000
+            assert response.json()['success'], response.content
+            
+            start = time.perf_counter()
+            batches = purge_world(world.id)
+            purge_ms = (time.perf_counter() - start) * 1000
+            line = (
+                f"{size:>6} categories  delete_world {request_ms:8.2f} ms  "
+                f"purge {purge_ms:9.2f} ms in {batches} batches"
+            )
+            
+            if legacy:
+                world = self.create_world(owner, players, size)
+                start = time.perf_counter()
+                world.delete()
+                line += f"  legacy delete() {(time.perf_counter() - start) * 1000:9.2f} ms"
+            self.stdout.write(line)
+    
+    def create_world(self, owner, players, size):
+        """A world with ``size`` categories, two levels deep, built in bulk"""
+        world = World.objects.create(name=f"Delete {size}", owner=owner)
+        WorldUser.objects.bulk_create([WorldUser(world=world, user=player, role='player') for player in players])
+        roots = max(1, size // 20)
+        Category.objects.bulk_create(
+            [Category(world=world, name=f"Root {i}", path='', depth=0) for i in range(roots)],
+            batch_size=1000,
+        )
+        table = Category._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {table} SET path = printf('%%010d/', id) WHERE world_id = %s", [world.id])
+        root_ids = list(Category.objects.filter(world=world).values_list('id', flat=True))
+        Category.objects.bulk_create(
+            [
+                Category(world=world, parent_id=root_ids[i % roots], name=f"Child {i}", path='', depth=1)
+                for i in range(size - roots)
+            ],
+            batch_size=1000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET path = (SELECT p.path FROM {table} p WHERE p.id = {table}.parent_id) "
+                f"|| printf('%%010d/', id) WHERE world_id = %s AND depth = 1",
+                [world.id],
+            )
+        return world
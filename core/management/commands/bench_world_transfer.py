@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import time
+
+from accounts.models import User
+from core import ranks, transfer
+from core.management.benchmark import BenchmarkCommand, PeakMemory
+from core.models import World, Category
+
+
+class Command(BenchmarkCommand):
+    help = "Benchmark importing and exporting a world with a large category tree as JSON Lines"
+    
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--categories', type=int, default=100000, help="Categories in the world")
+        parser.add_argument('--fanout', type=int, default=8, help="Subcategories per category")
+        parser.add_argument('--members', type=int, default=200, help="Members of the world")
+    
+    def run(self, categories, fanout, members, **options):
+        owner = User.objects.create_user(username='bench_transfer_owner', password='unused')
+        User.objects.bulk_create([
+            User(username=f'bench_transfer_player_{i}', email=f'bench_transfer_player_{i}@example.com')
+            for i in range(members)
+        ])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'generated.jsonl')
+            with open(source, 'wb') as file:
+                for line in self.generate(categories, fanout, members):
+                    file.write(line)
+            world = self.time_import("import generated export", source, owner)
+            
+            exported = os.path.join(directory, 'exported.jsonl')
+            with PeakMemory() as memory:
+                start = time.perf_counter()
+                with open(exported, 'wb') as file:
+                    for chunk in transfer.export_world(World.objects.select_related('owner').get(pk=world.pk)):
+                        file.write(chunk)
+                elapsed = time.perf_counter() - start
+            self.report("export", categories + members, elapsed, memory, f"{os.path.getsize(exported) / 2**20:.1f} MB")
+            
+            copy = self.time_import("import the export again", exported, owner)
+            original = list(Category.objects.filter(world=world).order_by('path').values_list('name', 'depth'))
+            copied = list(Category.objects.filter(world=copy).order_by('path').values_list('name', 'depth'))
+            self.stdout.write(f"round trip keeps the tree: {original == copied}")
+    
+    def generate(self, categories, fanout, members):
+        """An export whose category ids are in breadth-first order"""
+        yield json.dumps({'type': 'world', 'version': transfer.FORMAT_VERSION, 'name': "Transfer benchmark"}).encode() + b'\n'
+        sibling_ranks = ranks.spread(fanout)
+        for i in range(1, categories + 1):
+            parent = (i - 2) // fanout + 1 if i > 1 else None
+            yield json.dumps({
+                'type': 'category', 'id': i, 'parent': parent, 'name': f"Category {i}",
+                'description': f"Notes about category {i}", 'rank': sibling_ranks[(i - 2) % fanout if i > 1 else 0],
+            }).encode() + b'\n'
+        for i in range(members):
+            yield json.dumps({'type': 'member', 'username': f'bench_transfer_player_{i}', 'role': 'player'}).encode() + b'\n'
+    
+    def time_import(self, label, path, owner):
+        with PeakMemory() as memory, open(path, 'rb') as file:
+            start = time.perf_counter()
+            world, categories, members, _ = transfer.import_world(file, owner)
+            elapsed = time.perf_counter() - start
+        self.report(label, categories + members, elapsed, memory)
+        return world
+    
+    def report(self, label, rows, elapsed, memory, note=''):
+        self.stdout.write(
+            f"{label:<30} {elapsed * 1000:10.1f} ms  {rows / elapsed:10.0f} rows/s  {memory}  {note}".rstrip()
+        )
@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.collab import DOCUMENT_TTL, BrokerServer
+
+
+class Command(BaseCommand):
+    help = "Run the collaborative editing broker that ASGI workers share through core.collab.SocketBroker"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--path', required=True, help="Unix socket to listen on")
+        parser.add_argument('--ttl', type=int, default=DOCUMENT_TTL, help="Seconds a document outlives its last subscriber")
+    
+    def handle(self, path, ttl, **options):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.stdout.write(f"Collaboration broker listening on {path}")
+        try:
+            asyncio.run(BrokerServer(path, ttl).serve_forever())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.media import GC_BATCH_SIZE, ORPHAN_GRACE_SECONDS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete stored media files that no world uses any more, and abandoned uploads"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE, help="Files deleted per transaction")
+        parser.add_argument(
+            '--grace-hours', type=float, default=ORPHAN_GRACE_SECONDS / 3600,
+            help="Leave files without a row and unfinished uploads alone until they are this old",
+        )
+    
+    def handle(self, batch_size, grace_hours, **options):
+        removed, freed = collect_garbage(batch_size, grace=grace_hours * 3600)
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} file(s), freeing {freed / 2**20:.1f} MB."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.changes import COMPACT_BATCH_SIZE, DEFAULT_RETENTION_DAYS, compact
+
+
+class Command(BaseCommand):
+    help = "Drop superseded and expired entries from the change log clients sync from"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=DEFAULT_RETENTION_DAYS, help="Days of changes to keep")
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE, help="Rows deleted per transaction")
+    
+    def handle(self, keep_days, batch_size, **options):
+        dropped = compact(keep_days, batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Dropped {dropped} change(s)."))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import transfer
+from core.models import World
+
+
+class Command(BaseCommand):
+    help = "Write a world with its category tree and members as JSON Lines"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('world_id', type=int)
+        parser.add_argument('--output', '-o', help="File to write (default standard output)")
+    
+    def handle(self, world_id, output, **options):
+        world = World.objects.select_related('owner').filter(pk=world_id, is_active=True).first()
+        if world is None:
+            raise CommandError(f"No active world with id {world_id}.")
+        
+        target = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            for chunk in transfer.export_world(world):
+                target.write(chunk)
+        finally:
+            if output:
+                target.close()
+            else:
+                target.flush()
+        if output:
+            self.stdout.write(self.style.SUCCESS(f"Exported \"{world.name}\" to {output}."))
@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from core import transfer
+
+
+class Command(BaseCommand):
+    help = "Create a world from a JSON Lines export, in a single transaction"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Export to read, or - for standard input")
+        parser.add_argument('--owner', help="Username of the new owner (default the exported owner)")
+        parser.add_argument('--name', help="Name for the imported world (default the exported name)")
+        parser.add_argument('--batch-size', type=int, default=transfer.IMPORT_BATCH_SIZE, help="Rows per INSERT")
+    
+    def handle(self, path, owner, name, batch_size, **options):
+        if owner is not None:
+            try:
+                owner = User.objects.get(username=owner)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{owner}'.")
+        
+        source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        start = time.perf_counter()
+        try:
+            world, categories, members, missing = transfer.import_world(source, owner, name, batch_size)
+        except transfer.WorldImportError as error:
+            raise CommandError(str(error))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        elapsed = time.perf_counter() - start
+        
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Skipped {len(missing)} member(s) with no account: {', '.join(missing)}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported \"{world.name}\" (id {world.id}, join code {world.join_code}): "
+            f"{categories} categories and {members} members in {elapsed:.2f}s."
+        ))
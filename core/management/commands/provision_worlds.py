@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from core.provisioning import provision_worlds
+
+
+class Command(BaseCommand):
+    help = "Create many worlds for one owner at once and print their join codes"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('owner', help="Username of the world owner")
+        parser.add_argument('--count', type=int, help="Number of worlds to create as '<prefix> <n>'")
+        parser.add_argument('--prefix', default='Table', help="Name prefix used with --count")
+        parser.add_argument('--names-file', help="File with one world name per line")
+        parser.add_argument('--theme-color', default='#8b7355')
+    
+    def handle(self, owner, count, prefix, names_file, theme_color, **options):
+        try:
+            owner = User.objects.get(username=owner)
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{owner}'.")
+        
+        if names_file:
+            with open(names_file) as handle:
+                names = [line.strip() for line in handle if line.strip()]
+        elif count:
+            names = [f"{prefix} {number}" for number in range(1, count + 1)]
+        else:
+            raise CommandError("Pass --count or --names-file.")
+        
+        for world in provision_worlds(owner, names, theme_color=theme_color):
+            self.stdout.write(f"{world.join_code}\t{world.name}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.deletion import PURGE_BATCH_SIZE, purge_deleted_worlds
+
+
+class Command(BaseCommand):
+    help = "Remove the categories, members and rows of worlds their owners have deleted"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help="Rows deleted per transaction")
+    
+    def handle(self, batch_size, **options):
+        world_ids = purge_deleted_worlds(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Purged {len(world_ids)} deleted world(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.reordering import rebalance_long_ranks
+
+
+class Command(BaseCommand):
+    help = "Give evenly spaced ranks to every sibling group whose ranks have grown long"
+    
+    def handle(self, **options):
+        groups = rebalance_long_ranks()
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {groups} sibling group(s)."))
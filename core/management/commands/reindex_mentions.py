@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import references
+from core.models import World
+
+
+class Command(BaseCommand):
+    help = "Rebuild the mention cross references of every entry in one or more worlds"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--world', type=int, action='append', dest='world_ids', help="World id (repeatable; default every active world)")
+        parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: one per CPU)")
+        parser.add_argument('--batch-size', type=int, default=references.REINDEX_BATCH_SIZE, help="Entries per batch")
+    
+    def handle(self, world_ids, workers, batch_size, **options):
+        if workers is not None and workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        if not world_ids:
+            world_ids = list(World.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+        
+        for world_id in world_ids:
+            start = time.perf_counter()
+            created, updated, deleted = references.reindex_world(world_id, workers, batch_size)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"World {world_id}: {created} created, {updated} updated, {deleted} deleted in {elapsed:.2f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Reindexed mentions in {len(world_ids)} world(s)."))
@@ -0,0 +1,326 @@
+"""
+Content-addressed storage for world media.
+
+``HashingUploadHandler`` streams each uploaded file into a temporary file
+under ``MEDIA_ROOT/uploads`` and hashes every chunk as it arrives, so an
+upload is never held in memory whatever its size. ``store()`` then files
+the bytes under their SHA-256 digest in ``MEDIA_ROOT/blobs`` (a
+``MediaFile`` row) and records a ``Media`` row for the world. Bytes that
+are already stored, such as a handout shared by several worlds, are kept
+once and the new temporary file is discarded.
+
+Each ``MediaFile`` counts the ``Media`` rows that use it: signals keep the
+count as media are added and deleted, and world purges release theirs in
+bulk. ``collect_garbage()`` deletes files whose count has dropped to zero,
+blob files left behind by rolled-back transactions, and abandoned uploads.
+
+``serve()`` answers conditional requests from the digest, which makes a
+strong ETag, and single byte ranges, so viewers and players can seek in
+large files.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from django.utils.text import get_valid_filename
+
+from .models import Media, MediaFile
+
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 512 * 1024 * 1024
+# Room for the multipart boundaries and headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+GC_BATCH_SIZE = 500
+# Blob files without a row and unfinished uploads are left alone until
+# they are this old, so a transaction still storing one isn't raced
+ORPHAN_GRACE_SECONDS = 24 * 60 * 60
+
+# Types a browser may display in the page; anything else is a download
+INLINE_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf', 'text/plain')
+INLINE_PREFIXES = ('audio/', 'video/')
+# A media URL always serves the same bytes
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def max_upload_size():
+    return getattr(settings, 'MEDIA_MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+
+
+def blob_root():
+    return os.path.join(settings.MEDIA_ROOT, 'blobs')
+
+
+def upload_root():
+    return os.path.join(settings.MEDIA_ROOT, 'uploads')
+
+
+def blob_path(digest):
+    """Where the bytes with ``digest`` are stored, fanned out by its first two bytes"""
+    return os.path.join(blob_root(), digest[:2], digest[2:4], digest)
+
+
+def _temporary_file():
+    os.makedirs(upload_root(), exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=upload_root(), prefix='upload-', delete=False)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class HashedUpload(UploadedFile):
+    """An uploaded file on disk in MEDIA_ROOT/uploads, with the SHA-256 of its contents"""
+    
+    def __init__(self, file, name, content_type, size, digest, charset=None, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.digest = digest
+    
+    def temporary_file_path(self):
+        return self.file.name
+    
+    def discard(self):
+        """Close the file and remove it, unless store() has moved it into place"""
+        self.close()
+        _remove(self.temporary_file_path())
+    
+    @classmethod
+    def from_file(cls, source, name, content_type=None):
+        """Copy a file-like object into a temporary upload, hashing it on the way"""
+        file, sha256, size = _temporary_file(), hashlib.sha256(), 0
+        while chunk := source.read(CHUNK_SIZE):
+            sha256.update(chunk)
+            file.write(chunk)
+            size += len(chunk)
+        file.seek(0)
+        return cls(file, name, content_type, size, sha256.hexdigest())
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Streams each uploaded file to a temporary file, hashing it as it goes"""
+    
+    chunk_size = CHUNK_SIZE
+    
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or max_upload_size()
+        self.too_large = False
+        self.paths = []
+    
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = _temporary_file()
+        self.paths.append(self.file.name)
+        self.sha256 = hashlib.sha256()
+    
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+    
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        return HashedUpload(
+            self.file, self.file_name, self.content_type, file_size, self.sha256.hexdigest(),
+            self.charset, self.content_type_extra,
+        )
+    
+    def upload_interrupted(self):
+        self.discard()
+    
+    def discard(self):
+        """Remove every temporary file that store() didn't move into place"""
+        if hasattr(self, 'file'):
+            self.file.close()
+        for path in self.paths:
+            _remove(path)
+        self.paths = []
+
+
+def store(upload, world_id, uploaded_by, entry_id=None):
+    """
+    Record ``upload`` (a HashedUpload) as media of the world, moving its
+    bytes into the store unless they are already there. Returns the
+    ``Media`` and whether its bytes were already stored.
+    """
+    original = os.path.basename((upload.name or '').replace('\\', '/'))[:255]
+    try:
+        filename = get_valid_filename(original)[:255]
+    except SuspiciousFileOperation:
+        filename = 'file'
+    mime_type = mimetypes.guess_type(filename)[0] or upload.content_type or 'application/octet-stream'
+    path = blob_path(upload.digest)
+    
+    with transaction.atomic():
+        # The row lock (the write lock on SQLite) keeps collect_garbage()
+        # from removing the file between this check and the commit
+        stored, created = MediaFile.objects.select_for_update().get_or_create(
+            digest=upload.digest, defaults={'size': upload.size},
+        )
+        deduplicated = not created and os.path.exists(path)
+        if not deduplicated:
+            upload.file.flush()
+            os.fsync(upload.file.fileno())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(upload.temporary_file_path(), path)
+        media = Media.objects.create(
+            filename=filename, original_filename=original or filename, file=stored, file_size=upload.size,
+            mime_type=mime_type[:100], world_id=world_id, entry_id=entry_id, uploaded_by=uploaded_by,
+        )
+    upload.discard()
+    return media, deduplicated
+
+
+def release(digests):
+    """Drop a reference for each digest in ``digests``, for media deleted without signals"""
+    for digest, count in Counter(digests).items():
+        MediaFile.objects.adjust_references(digest, -count)
+
+
+def collect_garbage(batch_size=GC_BATCH_SIZE, sweep=True, grace=ORPHAN_GRACE_SECONDS):
+    """
+    Delete stored files that no media use any more. With ``sweep``, also
+    remove blob files that have no row and abandoned uploads, once they
+    are ``grace`` seconds old. Returns (files removed, bytes freed).
+    """
+    unused = MediaFile.objects.filter(ref_count=0).exclude(Exists(Media.objects.filter(file=OuterRef('pk'))))
+    removed = freed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(unused.select_for_update().order_by('created_at').values_list('digest', 'size')[:batch_size])
+            if not rows:
+                break
+            MediaFile.objects.filter(pk__in=[digest for digest, _ in rows]).delete()
+            # Removed before the commit: a store() waiting on the lock then
+            # finds the row gone and writes the file again
+            for digest, size in rows:
+                _remove(blob_path(digest))
+                removed += 1
+                freed += size
+    if not sweep:
+        return removed, freed
+    
+    cutoff = time.time() - grace
+    for directory, _, names in os.walk(blob_root()):
+        old = {}
+        for name in names:
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff:
+                old[name] = (path, stat.st_size)
+        known = set(MediaFile.objects.filter(pk__in=list(old)).values_list('digest', flat=True)) if old else set()
+        for name, (path, size) in old.items():
+            if name not in known:
+                _remove(path)
+                removed += 1
+                freed += size
+    if os.path.isdir(upload_root()):
+        for entry in os.scandir(upload_root()):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                _remove(entry.path)
+    return removed, freed
+
+
+def requested_range(request, etag, size):
+    """
+    The single byte range ``request`` asks for as inclusive (start, end),
+    None to send the whole file, or False if the range can't be satisfied.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range.strip() != etag:
+        # The client's partial copy is of other bytes
+        return None
+    match = BYTE_RANGE.match(header.strip())
+    if match is None:
+        # Malformed, or several ranges, which aren't worth a multipart reply
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class MediaFileResponse(FileResponse):
+    block_size = CHUNK_SIZE
+
+
+def _read_range(file, length):
+    with file:
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, media):
+    """A response with the bytes of ``media``, honoring conditional and Range requests"""
+    etag = quote_etag(media.file_id)
+    last_modified = int(media.created_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, media, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = CACHE_CONTROL
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _file_response(request, media, etag):
+    size = media.file_size
+    byte_range = requested_range(request, etag, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    try:
+        file = open(blob_path(media.file_id), 'rb')
+    except FileNotFoundError:
+        raise Http404("Media file not found")
+    
+    as_attachment = not (media.mime_type in INLINE_TYPES or media.mime_type.startswith(INLINE_PREFIXES))
+    if byte_range is None:
+        return MediaFileResponse(file, content_type=media.mime_type, as_attachment=as_attachment, filename=media.filename)
+    start, end = byte_range
+    file.seek(start)
+    response = StreamingHttpResponse(_read_range(file, end - start + 1), status=206, content_type=media.mime_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, media.filename)
+    return response
@@ -0,0 +1,219 @@
+"""Per-view request metrics, kept in process and exposed in Prometheus format
+
+InstrumentationMiddleware opens a RequestTimings for every request. SQL is
+timed by an execute wrapper installed on each new database connection, and
+template rendering by core.template_backends.DjangoTemplates. Both find the current
+request's timings through a context variable, so queries run from
+sync_to_async threads are counted against the request that issued them.
+Fragment cache lookups ({% fragment %}) are counted the same way.
+
+Metrics are per process: with several workers, each one serves its own.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+
+# Upper bounds of the histogram buckets (+Inf is implicit)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent in SQL and templates"""
+    __slots__ = ('start', 'queries', 'sql_seconds', 'template_seconds', 'fragment_hits', 'fragment_misses')
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+
+def start_request():
+    """Begin timing a request; returns (timings, token) for finish_request"""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def record_sql(execute, sql, params, many, context):
+    """Database execute wrapper that charges the query to the current request"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_seconds += time.perf_counter() - start
+        timings.queries += 1
+
+
+def instrument_connection(connection):
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+def record_template(seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.template_seconds += seconds
+
+
+def record_fragment(name, hit):
+    FRAGMENT_LOOKUPS.inc(name, 'hit' if hit else 'miss')
+    timings = _current.get()
+    if timings is not None:
+        if hit:
+            timings.fragment_hits += 1
+        else:
+            timings.fragment_misses += 1
+
+
+def _escape(label_value):
+    return label_value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class Histogram:
+    """A Prometheus histogram with a single ``view`` label"""
+    
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # view -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+    
+    def observe(self, view, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                series = self._series[view] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+    
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+    
+    def render(self):
+        with self._lock:
+            snapshot = {view: list(series) for view, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for view, series in sorted(snapshot.items()):
+            label = _escape(view)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {series[-1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """A Prometheus counter with a fixed set of labels"""
+    
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+    
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+    
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+    
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+    
+    def render(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, count in sorted(snapshot.items()):
+            labels = ','.join(
+                f'{label}="{_escape(value)}"' for label, value in zip(self.labels, label_values)
+            )
+            lines.append(f'{self.name}{{{labels}}} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'plothook_request_duration_seconds', "Time spent handling the request", SECONDS_BUCKETS,
+)
+SQL_QUERIES = Histogram('plothook_sql_queries', "SQL queries run per request", QUERY_BUCKETS)
+SQL_SECONDS = Histogram('plothook_sql_duration_seconds', "Time spent in SQL per request", SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram(
+    'plothook_template_render_seconds', "Time spent rendering templates per request", SECONDS_BUCKETS,
+)
+RESPONSE_BYTES = Histogram('plothook_response_bytes', "Size of the response body", BYTES_BUCKETS)
+
+FRAGMENT_LOOKUPS = Counter(
+    'plothook_fragment_cache_lookups_total', "Fragment cache lookups by fragment and result",
+    ('fragment', 'result'),
+)
+
+HISTOGRAMS = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, TEMPLATE_SECONDS, RESPONSE_BYTES)
+COUNTERS = (FRAGMENT_LOOKUPS,)
+
+
+def observe(request, response, timings):
+    """Record a finished request and add its Server-Timing header"""
+    elapsed = time.perf_counter() - timings.start
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else UNRESOLVED_VIEW
+    size = 0 if response.streaming else len(response.content)
+    
+    REQUEST_SECONDS.observe(view, elapsed)
+    SQL_QUERIES.observe(view, timings.queries)
+    SQL_SECONDS.observe(view, timings.sql_seconds)
+    TEMPLATE_SECONDS.observe(view, timings.template_seconds)
+    RESPONSE_BYTES.observe(view, size)
+    
+    server_timing = (
+        f'app;dur={elapsed * 1000:.1f}, '
+        f'db;dur={timings.sql_seconds * 1000:.1f};desc="{timings.queries} queries", '
+        f'tpl;dur={timings.template_seconds * 1000:.1f}'
+    )
+    if timings.fragment_hits or timings.fragment_misses:
+        server_timing += f', frag;desc="{timings.fragment_hits} hits, {timings.fragment_misses} misses"'
+    if response.has_header('Server-Timing'):
+        server_timing = f"{response['Server-Timing']}, {server_timing}"
+    response['Server-Timing'] = server_timing
+    return response
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in HISTOGRAMS + COUNTERS:
+        metric.reset()
@@ -0,0 +1,54 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from . import assets, metrics
+
+
+@sync_and_async_middleware
+def InstrumentationMiddleware(get_response):
+    """Time each request and report it as Server-Timing and in core.metrics
+
+    Goes first in MIDDLEWARE so the session and user lookups are counted.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings, token = metrics.start_request()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.finish_request(token)
+            return metrics.observe(request, response, timings)
+    else:
+        def middleware(request):
+            timings, token = metrics.start_request()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.finish_request(token)
+            return metrics.observe(request, response, timings)
+    return middleware
+
+
+@sync_and_async_middleware
+def StaticAssetMiddleware(get_response):
+    """Serve collected static files from STATIC_ROOT with core.assets.serve()
+
+    Goes before the session and auth middleware so assets cost no lookups.
+    """
+    if not settings.STATIC_ROOT:
+        raise MiddlewareNotUsed
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = assets.serve(request)
+            if response is None:
+                response = await get_response(request)
+            return response
+    else:
+        def middleware(request):
+            response = assets.serve(request)
+            if response is None:
+                response = get_response(request)
+            return response
+    return middleware
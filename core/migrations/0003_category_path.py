@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:08
+
+from django.db import migrations, models
+
+
+PATH_STEP = 11
+BATCH_SIZE = 1000
+
+
+def backfill_category_paths(apps, schema_editor):
+    """Populate path/depth level by level, one query per tree level"""
+    Category = apps.get_model('core', 'Category')
+    
+    level = list(Category.objects.filter(parent__isnull=True).only('id'))
+    paths = {}
+    depth = 0
+    while level:
+        for category in level:
+            parent_path = paths.get(category.parent_id, '')
+            category.path = f"{parent_path}{category.id:0{PATH_STEP - 1}d}/"
+            category.depth = depth
+            paths[category.id] = category.path
+        Category.objects.bulk_update(level, ['path', 'depth'], batch_size=BATCH_SIZE)
+        
+        parent_ids = [category.id for category in level]
+        level = []
+        for start in range(0, len(parent_ids), BATCH_SIZE):
+            level.extend(
+                Category.objects.filter(parent_id__in=parent_ids[start:start + BATCH_SIZE]).only('id', 'parent_id')
+            )
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_world_theme_color'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of ancestors'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized path of ancestor ids, maintained on save', max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create and populate the FTS5 search index (SQLite only)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS core_search_index USING fts5("
+        "name, description, scope, world_id UNINDEXED, is_hidden UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_search_index (rowid, name, description, scope, world_id, is_hidden) "
+        "SELECT id * 2, name, description, 'w' || id, id, 0 FROM core_world"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_search_index (rowid, name, description, scope, world_id, is_hidden) "
+        "SELECT id * 2 + 1, name, description, 'w' || world_id, world_id, is_hidden FROM core_category"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_category_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:19
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_world_counters(apps, schema_editor):
+    World = apps.get_model('core', 'World')
+    WorldUser = apps.get_model('core', 'WorldUser')
+    Category = apps.get_model('core', 'Category')
+    
+    def count_of(model):
+        counts = model.objects.filter(world=OuterRef('pk')).order_by().values('world').annotate(n=Count('pk')).values('n')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    
+    World.objects.update(
+        member_count=count_of(WorldUser),
+        category_count=count_of(Category),
+        last_activity_at=F('updated_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='world',
+            name='category_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of categories'),
+        ),
+        migrations.AddField(
+            model_name='world',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Last change to the world or its members and categories'),
+        ),
+        migrations.AddField(
+            model_name='world',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of WorldUser memberships'),
+        ),
+        migrations.RunPython(backfill_world_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:22
+
+import secrets
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_sequence_row(apps, schema_editor):
+    JoinCodeSequence = apps.get_model('core', 'JoinCodeSequence')
+    JoinCodeSequence.objects.get_or_create(id=1, defaults={'secret': secrets.token_hex(32)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_world_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JoinCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.BigIntegerField(default=0, help_text='Last counter value handed out')),
+                ('secret', models.CharField(help_text='Key for the join code permutation', max_length=64)),
+            ],
+            options={
+                'verbose_name': 'Join Code Sequence',
+            },
+        ),
+        migrations.AlterField(
+            model_name='world',
+            name='join_code',
+            field=models.CharField(blank=True, help_text='Unique code for sharing world access', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='world',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('join_code',), name='world_active_join_code_uniq'),
+        ),
+        migrations.RunPython(create_sequence_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_join_code_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='world',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the owner deleted the world; its rows are purged in the background', null=True),
+        ),
+        migrations.AlterField(
+            model_name='world',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Inactive worlds are hidden from every page, API and search'),
+        ),
+        migrations.AddIndex(
+            model_name='world',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='world_pending_purge_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_world_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Entry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('title', models.CharField(help_text='Entry title', max_length=255)),
+                ('entry_type', models.CharField(blank=True, help_text='npc, location, item, quest, etc.', max_length=50)),
+                ('metadata', models.JSONField(blank=True, default=dict, help_text='Type-specific structured data')),
+                ('is_hidden', models.BooleanField(default=False, help_text='Hide entry from non-authors')),
+                ('content_size', models.PositiveIntegerField(default=0, editable=False, help_text='Uncompressed size of the document JSON in bytes')),
+                ('summary', models.CharField(blank=True, editable=False, help_text='Start of the document text for previews', max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_data', models.BinaryField(default=b'', help_text='zlib-compressed Prosemirror JSON; read through ``content``')),
+                ('plaintext', models.TextField(blank=True, editable=False, help_text='Document text for search, maintained on save')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authored_entries', to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(blank=True, help_text='Organizational category', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='core.category')),
+                ('parent_entry', models.ForeignKey(blank=True, help_text='Entry this entry belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='child_entries', to='core.entry')),
+                ('world', models.ForeignKey(help_text='World this entry belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.world')),
+            ],
+            options={
+                'verbose_name': 'Entry',
+                'verbose_name_plural': 'Entries',
+                'ordering': ['title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EntryBlob',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('digest', models.CharField(help_text='SHA-256 of the data, referenced from the document', max_length=64)),
+                ('data', models.BinaryField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blobs', to='core.entry')),
+            ],
+            options={
+                'verbose_name': 'Entry Blob',
+                'verbose_name_plural': 'Entry Blobs',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(condition=models.Q(('is_hidden', False)), fields=['category', 'title'], name='entry_category_listing_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='entryblob',
+            unique_together={('entry', 'digest')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrossReference',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('reference_type', models.CharField(choices=[('mentions', 'Mentions'), ('related', 'Related'), ('parent_child', 'Parent-Child'), ('location', 'Location')], default='mentions', help_text='Mentions are maintained from entry documents; other types are added by hand', max_length=20)),
+                ('context', models.TextField(blank=True, help_text='How they are related or context of reference')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_references', to='core.entry')),
+                ('target_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_references', to='core.entry')),
+            ],
+            options={
+                'verbose_name': 'Cross Reference',
+                'verbose_name_plural': 'Cross References',
+                'unique_together': {('source_entry', 'target_entry')},
+            },
+        ),
+    ]
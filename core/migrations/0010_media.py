@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_cross_references'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('digest', models.CharField(help_text="SHA-256 of the contents; also the file's name on disk", max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField(help_text='Size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, editable=False, help_text='Media rows using this file')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Media File',
+                'verbose_name_plural': 'Media Files',
+                'indexes': [models.Index(condition=models.Q(('ref_count', 0)), fields=['created_at'], name='media_file_unused_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Media',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('filename', models.CharField(help_text='Safe name the file is served under', max_length=255)),
+                ('original_filename', models.CharField(help_text='Name of the file as uploaded', max_length=255)),
+                ('file_size', models.PositiveBigIntegerField()),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('entry', models.ForeignKey(blank=True, help_text='If directly attached to entry', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='media', to='core.entry')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_media', to=settings.AUTH_USER_MODEL)),
+                ('world', models.ForeignKey(help_text='World this media belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='media', to='core.world')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='media', to='core.mediafile')),
+            ],
+            options={
+                'verbose_name': 'Media',
+                'verbose_name_plural': 'Media',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
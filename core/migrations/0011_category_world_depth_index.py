@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_media'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['world', 'depth', 'path'], name='category_world_depth_idx'),
+        ),
+    ]
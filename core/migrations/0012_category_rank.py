@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:42
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+from core import ranks
+
+
+def rank_siblings(apps, schema_editor):
+    """Give each sibling group evenly spaced ranks in its sort_order, name order"""
+    Category = apps.get_model('core', 'Category')
+    rows = Category.objects.order_by('world_id', 'parent_id', 'sort_order', 'name', 'pk').values_list('pk', 'world_id', 'parent_id')
+    changed = []
+    for _, group in groupby(list(rows), key=lambda row: row[1:]):
+        group = [pk for pk, _, _ in group]
+        changed.extend(Category(pk=pk, rank=rank) for pk, rank in zip(group, ranks.spread(len(group))))
+        if len(changed) >= 1000:
+            Category.objects.bulk_update(changed, ['rank'])
+            changed = []
+    Category.objects.bulk_update(changed, ['rank'])
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('core', '0011_category_world_depth_index'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='rank',
+            field=models.CharField(blank=True, default='', help_text='Order within parent category, as a lexicographic rank key (core.ranks)', max_length=64),
+        ),
+        migrations.RunPython(rank_siblings, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='category',
+            options={'ordering': ['rank', 'name'], 'verbose_name': 'Category', 'verbose_name_plural': 'Categories'},
+        ),
+        migrations.RemoveField(
+            model_name='category',
+            name='sort_order',
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['world', 'parent', 'rank'], name='category_sibling_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_category_rank'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_sibling_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['world', 'parent', 'rank', 'name'], name='category_sibling_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('is_hidden', False)), fields=['parent', 'rank', 'name'], name='category_visible_children_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='world',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['owner', 'created_at'], name='world_owner_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worlduser',
+            index=models.Index(fields=['user', 'world', 'role'], name='worlduser_user_covering_idx'),
+        ),
+    ]
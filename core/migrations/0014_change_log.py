@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_composite_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.BigIntegerField(default=0, help_text='Cursors before this must resync from scratch')),
+            ],
+            options={
+                'verbose_name': 'Change Log Horizon',
+            },
+        ),
+        migrations.CreateModel(
+            name='WorldChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('world_id', models.BigIntegerField(help_text='World the changed object belongs to')),
+                ('kind', models.CharField(choices=[('world', 'World'), ('membership', 'Membership'), ('category', 'Category')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('user_id', models.BigIntegerField(blank=True, help_text='User who also sees this change after losing access to the world', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'World Change',
+                'verbose_name_plural': 'World Changes',
+                'indexes': [models.Index(fields=['world_id', 'id'], name='world_change_world_idx'), models.Index(condition=models.Q(('user_id__isnull', False)), fields=['user_id', 'id'], name='world_change_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def _recreate(schema_editor, prefix, hidden_scope):
+    schema_editor.execute("DROP TABLE IF EXISTS core_search_index")
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE core_search_index USING fts5("
+        "name, description, scope, world_id UNINDEXED, is_hidden UNINDEXED, "
+        f"tokenize = 'unicode61 remove_diacritics 2', prefix = '{prefix}')"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_search_index (rowid, name, description, scope, world_id, is_hidden) "
+        "SELECT id * 2, name, description, 'w' || id, id, 0 FROM core_world"
+    )
+    schema_editor.execute(
+        "INSERT INTO core_search_index (rowid, name, description, scope, world_id, is_hidden) "
+        f"SELECT id * 2 + 1, name, description, {hidden_scope} || world_id, world_id, is_hidden FROM core_category"
+    )
+
+
+def hidden_scope_tokens(apps, schema_editor):
+    """Give hidden categories an h<world_id> scope token and index 4-character prefixes (SQLite only)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    _recreate(schema_editor, '2 3 4', "CASE WHEN is_hidden THEN 'h' ELSE 'w' END")
+
+
+def shared_scope_tokens(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    _recreate(schema_editor, '2 3', "'w'")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(hidden_scope_tokens, shared_scope_tokens),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_search_hidden_scope'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False, help_text='Materialized path of ancestor ids, maintained on save'),
+        ),
+    ]
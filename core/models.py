@@ -1,6 +1,88 @@
-from django.db import models
+import secrets
+
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Concat, Greatest, Substr
+from django.db import connection
 from django.conf import settings
-import uuid
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import documents, fragments, join_codes, ranks
+
+
+class WorldQuerySet(models.QuerySet):
+    
+    def for_dashboard(self, user):
+        """
+        Every active world ``user`` owns or belongs to, in a single query.
+        
+        Each world is annotated with ``role`` ('owner' or the WorldUser role)
+        and has its owner joined, so cards can show the role, owner name,
+        member and category counters and ``last_activity_at`` without
+        further queries.
+        """
+        membership = WorldUser.objects.filter(world=OuterRef('pk'), user=user)
+        # An IN subquery, unlike EXISTS, lets SQLite look up each side of the
+        # OR through an index instead of scanning every active world
+        joined = WorldUser.objects.filter(user=user).order_by().values('world_id')
+        return self.filter(
+            Q(owner=user) | Q(pk__in=joined),
+            is_active=True,
+        ).annotate(
+            role=Case(
+                When(owner=user, then=Value('owner')),
+                default=Subquery(membership.values('role')[:1]),
+            ),
+        ).select_related('owner')
+    
+    def page_for_user(self, user, fields, after=None, limit=50):
+        """
+        One keyset page of the active worlds ``user`` can access, newest first.
+        
+        Owned and joined worlds are fetched by two index-friendly branches
+        combined with UNION ALL instead of an OR join with DISTINCT.
+        ``after`` is the ``(created_at, id)`` of the last row already seen.
+        Rows are dicts of ``fields`` plus ``created_at`` and ``id``;
+        ``is_owner`` is computed in SQL from ``owner_id``.
+        """
+        columns = list(dict.fromkeys(['id', 'created_at', *fields]))
+        is_owner = ExpressionWrapper(Q(owner_id=user.pk), output_field=models.BooleanField())
+        
+        branches = []
+        for branch in (
+            self.filter(owner=user, is_active=True),
+            self.filter(world_users__user=user, is_active=True).exclude(owner=user),
+        ):
+            if after is not None:
+                created_at, pk = after
+                branch = branch.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            branches.append(branch.annotate(is_owner=is_owner).order_by().values(*columns))
+        
+        owned, joined = branches
+        return owned.union(joined, all=True).order_by('-created_at', '-id')[:limit]
+    
+    def adjust_counter(self, world_id, field, delta):
+        """Atomically add ``delta`` to a counter column and bump last activity"""
+        # update() sends no signals, so the world's cached cards are dropped here
+        fragments.bump(self.model, world_id)
+        return self.filter(pk=world_id).update(
+            **{field: Greatest(F(field) + delta, Value(0))},
+            last_activity_at=timezone.now(),
+        )
+    
+    def adjust_counters(self, world_ids, field, delta):
+        """adjust_counter() for several worlds in one statement"""
+        fragments.bump(self.model, *world_ids)
+        return self.filter(pk__in=world_ids).update(
+            **{field: Greatest(F(field) + delta, Value(0))},
+            last_activity_at=timezone.now(),
+        )
+    
+    def touch(self, world_id):
+        """Record activity in a world without loading it"""
+        fragments.bump(self.model, world_id)
+        return self.filter(pk=world_id).update(last_activity_at=timezone.now())
 
 
 class World(models.Model):
@@ -17,7 +99,6 @@ class World(models.Model):
     )
     join_code = models.CharField(
         max_length=20,
-        unique=True,
         blank=True,
         help_text="Unique code for sharing world access"
     )
@@ -26,22 +107,103 @@ class World(models.Model):
         default='#8b7355',
         help_text="Theme color for the world card"
     )
-    is_active = models.BooleanField(default=True, help_text="Whether world is currently active")
+    is_active = models.BooleanField(default=True, help_text="Inactive worlds are hidden from every page, API and search")
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, help_text="When the owner deleted the world; its rows are purged in the background")
+    member_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of WorldUser memberships")
+    category_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of categories")
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False, help_text="Last change to the world or its members and categories")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = WorldQuerySet.as_manager()
+    
+    # Maintained with F() updates only; a regular save() never writes them
+    COUNTER_FIELDS = ('member_count', 'category_count')
+    
     class Meta:
         verbose_name = 'World'
         verbose_name_plural = 'Worlds'
         ordering = ['-created_at']
+        constraints = [
+            # Codes come from JoinCodeSequence and never repeat, so the index
+            # only needs to cover the active worlds join_world looks up
+            models.UniqueConstraint(fields=['join_code'], condition=Q(is_active=True), name='world_active_join_code_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='world_pending_purge_idx'),
+            # A user's own worlds, newest first, read backwards for -created_at
+            models.Index(fields=['owner', 'created_at'], condition=Q(is_active=True), name='world_owner_active_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored owner so ownership changes can be detected
+        instance._loaded_owner_id = instance.__dict__.get('owner_id')
+        return instance
+    
+    @property
+    def previous_owner_id(self):
+        """Owner id as last loaded from or saved to the database"""
+        return getattr(self, '_loaded_owner_id', None)
+    
     def save(self, *args, **kwargs):
         if not self.join_code:
-            self.join_code = str(uuid.uuid4())[:8].upper()
+            self.join_code = JoinCodeSequence.allocate()[0]
+        self.last_activity_at = timezone.now()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Don't clobber counters that changed since this instance was loaded
+            excluded = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in excluded and field.name not in excluded
+            ]
         super().save(*args, **kwargs)
+        self._loaded_owner_id = self.owner_id
+
+
+class JoinCodeSequence(models.Model):
+    """Single-row counter whose values are permuted into join codes"""
+    
+    last_value = models.BigIntegerField(default=0, help_text="Last counter value handed out")
+    secret = models.CharField(max_length=64, help_text="Key for the join code permutation")
+    
+    class Meta:
+        verbose_name = 'Join Code Sequence'
+    
+    def __str__(self):
+        return f"Join codes issued: {self.last_value}"
+    
+    @classmethod
+    def allocate(cls, count=1):
+        """
+        Reserve ``count`` unique join codes with a single UPDATE.
+        
+        The write lock taken by the UPDATE serializes concurrent callers, so
+        no two callers ever receive the same counter values.
+        """
+        row = cls._advance(count)
+        if row is None:
+            # Migration 0006 creates the row, but a flushed database loses
+            # it; codes issued under a new secret are still checked by the
+            # unique constraint on active join codes
+            cls.objects.get_or_create(pk=1, defaults={'secret': secrets.token_hex(32)})
+            row = cls._advance(count)
+        last_value, secret = row
+        return join_codes.codes_for(range(last_value - count, last_value), secret)
+    
+    @classmethod
+    def _advance(cls, count):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {cls._meta.db_table} SET last_value = last_value + %s "
+                f"WHERE id = 1 RETURNING last_value, secret",
+                [count],
+            )
+            return cursor.fetchone()
 
 
 class WorldUser(models.Model):
@@ -64,6 +226,10 @@ class WorldUser(models.Model):
         verbose_name_plural = 'World Users'
         unique_together = ['world', 'user']
         ordering = ['-joined_at']
+        indexes = [
+            # Covers membership maps, which read (world, role) by user
+            models.Index(fields=['user', 'world', 'role'], name='worlduser_user_covering_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.world.name} ({self.role})"
@@ -72,6 +238,11 @@ class WorldUser(models.Model):
 class Category(models.Model):
     """Hierarchical organization for World Book content"""
     
+    # Width of one zero-padded id segment in ``path`` (including the separator)
+    PATH_STEP = 11
+    # Maintained by _update_path() only; a regular save() never writes them
+    PATH_FIELDS = ('path', 'depth')
+    
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=255, help_text="Category name")
     description = models.TextField(blank=True, help_text="Brief description of the category")
@@ -84,7 +255,21 @@ class Category(models.Model):
         related_name='subcategories',
         help_text="Parent category for hierarchy"
     )
-    sort_order = models.IntegerField(default=0, help_text="Order within parent category")
+    # Unbounded, as each level adds PATH_STEP characters
+    path = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        help_text="Materialized path of ancestor ids, maintained on save"
+    )
+    depth = models.PositiveIntegerField(default=0, editable=False, help_text="Number of ancestors")
+    rank = models.CharField(
+        max_length=ranks.MAX_LENGTH,
+        blank=True,
+        default='',
+        help_text="Order within parent category, as a lexicographic rank key (core.ranks)"
+    )
     is_hidden = models.BooleanField(default=False, help_text="Hide category from non-authors")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -93,26 +278,457 @@ class Category(models.Model):
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
         unique_together = ['world', 'parent', 'name']
-        ordering = ['sort_order', 'name']
+        ordering = ['rank', 'name']
+        indexes = [
+            # Siblings in display order, including hidden ones for moves
+            models.Index(fields=['world', 'parent', 'rank', 'name'], name='category_sibling_order_idx'),
+            # Visible subcategories of a category in display order
+            models.Index(fields=['parent', 'rank', 'name'], condition=Q(is_hidden=False), name='category_visible_children_idx'),
+            # World exports read a tree level by level and purges delete it
+            # deepest first, both without sorting
+            models.Index(fields=['world', 'depth', 'path'], name='category_world_depth_idx'),
+        ]
     
     def __str__(self):
         if self.parent:
             return f"{self.parent.name} > {self.name}"
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored parent so save() can detect moves
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+    
+    @classmethod
+    def path_segment(cls, pk):
+        """Return the path segment for a category id"""
+        return f"{pk:0{cls.PATH_STEP - 1}d}/"
+    
+    def stored_paths(self, parent_id, include_self=True):
+        """
+        The stored paths of this category and of ``parent_id``, either of
+        which a move of an ancestor may have changed since it was loaded.
+        """
+        ids = [pk for pk in (self.pk if include_self else None, parent_id) if pk]
+        paths = dict(Category.objects.filter(pk__in=ids).order_by().values_list('pk', 'path')) if ids else {}
+        return paths.get(self.pk, '') if include_self else '', paths.get(parent_id, '')
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        moved = not adding and self.parent_id != getattr(self, '_loaded_parent_id', self.parent_id)
+        
+        paths = None
+        if moved:
+            paths = self.stored_paths(self.parent_id)
+            old_path, parent_path = paths
+            if self.parent_id and old_path and parent_path.startswith(old_path):
+                raise ValueError("A category cannot be moved beneath itself.")
+        
+        if adding and not self.rank:
+            # New categories go after their last sibling
+            last = Category.objects.filter(world_id=self.world_id, parent_id=self.parent_id).order_by('-rank')
+            self.rank = ranks.between(last.values_list('rank', flat=True).first(), None)
+        
+        if not adding:
+            # Don't put back a path that a move of an ancestor has rewritten
+            # since this instance was loaded; only _update_path() writes them
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                excluded = set(self.PATH_FIELDS) | self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in excluded and field.name not in excluded
+                ]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.PATH_FIELDS]
+        super().save(*args, **kwargs)
+        
+        if adding or moved or not self.path:
+            self._update_path(paths or self.stored_paths(self.parent_id, include_self=not adding))
+        self._loaded_parent_id = self.parent_id
+    
+    def _update_path(self, paths):
+        """
+        Recompute this category's path from ``paths``, as returned by
+        stored_paths(), and rewrite its subtree in one UPDATE.
+        """
+        old_path, parent_path = paths
+        old_depth = len(old_path) // self.PATH_STEP - 1
+        self.path = parent_path + self.path_segment(self.pk)
+        self.depth = len(self.path) // self.PATH_STEP - 1
+        
+        if old_path and old_path != self.path:
+            # Move: re-prefix every descendant (and this row) in a single statement
+            Category.objects.filter(world_id=self.world_id, path__startswith=old_path).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+        else:
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+    
+    def get_ancestor_ids(self):
+        """Return ancestor ids from the root down, parsed from the path"""
+        step = self.PATH_STEP
+        return [int(self.path[i:i + step - 1]) for i in range(0, len(self.path) - step, step)]
+    
     def get_ancestors(self):
-        """Get all ancestor categories"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.append(current)
-            current = current.parent
-        return list(reversed(ancestors))
+        """Get all ancestor categories, root first"""
+        if not self.parent_id:
+            return []
+        return list(Category.objects.filter(id__in=self.get_ancestor_ids()).order_by('depth'))
     
     def get_descendants(self):
-        """Get all descendant categories"""
-        descendants = []
-        for subcategory in self.subcategories.all():
-            descendants.append(subcategory)
-            descendants.extend(subcategory.get_descendants())
-        return descendants
+        """Get all descendant categories in depth-first order"""
+        return Category.objects.filter(
+            world_id=self.world_id,
+            path__startswith=self.path,
+            depth__gt=self.depth,
+        ).order_by('path')
+    
+    def get_descendant_count(self):
+        """Count all descendant categories"""
+        return self.get_descendants().order_by().count()
+
+
+class EntryQuerySet(models.QuerySet):
+    
+    def for_listing(self):
+        """Only the columns a list of entries shows"""
+        return self.only(*Entry.LISTING_FIELDS)
+    
+    def with_content(self):
+        """Load the document and plaintext columns the manager defers"""
+        return self.defer(None)
+
+
+class EntryManager(models.Manager.from_queryset(EntryQuerySet)):
+    
+    def get_queryset(self):
+        # Documents can be tens of kilobytes each; only detail views need them
+        return super().get_queryset().defer(*Entry.DEFERRED_FIELDS)
+
+
+class Entry(models.Model):
+    """A World Book entry holding a Prosemirror document"""
+    
+    id = models.BigAutoField(primary_key=True)
+    title = models.CharField(max_length=255, help_text="Entry title")
+    entry_type = models.CharField(max_length=50, blank=True, help_text="npc, location, item, quest, etc.")
+    metadata = models.JSONField(default=dict, blank=True, help_text="Type-specific structured data")
+    world = models.ForeignKey(World, on_delete=models.CASCADE, related_name='entries', help_text="World this entry belongs to")
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='entries',
+        help_text="Organizational category"
+    )
+    parent_entry = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='child_entries',
+        help_text="Entry this entry belongs to"
+    )
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='authored_entries')
+    is_hidden = models.BooleanField(default=False, help_text="Hide entry from non-authors")
+    content_size = models.PositiveIntegerField(default=0, editable=False, help_text="Uncompressed size of the document JSON in bytes")
+    summary = models.CharField(max_length=300, blank=True, editable=False, help_text="Start of the document text for previews")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # SQLite reads a row's columns in order, through the overflow pages of
+    # any large value before them, so the large columns go last
+    content_data = models.BinaryField(default=b'', editable=False, help_text="zlib-compressed Prosemirror JSON; read through ``content``")
+    plaintext = models.TextField(blank=True, editable=False, help_text="Document text for search, maintained on save")
+    
+    objects = EntryManager()
+    
+    DEFERRED_FIELDS = ('content_data', 'plaintext')
+    LISTING_FIELDS = ('id', 'title', 'entry_type', 'summary', 'world', 'category', 'is_hidden', 'updated_at')
+    
+    # Set by assigning ``content``; save() packs it into the stored columns
+    _content = None
+    _content_changed = False
+    
+    class Meta:
+        verbose_name = 'Entry'
+        verbose_name_plural = 'Entries'
+        ordering = ['title']
+        indexes = [
+            # Serves the category page's visible entries in title order
+            models.Index(fields=['category', 'title'], condition=Q(is_hidden=False), name='entry_category_listing_idx'),
+        ]
+    
+    def __str__(self):
+        return self.title
+    
+    @property
+    def content(self):
+        """The Prosemirror document, decompressed on first access"""
+        if self._content is None:
+            # Loads content_data if it was deferred
+            self._content = documents.unpack(self.content_data, self._fetch_blobs)
+        return self._content
+    
+    @content.setter
+    def content(self, document):
+        self._content = document
+        self._content_changed = True
+    
+    def _fetch_blobs(self, digests):
+        rows = EntryBlob.objects.filter(entry_id=self.pk, digest__in=digests).values_list('digest', 'data')
+        return {digest: bytes(data) for digest, data in rows}
+    
+    def save(self, *args, **kwargs):
+        if not self._content_changed:
+            super().save(*args, **kwargs)
+            return
+        
+        packed = documents.pack(self._content)
+        self.content_data = packed.data
+        self.content_size = packed.size
+        self.plaintext = packed.text
+        self.summary = documents.summarize(packed.text)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'content_data', 'content_size', 'plaintext', 'summary'}
+        
+        adding = self._state.adding
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self._store_blobs(packed.blobs, adding)
+            CrossReference.objects.sync_mentions(self.world_id, {self.pk: packed.mentions})
+        self._content_changed = False
+    
+    def _store_blobs(self, blobs, adding):
+        """Make this entry's blob rows match ``blobs``"""
+        stored = set() if adding else set(self.blobs.values_list('digest', flat=True))
+        stale = stored - set(blobs)
+        if stale:
+            self.blobs.filter(digest__in=stale).delete()
+        EntryBlob.objects.bulk_create([
+            EntryBlob(entry=self, digest=digest, data=data)
+            for digest, data in blobs.items() if digest not in stored
+        ])
+
+
+class EntryBlob(models.Model):
+    """A large value split out of an entry's document, e.g. an embedded image"""
+    
+    id = models.BigAutoField(primary_key=True)
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='blobs')
+    digest = models.CharField(max_length=64, help_text="SHA-256 of the data, referenced from the document")
+    data = models.BinaryField()
+    
+    class Meta:
+        verbose_name = 'Entry Blob'
+        verbose_name_plural = 'Entry Blobs'
+        unique_together = ['entry', 'digest']
+    
+    def __str__(self):
+        return f"{self.entry_id}:{self.digest[:12]}"
+
+
+class CrossReferenceQuerySet(models.QuerySet):
+    
+    def sync_mentions(self, world_id, mentions_by_source):
+        """
+        Make the stored mention edges of each source entry match
+        ``mentions_by_source``, ``{source_id: {target_id: context}}``, writing
+        only the rows that change. Targets that are missing, in another world
+        or the source itself are dropped. Returns (created, updated, deleted).
+        """
+        stored = {
+            (source_id, target_id): (pk, context)
+            for pk, source_id, target_id, context in self.filter(
+                source_entry_id__in=list(mentions_by_source), reference_type=CrossReference.MENTIONS,
+            ).values_list('pk', 'source_entry_id', 'target_entry_id', 'context')
+        }
+        wanted = {
+            (source_id, target_id): context
+            for source_id, targets in mentions_by_source.items()
+            for target_id, context in targets.items() if target_id != source_id
+        }
+        
+        new_targets = {target_id for _, target_id in wanted.keys() - stored.keys()}
+        valid = set(
+            Entry.objects.filter(world_id=world_id, pk__in=new_targets).values_list('pk', flat=True)
+        ) if new_targets else set()
+        created = [
+            CrossReference(source_entry_id=source_id, target_entry_id=target_id, context=context)
+            for (source_id, target_id), context in wanted.items()
+            if (source_id, target_id) not in stored and target_id in valid
+        ]
+        updated = [
+            CrossReference(pk=stored[key][0], context=context)
+            for key, context in wanted.items() if key in stored and stored[key][1] != context
+        ]
+        deleted = [pk for key, (pk, _) in stored.items() if key not in wanted]
+        
+        if deleted:
+            self.filter(pk__in=deleted).delete()
+        if updated:
+            self.bulk_update(updated, ['context'])
+        if created:
+            # A manually added reference to the same target takes precedence
+            self.bulk_create(created, ignore_conflicts=True)
+        return len(created), len(updated), len(deleted)
+
+
+class CrossReference(models.Model):
+    """A directed link between two entries of the same world"""
+    
+    MENTIONS = 'mentions'
+    REFERENCE_TYPE_CHOICES = [
+        (MENTIONS, 'Mentions'),
+        ('related', 'Related'),
+        ('parent_child', 'Parent-Child'),
+        ('location', 'Location'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    source_entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='outgoing_references')
+    target_entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='incoming_references')
+    reference_type = models.CharField(
+        max_length=20,
+        choices=REFERENCE_TYPE_CHOICES,
+        default=MENTIONS,
+        help_text="Mentions are maintained from entry documents; other types are added by hand"
+    )
+    context = models.TextField(blank=True, help_text="How they are related or context of reference")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = CrossReferenceQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Cross Reference'
+        verbose_name_plural = 'Cross References'
+        unique_together = ['source_entry', 'target_entry']
+    
+    def __str__(self):
+        return f"{self.source_entry_id} -> {self.target_entry_id} ({self.reference_type})"
+    
+    def clean(self):
+        # World purges only follow references out of the world's own entries
+        if self.source_entry_id and self.target_entry_id and self.source_entry.world_id != self.target_entry.world_id:
+            raise ValidationError("Cross references must link entries of the same world.")
+
+
+class MediaFileQuerySet(models.QuerySet):
+    
+    def adjust_references(self, digest, delta):
+        """Atomically add ``delta`` to a stored file's reference count"""
+        return self.filter(pk=digest).update(ref_count=Greatest(F('ref_count') + delta, Value(0)))
+
+
+class MediaFile(models.Model):
+    """Uploaded bytes, stored once under their SHA-256 digest however many worlds use them"""
+    
+    digest = models.CharField(max_length=64, primary_key=True, help_text="SHA-256 of the contents; also the file's name on disk")
+    size = models.PositiveBigIntegerField(help_text="Size in bytes")
+    # Maintained with F() updates only, like the world counters
+    ref_count = models.PositiveIntegerField(default=0, editable=False, help_text="Media rows using this file")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = MediaFileQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Media File'
+        verbose_name_plural = 'Media Files'
+        indexes = [
+            # Lets garbage collection find unused files without a table scan
+            models.Index(fields=['created_at'], condition=Q(ref_count=0), name='media_file_unused_idx'),
+        ]
+    
+    def __str__(self):
+        return self.digest[:12]
+
+
+class Media(models.Model):
+    """A file uploaded to a world, optionally attached to one of its entries"""
+    
+    id = models.BigAutoField(primary_key=True)
+    filename = models.CharField(max_length=255, help_text="Safe name the file is served under")
+    original_filename = models.CharField(max_length=255, help_text="Name of the file as uploaded")
+    file = models.ForeignKey(MediaFile, on_delete=models.PROTECT, related_name='media')
+    file_size = models.PositiveBigIntegerField()
+    mime_type = models.CharField(max_length=100, blank=True)
+    world = models.ForeignKey(World, on_delete=models.CASCADE, related_name='media', help_text="World this media belongs to")
+    entry = models.ForeignKey(
+        Entry,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='media',
+        help_text="If directly attached to entry"
+    )
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploaded_media')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Media'
+        verbose_name_plural = 'Media'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.filename
+
+
+class WorldChange(models.Model):
+    """
+    One entry of the append-only change log clients sync from (core.changes).
+    
+    The id is the sequence number: SQLite allocates AUTOINCREMENT ids in
+    commit order, since it has a single writer. World and user ids are
+    plain columns, not foreign keys, so entries outlive purged worlds and
+    deleted accounts until compaction drops them.
+    """
+    
+    KIND_CHOICES = [
+        ('world', 'World'),
+        ('membership', 'Membership'),
+        ('category', 'Category'),
+    ]
+    ACTION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    world_id = models.BigIntegerField(help_text="World the changed object belongs to")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    user_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="User who also sees this change after losing access to the world"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'World Change'
+        verbose_name_plural = 'World Changes'
+        indexes = [
+            # Sync reads a user's worlds and their own changes after a cursor
+            models.Index(fields=['world_id', 'id'], name='world_change_world_idx'),
+            models.Index(fields=['user_id', 'id'], condition=Q(user_id__isnull=False), name='world_change_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.kind} {self.object_id}"
+
+
+class ChangeLogHorizon(models.Model):
+    """Single row holding the last sequence number compaction dropped"""
+    
+    sequence = models.BigIntegerField(default=0, help_text="Cursors before this must resync from scratch")
+    
+    class Meta:
+        verbose_name = 'Change Log Horizon'
+    
+    def __str__(self):
+        return f"Compacted through #{self.sequence}"
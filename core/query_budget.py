@@ -0,0 +1,281 @@
+"""Query budgets for every named route in core.urls and accounts.urls
+
+ROUTES lists each route with the most queries a request to it may issue.
+profile_routes() seeds a dataset at each scale, drives every route through
+the test client and records its query count, duplicate queries, wall time
+and response size. check_budgets() turns those results into a list of
+violations: a route over its budget, or a route whose query count grows
+between the smallest and the largest scale.
+"""
+import io
+import json
+import statistics
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.urls import get_resolver, reverse
+
+from accounts.models import User, UserProfile
+from . import media, transfer
+from .models import World, WorldUser, Category, Entry, CrossReference
+
+
+class Rollback(Exception):
+    """Raised to discard whatever a route changed"""
+
+
+class Route:
+    """A named route, how to request it and the queries it may issue"""
+    
+    def __init__(self, name, budget, method='get', args=None, data=None, login=True, status=200, content_type=None):
+        self.name = name
+        self.budget = budget
+        self.method = method
+        self.args = args or (lambda dataset: [])
+        self.data = data or (lambda dataset: {})
+        self.login = login
+        self.status = status
+        # Send data() as the raw body with this type instead of as a form
+        self.content_type = content_type
+    
+    @property
+    def constant(self):
+        """Whether the route must issue the same number of queries at every scale"""
+        return not callable(self.budget)
+    
+    def budget_at(self, scale):
+        return self.budget if self.constant else self.budget(scale)
+
+
+ROUTES = [
+    # core
+    Route('core:landing', 0, login=False),
+    Route('core:dashboard', 3),
+    Route('core:search', 4, data=lambda dataset: {'q': 'Level'}),
+    Route('core:world_list', 2),
+    Route('core:world_detail', 6, args=lambda dataset: [dataset.world.id]),
+    Route('core:category_detail', 9, args=lambda dataset: [dataset.world.id, dataset.category.id]),
+    Route('core:api_worlds', 2),
+    Route('core:join_world', 7, method='post', data=lambda dataset: {'join_code': dataset.joinable.join_code}),
+    Route('core:create_world', 6, method='post', data=lambda dataset: {
+        'world_name': "Budget World", 'theme_color': '#8b7355',
+    }),
+    Route('core:delete_world', 10, method='post', args=lambda dataset: [dataset.disposable.id]),
+    Route('core:leave_world', 8, method='post', args=lambda dataset: [dataset.joined.id]),
+    Route('core:export_world', 6, args=lambda dataset: [dataset.world.id]),
+    Route(
+        'core:import_world', 15, method='post',
+        data=lambda dataset: dataset.export, content_type='application/x-ndjson',
+    ),
+    # Two moves: one reorders, the other re-parents the deepest category
+    Route(
+        'core:move_categories', 18, method='post', args=lambda dataset: [dataset.world.id],
+        data=lambda dataset: json.dumps({'moves': [
+            {'id': dataset.roots[0].id},
+            {'id': dataset.category.id, 'parent': dataset.roots[0].id},
+        ]}), content_type='application/json',
+    ),
+    # Everything since the start of the log, one page of it at the largest scale
+    Route('core:sync', 7, data=lambda dataset: {'since': 0}),
+    Route('core:entry_links', 6, args=lambda dataset: [dataset.world.id, dataset.entry.id]),
+    Route('core:media_file', 4, args=lambda dataset: [dataset.world.id, dataset.media.id]),
+    Route('core:upload_media', 11, method='post', args=lambda dataset: [dataset.world.id], data=lambda dataset: {
+        'file': SimpleUploadedFile('map.txt', b"A map of the coast", content_type='text/plain'),
+    }),
+    Route('core:delete_media', 6, method='post', args=lambda dataset: [dataset.world.id, dataset.media.id]),
+    Route('core:metrics', 1, status=403),
+    # accounts
+    Route('accounts:signup', 0, login=False),
+    Route('accounts:login', 0, login=False),
+    Route('accounts:logout', 3, method='post', status=302),
+    Route('accounts:profile', 2),
+    Route('accounts:public_profile', 2, args=lambda dataset: [dataset.other.username], login=False),
+    Route('accounts:profile_settings', 2),
+    Route('accounts:profile_edit', 4, method='post', status=302, data=lambda dataset: {
+        'username': dataset.user.username, 'email': dataset.user.email, 'first_name': "Budget",
+    }),
+    Route('accounts:password_change', 1, method='post', status=302),
+    Route(
+        'accounts:delete_account', 31, method='post', data=lambda dataset: {'confirm_delete': 'DELETE'}, status=302,
+    ),
+    Route('accounts:toggle_theme', 4, method='post'),
+    Route('accounts:preferences', 5, method='post', status=302, data=lambda dataset: {
+        'theme_preference': 'light', 'profile_public': 'false',
+    }),
+    Route('accounts:dashboard_redirect', 1, status=302),
+]
+
+
+class Dataset:
+    """The rows one scale of the suite requests against"""
+    
+    def __init__(self, scale, prefix='budget'):
+        self.scale = scale
+        name = f"{prefix}_{scale}"
+        self.user = User.objects.create_user(username=f"{name}_dm", email=f"{name}_dm@example.com")
+        self.other = User.objects.create_user(username=f"{name}_other", email=f"{name}_other@example.com")
+        UserProfile.objects.bulk_create([UserProfile(user=self.user), UserProfile(user=self.other)])
+        players = User.objects.bulk_create([
+            User(username=f"{name}_player_{i}", email=f"{name}_player_{i}@example.com") for i in range(scale)
+        ])
+        
+        # `scale` owned and `scale` joined worlds, each with a few members
+        owned = [World.objects.create(name=f"Owned {i}", owner=self.user) for i in range(scale)]
+        joined = [World.objects.create(name=f"Joined {i}", owner=self.other) for i in range(scale)]
+        WorldUser.objects.bulk_create(
+            [WorldUser(world=world, user=self.user, role='player') for world in joined]
+            + [WorldUser(world=world, user=player, role='player') for world in owned for player in players[:5]]
+        )
+        self.world = owned[0]
+        self.joined = joined[0]
+        self.joinable = World.objects.create(name="Joinable", owner=self.other)
+        self.disposable = World.objects.create(name="Disposable", owner=self.user)
+        Category.objects.create(world=self.disposable, name="Only category")
+        
+        # A chain `scale + 2` levels deep under the first owned world, with
+        # `scale` siblings at every level
+        parent = None
+        for depth in range(scale + 2):
+            siblings = [
+                Category.objects.create(world=self.world, parent=parent, name=f"Level {depth} {i}")
+                for i in range(scale)
+            ]
+            if parent is None:
+                self.roots = siblings
+            parent = siblings[0]
+        self.category = parent
+        
+        # `scale` entries listed on the deepest category's page, each
+        # mentioning the next
+        entries = Entry.objects.bulk_create([
+            Entry(world=self.world, category=self.category, author=self.user, title=f"Entry {i}", summary="Budget entry")
+            for i in range(scale + 1)
+        ])
+        CrossReference.objects.bulk_create([
+            CrossReference(source_entry=source, target_entry=target) for source, target in zip(entries, entries[1:])
+        ])
+        self.entry = entries[0]
+        
+        # A handout in the first owned world
+        upload = media.HashedUpload.from_file(io.BytesIO(b"Budget handout"), 'handout.txt')
+        self.media, _ = media.store(upload, self.world.id, self.user)
+        
+        # The first owned world as an export, for importing
+        self.export = b''.join(transfer.export_world(self.world))
+
+
+@contextmanager
+def captured_queries():
+    """Collect (sql, params) for everything run on any database alias
+    
+    Uses execute wrappers rather than CaptureQueriesContext so that aliases
+    the request never touches aren't connected just to be watched.
+    """
+    queries = []
+    
+    def record(execute, sql, params, many, context):
+        queries.append((sql, repr(params)))
+        return execute(sql, params, many, context)
+    
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(record))
+        yield queries
+
+
+def named_routes():
+    """The qualified names of every route in the core and accounts URLconfs"""
+    resolver = get_resolver()
+    names = set()
+    for namespace in ('core', 'accounts'):
+        _, sub_resolver = resolver.namespace_dict[namespace]
+        names.update(
+            f"{namespace}:{name}" for name in sub_resolver.reverse_dict if isinstance(name, str)
+        )
+    return names
+
+
+def request_route(route, dataset):
+    """Request ``route`` once and return (response, queries, seconds)"""
+    # Budgets are for the first request after logging in: every cache is
+    # cold except the session login just wrote. Clearing also keeps
+    # rolled-back writes from leaving cached state behind for the next route
+    for cache in caches.all():
+        cache.clear()
+    client = Client(raise_request_exception=False)
+    if route.login:
+        client.force_login(dataset.user)
+    url = reverse(route.name, args=route.args(dataset))
+    send = getattr(client, route.method)
+    extra = {'content_type': route.content_type} if route.content_type else {}
+    try:
+        # Each request runs in a savepoint so writes don't leak between routes
+        with transaction.atomic():
+            with captured_queries() as queries:
+                start = time.perf_counter()
+                response = send(url, route.data(dataset), **extra)
+                # A streamed body runs its queries as it is read
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+            raise Rollback
+    except Rollback:
+        pass
+    return response, content, queries, elapsed
+
+
+def profile_routes(scales, repeat=1, routes=ROUTES):
+    """Seed a dataset per scale and profile every route against it"""
+    results = {}
+    # Uploaded media land in a throwaway MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        for scale in scales:
+            dataset = Dataset(scale)
+            for route in routes:
+                samples = []
+                for _ in range(repeat):
+                    response, content, queries, elapsed = request_route(route, dataset)
+                    samples.append(elapsed)
+                duplicates = sum(count - 1 for count in Counter(queries).values())
+                results.setdefault(route.name, {})[scale] = {
+                    'status': response.status_code,
+                    'queries': len(queries),
+                    'duplicate_queries': duplicates,
+                    'wall_ms': round(statistics.median(samples) * 1000, 3),
+                    'bytes': len(content),
+                }
+    return results
+
+
+def unbudgeted_routes(routes=ROUTES):
+    """Named routes that have no entry in ``routes``"""
+    return sorted(named_routes() - {route.name for route in routes})
+
+
+def check_budgets(results, routes=ROUTES):
+    """Return a description of every budget the results violate"""
+    violations = []
+    for route in routes:
+        by_scale = results.get(route.name)
+        if not by_scale:
+            continue
+        for scale, result in by_scale.items():
+            if result['status'] != route.status:
+                violations.append(f"{route.name} returned {result['status']} at scale {scale}, expected {route.status}")
+            if result['queries'] > route.budget_at(scale):
+                violations.append(
+                    f"{route.name} issued {result['queries']} queries at scale {scale}, "
+                    f"budget is {route.budget_at(scale)}"
+                )
+        smallest, largest = min(by_scale), max(by_scale)
+        if route.constant and by_scale[largest]['queries'] > by_scale[smallest]['queries']:
+            violations.append(
+                f"{route.name} grew from {by_scale[smallest]['queries']} to {by_scale[largest]['queries']} "
+                f"queries between scale {smallest} and {largest}"
+            )
+    return violations
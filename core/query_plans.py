@@ -0,0 +1,124 @@
+"""Query plans for every budgeted route
+
+explain_routes() drives each route in core.query_budget.ROUTES through the
+test client and, just before each SELECT, UPDATE or DELETE runs, asks SQLite
+for its ``EXPLAIN QUERY PLAN`` against the same data. check_plans() turns
+the plans into a list of violations: a full scan of a table, or a temporary
+B-tree built to sort or group rows.
+
+A plan step that reads every row through an index (``SCAN ... USING
+INDEX``) is still a full scan. Searches (``SEARCH ... USING INDEX``) and
+scans of the FTS5 index, CTEs and subqueries are fine, and so is sorting
+rows fetched by primary key, which the request's own ids bound. The few
+sorts no index can remove are listed in ACCEPTED_SORTS.
+"""
+import re
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.db import connection, connections
+from django.test import override_settings
+
+from .query_budget import ROUTES, Dataset, request_route
+
+
+EXPLAINED = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_SCAN_RE = re.compile(r'^SCAN (\w+)')
+_PRIMARY_KEY_RE = re.compile(r'^SEARCH \w+ USING INTEGER PRIMARY KEY \(rowid=\?\)$')
+
+# Tables that stay a handful of rows, so a scan of them costs nothing
+SMALL_TABLES = {'core_joincodesequence', 'django_content_type'}
+
+# Temporary B-trees each route may build, and why no index can avoid them
+ACCEPTED_SORTS = {
+    # Results are ordered by BM25 relevance, over at most RANK_CANDIDATES rows
+    'core:search': 1,
+    # Owned and joined worlds come from one OR over two indexes, merged
+    # newest first; the sort covers only the user's own worlds
+    'core:dashboard': 1,
+    'core:world_list': 1,
+    # The keyset is the world's (created_at, id); joined worlds are found
+    # through the membership index, which can't yield them in that order
+    'core:api_worlds': 1,
+    # Changes in a user's worlds and the user's own changes come from two
+    # indexes and are merged by sequence
+    'core:sync': 1,
+    # Backlinks ordered by title, and the neighborhood CTE grouped by entry
+    # and ordered by depth
+    'core:entry_links': 3,
+    # The deletion collector orders the rows referencing the user by each
+    # model's Meta.ordering: worlds, memberships, entries and media. Owned
+    # worlds and memberships are already gone by then
+    'accounts:delete_account': 4,
+}
+
+
+def _explain(connection, sql, params):
+    # create_cursor() bypasses the execute wrappers, including this one
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def captured_plans():
+    """Collect (sql, plan) for the statements run on every SQLite alias"""
+    plans = []
+    
+    def explain(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(EXPLAINED):
+            plans.append((sql, _explain(context['connection'], sql, params)))
+        return execute(sql, params, many, context)
+    
+    with ExitStack() as stack:
+        for alias in connections:
+            if connections[alias].vendor == 'sqlite':
+                stack.enter_context(connections[alias].execute_wrapper(explain))
+        yield plans
+
+
+def explain_routes(scale, routes=ROUTES):
+    """Seed a dataset at ``scale`` and collect the plans of every route's statements"""
+    results = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        dataset = Dataset(scale, prefix='plans')
+        for route in routes:
+            with captured_plans() as plans:
+                request_route(route, dataset)
+            results[route.name] = plans
+    return results
+
+
+def plan_problems(plan, tables):
+    """The steps of one plan that scan a table or sort through a temporary B-tree"""
+    problems = []
+    by_primary_key = bool(plan) and _PRIMARY_KEY_RE.match(plan[0])
+    for step in plan:
+        match = _SCAN_RE.match(step)
+        if match and match.group(1) in tables and match.group(1) not in SMALL_TABLES and 'VIRTUAL TABLE' not in step:
+            problems.append(step)
+        elif step.startswith('USE TEMP B-TREE') and not by_primary_key:
+            problems.append(step)
+    return problems
+
+
+def check_plans(results):
+    """Return a description of every full scan or temporary sort in the results"""
+    # Replicas mirror the default database's tables
+    tables = set(connection.introspection.table_names())
+    violations = []
+    for name, plans in results.items():
+        sorts = []
+        for sql, plan in plans:
+            for problem in plan_problems(plan, tables):
+                if problem.startswith('USE TEMP B-TREE'):
+                    sorts.append(f"{name}: {problem} in {sql}")
+                else:
+                    violations.append(f"{name}: {problem} in {sql}")
+        if len(sorts) > ACCEPTED_SORTS.get(name, 0):
+            violations.extend(sorts)
+    return violations
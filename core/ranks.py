@@ -0,0 +1,87 @@
+"""
+Lexicographic rank keys for ordering siblings.
+
+A rank is a string of base-36 digits read as a fraction in (0, 1), so
+"h" sits halfway and "0i" near the start. Any two ranks have another
+between them, and comparing two ranks as plain strings gives their order.
+Moving a sibling therefore only rewrites that sibling's rank, never its
+neighbours'. Ranks never end in "0", which always leaves room before one.
+
+Each insertion at the same spot adds about one digit every five moves.
+``needs_rebalance()`` flags ranks that have grown long, and ``spread()``
+deals out short, evenly spaced ranks to rewrite a whole sibling group.
+
+Lowercase digits keep the order the same under every common collation.
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+# Sibling groups with a rank this long get new ranks in the background
+REBALANCE_LENGTH = 16
+MAX_LENGTH = 64
+
+# Ranks for integers keep the integer order; sort_order values fit in 32 bits
+INTEGER_WIDTH = 7
+INTEGER_OFFSET = 2 ** 31 + 1
+
+
+def is_valid(rank):
+    return (
+        isinstance(rank, str) and 0 < len(rank) <= MAX_LENGTH
+        and not rank.endswith(DIGITS[0]) and all(digit in DIGITS for digit in rank)
+    )
+
+
+def _encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rstrip(DIGITS[0])
+
+
+def between(before=None, after=None):
+    """
+    A rank that sorts after ``before`` and before ``after``. Either may be
+    None for the start or the end of the group.
+    """
+    before = before or ''
+    if after is not None and before >= after:
+        raise ValueError(f"No rank between {before!r} and {after!r}")
+    return _midpoint(before, after)
+
+
+def _midpoint(low, high):
+    if high is not None:
+        # Keep the common prefix and split the difference after it
+        prefix = 0
+        while prefix < len(high) and (low[prefix] if prefix < len(low) else DIGITS[0]) == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def spread(count):
+    """``count`` evenly spaced ranks, as short as that many allow"""
+    width = 1
+    while BASE ** width <= count * 4:
+        width += 1
+    step = BASE ** width / (count + 1)
+    return [_encode(round(step * (i + 1)), width) for i in range(count)]
+
+
+def for_integer(value):
+    """The rank of an integer position, in the same order as the integers"""
+    value = min(max(int(value) + INTEGER_OFFSET, 1), BASE ** INTEGER_WIDTH - 1)
+    return _encode(value, INTEGER_WIDTH)
+
+
+def needs_rebalance(rank):
+    return len(rank) > REBALANCE_LENGTH
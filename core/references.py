@@ -0,0 +1,126 @@
+"""
+The entry link graph.
+
+``CrossReference`` rows are the graph's edges. Mention edges are kept
+current by ``Entry.save()``, which extracts the ``mention`` nodes while
+packing the document and passes them to
+``CrossReference.objects.sync_mentions()``. That diffs them against the
+stored edges, so nothing reparses documents at read time.
+
+``backlinks()`` answers "what links here" with one indexed join.
+``neighborhood()`` walks up to ``hops`` edges from an entry with a single
+recursive CTE. ``reindex_world()`` rebuilds every mention edge of a world,
+decompressing and parsing documents on a pool of worker processes.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.db.models import F
+
+from . import documents
+from .models import Entry, CrossReference
+
+
+DIRECTIONS = ('out', 'in', 'both')
+MAX_HOPS = 4
+
+REINDEX_BATCH_SIZE = 200
+
+
+def backlinks(entry_id, include_hidden=False):
+    """
+    Entries that link to ``entry_id``, in title order, annotated with the
+    ``reference_type`` and ``context`` of their link.
+    """
+    entries = Entry.objects.filter(outgoing_references__target_entry_id=entry_id).for_listing().annotate(
+        reference_type=F('outgoing_references__reference_type'),
+        context=F('outgoing_references__context'),
+    )
+    if not include_hidden:
+        entries = entries.filter(is_hidden=False)
+    return entries
+
+
+def _step(direction):
+    """The recursive term that follows one edge in ``direction``"""
+    table = CrossReference._meta.db_table
+    if direction == 'out':
+        return f"SELECT r.target_entry_id, h.depth + 1 FROM hood h JOIN {table} r ON r.source_entry_id = h.entry_id"
+    if direction == 'in':
+        return f"SELECT r.source_entry_id, h.depth + 1 FROM hood h JOIN {table} r ON r.target_entry_id = h.entry_id"
+    # One join with an OR keeps a single reference to the CTE, which every
+    # database accepts; both branches of the OR can use an index
+    return (
+        f"SELECT CASE WHEN r.source_entry_id = h.entry_id THEN r.target_entry_id ELSE r.source_entry_id END, "
+        f"h.depth + 1 FROM hood h JOIN {table} r "
+        f"ON r.source_entry_id = h.entry_id OR r.target_entry_id = h.entry_id"
+    )
+
+
+def neighborhood(entry_id, hops=2, direction='both', include_hidden=False):
+    """
+    Entries within ``hops`` links of ``entry_id``, nearest first, each with
+    a ``depth`` attribute. ``direction`` follows links out of entries, into
+    them or both ways.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+    entry_table = Entry._meta.db_table
+    columns = ', '.join(f"e.{Entry._meta.get_field(name).column}" for name in Entry.LISTING_FIELDS)
+    hidden = '' if include_hidden else 'AND NOT e.is_hidden'
+    # UNION drops repeated (entry, depth) rows, so cycles can't grow the
+    # walk beyond one row per entry per depth
+    sql = (
+        f"WITH RECURSIVE hood(entry_id, depth) AS ("
+        f"SELECT %s, 0 UNION {_step(direction)} WHERE h.depth < %s"
+        f") "
+        f"SELECT {columns}, MIN(hood.depth) AS depth FROM hood JOIN {entry_table} e ON e.id = hood.entry_id "
+        f"WHERE e.id != %s {hidden} GROUP BY e.id ORDER BY depth, e.title"
+    )
+    return Entry.objects.raw(sql, [entry_id, hops, entry_id])
+
+
+def _batches(world_id, batch_size):
+    rows = Entry.objects.filter(world_id=world_id).order_by('pk').values_list('id', 'content_data')
+    batch = []
+    for entry_id, data in rows.iterator(chunk_size=batch_size):
+        batch.append((entry_id, bytes(data)))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reindex_world(world_id, workers=None, batch_size=REINDEX_BATCH_SIZE):
+    """
+    Rebuild the mention edges of every entry in ``world_id``. Documents are
+    parsed on ``workers`` processes (default: one per CPU) while the results
+    are written here, one transaction per batch. Returns (created, updated,
+    deleted) totals.
+    """
+    workers = workers or os.cpu_count() or 1
+    totals = [0, 0, 0]
+    
+    def write(results):
+        with transaction.atomic():
+            counts = CrossReference.objects.sync_mentions(world_id, dict(results))
+        for i, count in enumerate(counts):
+            totals[i] += count
+    
+    if workers == 1:
+        for batch in _batches(world_id, batch_size):
+            write(documents.parse_mentions(batch))
+        return tuple(totals)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of batches in flight so memory stays flat
+        pending = []
+        for batch in _batches(world_id, batch_size):
+            pending.append(executor.submit(documents.parse_mentions, batch))
+            if len(pending) >= 2 * workers:
+                write(pending.pop(0).result())
+        for future in pending:
+            write(future.result())
+    return tuple(totals)
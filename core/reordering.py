@@ -0,0 +1,233 @@
+"""
+Moving and reordering categories.
+
+Siblings are ordered by ``Category.rank`` (see core.ranks), so putting a
+category between two siblings writes a new rank to that one row. Moving it
+under another parent also rewrites the materialized paths of its subtree,
+in one UPDATE (see ``Category._update_path``).
+
+``move_categories()`` applies a drag-and-drop batch in one transaction.
+The (world, parent, name) uniqueness is checked against the state the batch
+ends in, and every category that changes parent is first parked at the top
+level, where names needn't be unique. A batch that swaps two same-named
+categories between parents therefore applies cleanly instead of tripping
+over its own intermediate state.
+
+Moves and rebalances write through update() and bulk_update(), which send
+no signals, so they bump the cached category cards (core.fragments) and
+log the changes for sync (core.changes) themselves.
+
+When a rank grows long from repeated inserts at one spot, the sibling group
+is given fresh, evenly spaced ranks after the commit, on a background thread
+(unless ``CATEGORY_REBALANCE_IN_BACKGROUND`` is False), or by
+``manage.py rebalance_category_ranks``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from . import changes, fragments, ranks
+from .models import World, Category
+
+
+logger = logging.getLogger(__name__)
+
+MAX_MOVES = 500
+
+_rebalance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rank-rebalance')
+
+
+class MoveError(ValueError):
+    """A move that can't be applied; the whole batch is rolled back"""
+
+
+def _parse(moves):
+    if not isinstance(moves, list) or not moves:
+        raise MoveError("Send a list of moves.")
+    if len(moves) > MAX_MOVES:
+        raise MoveError(f"A batch can have at most {MAX_MOVES} moves.")
+    parsed = []
+    for number, move in enumerate(moves, 1):
+        if not isinstance(move, dict) or not isinstance(move.get('id'), int):
+            raise MoveError(f"Move {number} needs a category id.")
+        for key in ('parent', 'after', 'before'):
+            if move.get(key) is not None and not isinstance(move[key], int):
+                raise MoveError(f"Move {number} has a {key} that isn't a category id.")
+        if move.get('after') is not None and move.get('before') is not None:
+            raise MoveError(f"Move {number} can give after or before, not both.")
+        parsed.append(move)
+    return parsed
+
+
+def move_categories(world_id, moves):
+    """
+    Apply ``moves`` to the world's categories, in order and all or nothing.
+    Each move is a dict with the category ``id`` and optionally ``parent``
+    (a category id or None for the top level; by default the current
+    parent), and ``after`` or ``before``, a sibling to place it next to (by
+    default the end). Returns the moved categories as they end up.
+    """
+    moves = _parse(moves)
+    try:
+        with transaction.atomic():
+            return _apply(world_id, moves)
+    except IntegrityError:
+        raise MoveError("A category would share its name with a sibling along the way.")
+
+
+def _apply(world_id, moves):
+    referenced = {move[key] for move in moves for key in ('id', 'parent', 'after', 'before') if move.get(key) is not None}
+    categories = Category.objects.filter(world_id=world_id, pk__in=referenced).in_bulk()
+    missing = referenced - set(categories)
+    if missing:
+        raise MoveError(f"Category {min(missing)} not found in this world.")
+    
+    # Where each moved category ends up
+    final_parents = {}
+    for move in moves:
+        final_parents[move['id']] = move['parent'] if 'parent' in move else final_parents.get(
+            move['id'], categories[move['id']].parent_id,
+        )
+    _check_names(world_id, categories, final_parents)
+    
+    # Park everything that changes parent at the top level
+    reparented = [category_id for category_id, parent_id in final_parents.items() if parent_id != categories[category_id].parent_id]
+    if reparented:
+        Category.objects.filter(pk__in=reparented).update(parent=None)
+    
+    # A parked row keeps the path under its last parent until its move applies
+    parents = {category_id: categories[category_id].parent_id for category_id in final_parents}
+    moved = {}
+    for move in moves:
+        category = Category.objects.get(pk=move['id'])
+        parent_id = move['parent'] if 'parent' in move else parents[category.pk]
+        moved[category.pk] = _move(category, parents[category.pk], parent_id, move.get('after'), move.get('before'))
+        parents[category.pk] = parent_id
+    World.objects.touch(world_id)
+    # update() sends no signals; cached cards carry the rank
+    fragments.bump(Category, *moved)
+    changes.record_many(changes.CATEGORY, changes.UPDATE, [(world_id, category_id, None) for category_id in moved])
+    return list(moved.values())
+
+
+def _check_names(world_id, categories, final_parents):
+    """Refuse a batch that would leave two siblings with the same name"""
+    seen = {}
+    for category_id, parent_id in final_parents.items():
+        if parent_id is None:
+            continue
+        key = (parent_id, categories[category_id].name)
+        if key in seen:
+            raise MoveError(f"Categories {seen[key]} and {category_id} would share a name under {parent_id}.")
+        seen[key] = category_id
+    if not seen:
+        return
+    clash = Category.objects.filter(
+        world_id=world_id,
+        parent_id__in={parent_id for parent_id, _ in seen},
+        name__in={name for _, name in seen},
+    ).exclude(pk__in=list(final_parents)).values_list('parent_id', 'name')
+    for parent_id, name in clash:
+        if (parent_id, name) in seen:
+            raise MoveError(f"Category {parent_id} already has a subcategory named {name!r}.")
+
+
+def _siblings(world_id, parent_id, exclude_id):
+    return Category.objects.filter(world_id=world_id, parent_id=parent_id).exclude(pk=exclude_id)
+
+
+def _neighbours(category, parent_id, after_id, before_id):
+    """The ranks a category placed after ``after_id``, before ``before_id`` or last falls between"""
+    siblings = _siblings(category.world_id, parent_id, category.pk)
+    anchor_id = after_id if after_id is not None else before_id
+    if anchor_id is None:
+        return siblings.order_by('-rank', '-name', '-pk').values_list('rank', flat=True).first(), None
+    anchor = siblings.filter(pk=anchor_id).values_list('rank', 'name', 'pk').first()
+    if anchor is None:
+        raise MoveError(f"Category {anchor_id} is not a sibling at the destination of category {category.pk}.")
+    rank, name, pk = anchor
+    later = Q(rank__gt=rank) | Q(rank=rank, name__gt=name) | Q(rank=rank, name=name, pk__gt=pk)
+    if after_id is not None:
+        following = siblings.filter(later).order_by('rank', 'name', 'pk').values_list('rank', flat=True).first()
+        return rank, following
+    preceding = siblings.exclude(later).exclude(pk=pk).order_by('-rank', '-name', '-pk').values_list('rank', flat=True).first()
+    return preceding, rank
+
+
+def _move(category, old_parent_id, parent_id, after_id, before_id):
+    paths = None
+    if parent_id != old_parent_id:
+        # An earlier move in the batch may have re-prefixed this category
+        paths = category.stored_paths(parent_id)
+        old_path, parent_path = paths
+        if parent_id is not None and parent_path.startswith(old_path):
+            raise MoveError(f"Category {category.pk} can't be moved beneath itself.")
+    
+    low, high = _neighbours(category, parent_id, after_id, before_id)
+    if high is not None and (low or '') >= high:
+        # Tied ranks leave no room between them
+        rebalance_siblings(category.world_id, parent_id, exclude_id=category.pk)
+        low, high = _neighbours(category, parent_id, after_id, before_id)
+    rank = ranks.between(low, high)
+    if len(rank) > ranks.MAX_LENGTH:
+        rebalance_siblings(category.world_id, parent_id, exclude_id=category.pk)
+        rank = ranks.between(*_neighbours(category, parent_id, after_id, before_id))
+    elif ranks.needs_rebalance(rank):
+        schedule_rebalance(category.world_id, parent_id)
+    
+    category.parent_id, category.rank = parent_id, rank
+    Category.objects.filter(pk=category.pk).update(parent_id=parent_id, rank=rank)
+    if paths is not None:
+        category._update_path(paths)
+    category._loaded_parent_id = parent_id
+    return category
+
+
+def rebalance_siblings(world_id, parent_id, exclude_id=None):
+    """Give a sibling group evenly spaced ranks in its current order"""
+    siblings = list(
+        _siblings(world_id, parent_id, exclude_id).order_by('rank', 'name', 'pk').only('pk', 'rank')
+    )
+    changed = []
+    for category, rank in zip(siblings, ranks.spread(len(siblings))):
+        if category.rank != rank:
+            category.rank = rank
+            changed.append(category)
+    Category.objects.bulk_update(changed, ['rank'], batch_size=500)
+    fragments.bump(Category, *(category.pk for category in changed))
+    changes.record_many(changes.CATEGORY, changes.UPDATE, [(world_id, category.pk, None) for category in changed])
+    return len(changed)
+
+
+def schedule_rebalance(world_id, parent_id):
+    """Rebalance a sibling group on the background thread once the transaction commits"""
+    if getattr(settings, 'CATEGORY_REBALANCE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _rebalance_executor.submit(_rebalance_in_background, world_id, parent_id))
+    else:
+        transaction.on_commit(lambda: rebalance_siblings(world_id, parent_id))
+
+
+def _rebalance_in_background(world_id, parent_id):
+    try:
+        with transaction.atomic():
+            rebalance_siblings(world_id, parent_id)
+    except Exception:
+        logger.exception("Rebalancing category ranks failed")
+    finally:
+        connections.close_all()
+
+
+def rebalance_long_ranks():
+    """Rebalance every sibling group with a rank past ranks.REBALANCE_LENGTH; returns how many"""
+    groups = list(
+        Category.objects.annotate(rank_length=Length('rank')).filter(rank_length__gt=ranks.REBALANCE_LENGTH)
+        .order_by().values_list('world_id', 'parent_id').distinct()
+    )
+    for world_id, parent_id in groups:
+        with transaction.atomic():
+            rebalance_siblings(world_id, parent_id)
+    return len(groups)
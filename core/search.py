@@ -0,0 +1,300 @@
+"""
+Full-text search over worlds and categories.
+
+Backed by an SQLite FTS5 table, ``core_search_index``, kept current by the
+signal handlers in ``core.signals``. Each row's rowid encodes the indexed
+object: ``object_id * 2 + kind`` where kind is 0 for a World and 1 for a
+Category, so updates and deletes are primary-key lookups. The indexed
+``scope`` column holds a ``w<world_id>`` token, or ``h<world_id>`` for a
+hidden category, so a query can be narrowed to what the user may see
+inside the full-text index, before any ranking.
+
+BM25 costs several microseconds a row, so a term found in most of the
+index can't be ranked in full within a keystroke. Ranking runs on the
+newest ``RANK_CANDIDATES`` matches in the user's scope; selective queries,
+with fewer matches than that, are ranked exactly.
+"""
+import json
+import re
+
+from django.db import connection, connections
+from django.urls import reverse
+from django.utils.html import escape
+
+from .db_routers import read_alias
+from .models import World, Category
+
+
+INDEX_TABLE = 'core_search_index'
+
+KIND_WORLD = 0
+KIND_CATEGORY = 1
+KIND_NAMES = {KIND_WORLD: 'world', KIND_CATEGORY: 'category'}
+
+# Name matches count ten times as much as description matches
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Past this many worlds a scope OR-list costs more than it saves; the
+# membership map filters the matches instead
+SCOPE_FILTER_LIMIT = 64
+
+# Matches ranked per query, newest first
+RANK_CANDIDATES = 500
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Sentinels used by snippet() so highlights survive HTML escaping
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    """Whether the configured database supports the FTS5 index"""
+    return connection.vendor == 'sqlite'
+
+
+def _rowid(kind, object_id):
+    return object_id * 2 + kind
+
+
+def _scope(world_id, is_hidden=False):
+    return f"{'h' if is_hidden else 'w'}{world_id}"
+
+
+# The same token as _scope(), computed from a row of World or Category
+_SCOPE_SQL = "CASE WHEN is_hidden THEN 'h' ELSE 'w' END || world_id"
+
+
+def _upsert(kind, object_id, name, description, world_id, is_hidden):
+    rowid = _rowid(kind, object_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [rowid])
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, description, scope, world_id, is_hidden) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)",
+            [rowid, name, description, _scope(world_id, is_hidden), world_id, int(is_hidden)],
+        )
+
+
+def _remove(kind, object_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid = %s", [_rowid(kind, object_id)])
+
+
+def index_world(world):
+    _upsert(KIND_WORLD, world.pk, world.name, world.description, world.pk, False)
+
+
+def index_new_worlds(worlds):
+    """Index freshly bulk-created worlds in one statement"""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, description, scope, world_id, is_hidden) "
+            f"VALUES (%s, %s, %s, %s, %s, 0)",
+            [
+                (_rowid(KIND_WORLD, world.pk), world.name, world.description, _scope(world.pk), world.pk)
+                for world in worlds
+            ],
+        )
+
+
+def index_category(category):
+    _upsert(KIND_CATEGORY, category.pk, category.name, category.description, category.world_id, category.is_hidden)
+
+
+def index_world_categories(world_id):
+    """Index every category of a world in one statement, e.g. after a bulk import"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, description, scope, world_id, is_hidden) "
+            f"SELECT id * 2 + {KIND_CATEGORY}, name, description, {_SCOPE_SQL}, world_id, is_hidden "
+            f"FROM {Category._meta.db_table} WHERE world_id = %s",
+            [world_id],
+        )
+
+
+def remove_world(world_id):
+    _remove(KIND_WORLD, world_id)
+
+
+def remove_category(category_id):
+    _remove(KIND_CATEGORY, category_id)
+
+
+def _remove_many(kind, object_ids):
+    rowids = [_rowid(kind, object_id) for object_id in object_ids]
+    if not rowids:
+        return
+    placeholders = ', '.join(['%s'] * len(rowids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE} WHERE rowid IN ({placeholders})", rowids)
+
+
+def remove_worlds(world_ids):
+    """Drop a batch of worlds from the index in one statement"""
+    _remove_many(KIND_WORLD, world_ids)
+
+
+def remove_categories(category_ids):
+    """Drop a batch of categories from the index in one statement"""
+    _remove_many(KIND_CATEGORY, category_ids)
+
+
+def rebuild_index():
+    """Rebuild the whole index from the World and Category tables"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, description, scope, world_id, is_hidden) "
+            f"SELECT id * 2 + {KIND_WORLD}, name, description, 'w' || id, id, 0 "
+            f"FROM {World._meta.db_table}"
+        )
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, name, description, scope, world_id, is_hidden) "
+            f"SELECT id * 2 + {KIND_CATEGORY}, name, description, {_SCOPE_SQL}, world_id, is_hidden "
+            f"FROM {Category._meta.db_table}"
+        )
+        cursor.execute(f"INSERT INTO {INDEX_TABLE} ({INDEX_TABLE}) VALUES ('optimize')")
+
+
+def build_match_query(search_term, access=None):
+    """
+    Turn free text into an FTS5 query: every word must match, and the last
+    word is treated as a prefix so results update while the user types.
+    Given a ``WorldAccess``, matches are restricted to the rows it may see
+    through the ``scope`` column, unless it reaches too many worlds for
+    that to be worth it.
+    """
+    terms = _TERM_RE.findall(search_term)
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    match = f"{{name description}} : ({' '.join(quoted)})"
+    if access is not None and _scoped_in_index(access):
+        scopes = []
+        for world_id in access.world_ids():
+            scopes.append(_scope(world_id))
+            if access.can_see_hidden(world_id):
+                scopes.append(_scope(world_id, is_hidden=True))
+        match += f" AND scope : ({' OR '.join(scopes)})"
+    return match
+
+
+def _scoped_in_index(access):
+    return len(access.world_ids()) <= SCOPE_FILTER_LIMIT
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search(access, search_term, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Search the worlds a ``WorldAccess`` resolver can reach, ranked by BM25.
+
+    Access and ``Category.is_hidden`` are enforced in the same query: hidden
+    categories are only returned to the world owner and to creators and
+    co-creators. Only the newest ``RANK_CANDIDATES`` matches are ranked;
+    pages past them list older matches newest first, with a second query.
+    Returns ``(results, has_next)``.
+    """
+    world_ids = access.world_ids()
+    if not is_available() or not _TERM_RE.search(search_term) or not world_ids:
+        return [], False
+    match = build_match_query(search_term, access)
+    
+    page = max(1, page)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    offset = (page - 1) * page_size
+    
+    columns = f"""
+        s.rowid,
+        s.world_id,
+        snippet({INDEX_TABLE}, 0, %s, %s, '…', 12),
+        snippet({INDEX_TABLE}, 1, %s, %s, '…', 16),
+        w.name
+    """
+    if _scoped_in_index(access):
+        # The scope tokens in the MATCH already decide what may be seen
+        scope_sql, scope_params = '', []
+    else:
+        authors = [world_id for world_id in world_ids if access.can_see_hidden(world_id)]
+        scope_sql = (
+            " AND {alias}.world_id IN (SELECT value FROM json_each(%s))"
+            " AND ({alias}.is_hidden = 0 OR {alias}.world_id IN (SELECT value FROM json_each(%s)))"
+        )
+        scope_params = [json.dumps(world_ids), json.dumps(authors)]
+    
+    # ``lo`` is the lowest rowid of the newest RANK_CANDIDATES matches, which
+    # FTS5 reads newest first, stopping once it has enough; only rows from
+    # it up are ranked. Both windows skip inactive worlds, so the older
+    # rows start exactly where the ranked ones end
+    ranked_sql = f"""
+        WITH b(lo) AS MATERIALIZED (
+            SELECT coalesce(min(c.rowid), 0) FROM (
+                SELECT c.rowid FROM {INDEX_TABLE} c
+                JOIN {World._meta.db_table} cw ON cw.id = c.world_id
+                WHERE c.{INDEX_TABLE} MATCH %s{scope_sql.format(alias='c')}
+                  AND cw.is_active = 1
+                ORDER BY c.rowid DESC
+                LIMIT %s
+            ) c
+        )
+        SELECT {columns}
+        FROM b
+        CROSS JOIN {INDEX_TABLE} s
+        JOIN {World._meta.db_table} w ON w.id = s.world_id
+        WHERE s.{INDEX_TABLE} MATCH %s{scope_sql.format(alias='s')}
+          AND s.rowid >= b.lo
+          AND w.is_active = 1
+        ORDER BY bm25({INDEX_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}, 0.0), s.rowid DESC
+        LIMIT %s OFFSET %s
+    """
+    # Past them, matches follow newest first, which FTS5 reads without a sort
+    older_sql = f"""
+        SELECT {columns}
+        FROM {INDEX_TABLE} s
+        JOIN {World._meta.db_table} w ON w.id = s.world_id
+        WHERE s.{INDEX_TABLE} MATCH %s{scope_sql.format(alias='s')}
+          AND w.is_active = 1
+        ORDER BY s.rowid DESC
+        LIMIT %s OFFSET %s
+    """
+    marks = [_MARK_START, _MARK_END, _MARK_START, _MARK_END]
+    
+    rows = []
+    with connections[read_alias()].cursor() as cursor:
+        if offset < RANK_CANDIDATES:
+            cursor.execute(ranked_sql, [
+                match, *scope_params, RANK_CANDIDATES, *marks, match, *scope_params, page_size + 1, offset,
+            ])
+            rows = cursor.fetchall()
+        if len(rows) <= page_size and offset + page_size >= RANK_CANDIDATES:
+            cursor.execute(older_sql, [
+                *marks, match, *scope_params, page_size + 1 - len(rows), max(offset, RANK_CANDIDATES),
+            ])
+            rows += cursor.fetchall()
+    
+    results = []
+    for rowid, world_id, name, description, world_name in rows[:page_size]:
+        kind = rowid % 2
+        object_id = rowid // 2
+        if kind == KIND_WORLD:
+            url = reverse('core:world_detail', args=[object_id])
+        else:
+            url = reverse('core:category_detail', args=[world_id, object_id])
+        results.append({
+            'type': KIND_NAMES[kind],
+            'id': object_id,
+            'world_id': world_id,
+            'world_name': world_name,
+            'name': _highlight(name),
+            'description': _highlight(description),
+            'url': url,
+        })
+    return results, len(rows) > page_size
@@ -0,0 +1,140 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import access, changes, fragments, metrics, search
+from .models import World, WorldUser, Category, Entry, Media, MediaFile
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.instrument_connection(connection)
+
+
+@receiver(post_save, sender=World)
+def index_saved_world(sender, instance, raw=False, **kwargs):
+    if not raw and search.is_available():
+        search.index_world(instance)
+
+
+@receiver(post_delete, sender=World)
+def unindex_deleted_world(sender, instance, **kwargs):
+    if search.is_available():
+        search.remove_world(instance.pk)
+
+
+@receiver(post_save, sender=World)
+def invalidate_owner_access(sender, instance, created=False, **kwargs):
+    if created or instance.owner_id != instance.previous_owner_id:
+        access.invalidate(instance.owner_id, instance.previous_owner_id)
+
+
+@receiver(post_delete, sender=World)
+def invalidate_deleted_world_access(sender, instance, **kwargs):
+    access.invalidate(instance.owner_id)
+
+
+@receiver(post_save, sender=WorldUser)
+@receiver(post_delete, sender=WorldUser)
+def invalidate_member_access(sender, instance, **kwargs):
+    access.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+def index_saved_category(sender, instance, raw=False, **kwargs):
+    if not raw and search.is_available():
+        search.index_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_deleted_category(sender, instance, **kwargs):
+    if search.is_available():
+        search.remove_category(instance.pk)
+
+
+@receiver(post_save, sender=WorldUser)
+def count_added_member(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        World.objects.adjust_counter(instance.world_id, 'member_count', 1)
+
+
+@receiver(post_delete, sender=WorldUser)
+def count_removed_member(sender, instance, **kwargs):
+    World.objects.adjust_counter(instance.world_id, 'member_count', -1)
+
+
+@receiver(post_save, sender=Category)
+def count_added_category(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        World.objects.adjust_counter(instance.world_id, 'category_count', 1)
+    else:
+        World.objects.touch(instance.world_id)
+
+
+@receiver(post_delete, sender=Category)
+def count_removed_category(sender, instance, **kwargs):
+    World.objects.adjust_counter(instance.world_id, 'category_count', -1)
+
+
+@receiver(post_save, sender=World)
+@receiver(post_delete, sender=World)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_fragment_version(sender, instance, **kwargs):
+    fragments.bump(sender, instance.pk)
+
+
+@receiver(post_save, sender=World)
+def log_saved_world(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        changes.record(changes.WORLD, instance.pk, instance.pk, changes.CREATE if created else changes.UPDATE)
+
+
+@receiver(post_delete, sender=World)
+def log_deleted_world(sender, instance, **kwargs):
+    # Members' own changes were logged as their memberships cascaded
+    changes.record(changes.WORLD, instance.pk, instance.pk, changes.DELETE, user_id=instance.owner_id)
+
+
+@receiver(post_save, sender=WorldUser)
+def log_saved_membership(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        changes.record(
+            changes.MEMBERSHIP, instance.world_id, instance.pk,
+            changes.CREATE if created else changes.UPDATE, user_id=instance.user_id,
+        )
+
+
+@receiver(post_delete, sender=WorldUser)
+def log_deleted_membership(sender, instance, **kwargs):
+    changes.record(changes.MEMBERSHIP, instance.world_id, instance.pk, changes.DELETE, user_id=instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+def log_saved_category(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        changes.record(changes.CATEGORY, instance.world_id, instance.pk, changes.CREATE if created else changes.UPDATE)
+
+
+@receiver(post_delete, sender=Category)
+def log_deleted_category(sender, instance, **kwargs):
+    changes.record(changes.CATEGORY, instance.world_id, instance.pk, changes.DELETE)
+
+
+@receiver(post_save, sender=Entry)
+def touch_world_on_entry_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        World.objects.touch(instance.world_id)
+
+
+@receiver(post_save, sender=Media)
+def count_added_media_reference(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        MediaFile.objects.adjust_references(instance.file_id, 1)
+
+
+@receiver(post_delete, sender=Media)
+def count_removed_media_reference(sender, instance, **kwargs):
+    MediaFile.objects.adjust_references(instance.file_id, -1)
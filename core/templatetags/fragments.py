@@ -0,0 +1,51 @@
+"""
+``{% fragment %}``: versioned fragment caching
+
+    {% load fragments %}
+    {% fragment 'world_card' world world.owner world.role timeout=60 %}
+        ...
+    {% endfragment %}
+
+The first argument names the fragment. The rest are what it depends on:
+model instances by their version (see core.fragments), other values as
+they are. ``timeout`` is in seconds and defaults to an hour.
+"""
+from django import template
+
+from core import fragments
+
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    
+    def __init__(self, nodelist, name, vary_on, timeout):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.timeout = timeout
+    
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [expression.resolve(context) for expression in self.vary_on]
+        timeout = self.timeout.resolve(context) if self.timeout else fragments.DEFAULT_TIMEOUT
+        return fragments.get_or_render(name, vary_on, lambda: self.nodelist.render(context), timeout)
+
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    
+    timeout = None
+    vary_on = []
+    for bit in bits[2:]:
+        if bit.startswith('timeout='):
+            timeout = parser.compile_filter(bit[len('timeout='):])
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), vary_on, timeout)
@@ -1,3 +1,1526 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.templatetags.static import static
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from . import access, assets, changes, documents, fragments, join_codes, media, metrics, ranks, reordering, search, transfer
+from .collab import BrokerServer, CollabApplication, Hub, LocalBroker, SocketBroker
+from .access import WorldAccess
+from .models import World, WorldUser, Category, Entry, EntryBlob, CrossReference, Media, MediaFile, WorldChange, JoinCodeSequence
+from .db_routers import read_alias, read_only
+from .deletion import purge_deleted_worlds, soft_delete_world
+from .management.benchmark import QueryCounter
+from .provisioning import provision_worlds
+from .references import reindex_world
+from .query_budget import check_budgets, profile_routes, unbudgeted_routes
+from .query_plans import captured_plans, check_plans, explain_routes
+
+
+class DashboardReadModelTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', password='password')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        self.client.force_login(self.user)
+    
+    def create_worlds(self, count):
+        start = World.objects.count()
+        numbers = range(start, start + count)
+        owned = World.objects.bulk_create([
+            World(name=f"Owned {i}", owner=self.user, join_code=f"O{i:07d}") for i in numbers
+        ])
+        joined = World.objects.bulk_create([
+            World(name=f"Joined {i}", owner=self.other, join_code=f"J{i:07d}") for i in numbers
+        ])
+        WorldUser.objects.bulk_create([WorldUser(world=world, user=self.user, role='player') for world in joined])
+        return owned, joined
+    
+    def dashboard_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_dashboard_query_count_is_constant(self):
+        self.create_worlds(1)
+        # Warm the cached user so both counts are taken in the same state
+        self.dashboard_query_count()
+        few = self.dashboard_query_count()
+        self.create_worlds(499)
+        many = self.dashboard_query_count()
+        self.assertEqual(few, many)
+    
+    def test_for_dashboard_annotates_role(self):
+        owned, joined = self.create_worlds(1)
+        roles = {world.id: world.role for world in World.objects.for_dashboard(self.user)}
+        self.assertEqual(roles, {owned[0].id: 'owner', joined[0].id: 'player'})
+    
+    def test_counters_follow_members_and_categories(self):
+        world = World.objects.create(name="Counted", owner=self.user)
+        membership = WorldUser.objects.create(world=world, user=self.other, role='player')
+        root = Category.objects.create(world=world, name="Root")
+        Category.objects.create(world=world, parent=root, name="Child")
+        
+        world.refresh_from_db()
+        self.assertEqual((world.member_count, world.category_count), (1, 2))
+        
+        # A stale instance must not overwrite the counters
+        stale = World.objects.get(pk=world.pk)
+        membership.delete()
+        root.delete()
+        stale.name = "Renamed"
+        stale.save()
+        
+        world.refresh_from_db()
+        self.assertEqual((world.name, world.member_count, world.category_count), ("Renamed", 0, 0))
+
+
+class WorldApiTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', password='password')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='password')
+        self.client.force_login(self.user)
+        self.owned = [World.objects.create(name=f"Owned {i}", owner=self.user) for i in range(3)]
+        self.joined = [World.objects.create(name=f"Joined {i}", owner=self.other) for i in range(3)]
+        for world in self.joined:
+            WorldUser.objects.create(world=world, user=self.user, role='player')
+        World.objects.create(name="Unrelated", owner=self.other)
+    
+    def test_keyset_pages_cover_every_world_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 4, 'fields': 'id,is_owner'}
+            if cursor:
+                params['cursor'] = cursor
+            payload = self.client.get(reverse('core:api_worlds'), params).json()
+            seen.extend(payload['worlds'])
+            cursor = payload['next_cursor']
+            if not cursor:
+                break
+        
+        expected = {world.id: True for world in self.owned} | {world.id: False for world in self.joined}
+        self.assertEqual({row['id']: row['is_owner'] for row in seen}, expected)
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen[0]), {'id', 'is_owner'})
+    
+    def test_rejects_unknown_fields_and_bad_cursors(self):
+        self.assertEqual(self.client.get(reverse('core:api_worlds'), {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:api_worlds'), {'cursor': 'nope'}).status_code, 400)
+
+
+class JoinCodeTests(TestCase):
+    
+    def test_permutation_is_collision_free(self):
+        codes = join_codes.codes_for(range(20000), 'test-key')
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertTrue(all(len(code) == join_codes.CODE_LENGTH for code in codes))
+    
+    def test_provisioned_worlds_get_unique_joinable_codes(self):
+        owner = User.objects.create_user(username='dm', email='dm@example.com', password='password')
+        player = User.objects.create_user(username='player', email='player@example.com', password='password')
+        worlds = provision_worlds(owner, [f"Table {i}" for i in range(200)])
+        worlds.append(World.objects.create(name="Single", owner=owner))
+        
+        self.assertEqual(len({world.join_code for world in worlds}), 201)
+        
+        self.client.force_login(player)
+        response = self.client.post(reverse('core:join_world'), {'join_code': worlds[42].join_code.lower()})
+        self.assertEqual(response.json()['world']['id'], worlds[42].id)
+    
+    def test_missing_sequence_row_is_recreated(self):
+        JoinCodeSequence.objects.all().delete()
+        owner = User.objects.create_user(username='dm', email='dm@example.com')
+        first = World.objects.create(name="First", owner=owner)
+        second = World.objects.create(name="Second", owner=owner)
+        self.assertNotEqual(first.join_code, second.join_code)
+        sequence = JoinCodeSequence.objects.get(pk=1)
+        self.assertEqual(sequence.last_value, 2)
+        self.assertEqual(len(sequence.secret), 64)
+
+
+class AsyncApiTests(TestCase):
+    
+    async def test_join_and_leave_through_async_client(self):
+        owner = await User.objects.acreate_user(username='dm', email='dm@example.com', password='password')
+        player = await User.objects.acreate_user(username='player', email='player@example.com', password='password')
+        world = await World.objects.acreate(name="Async World", owner=owner)
+        await self.async_client.aforce_login(player)
+        
+        response = await self.async_client.post(reverse('core:join_world'), {'join_code': world.join_code})
+        self.assertTrue(response.json()['success'])
+        response = await self.async_client.post(reverse('core:join_world'), {'join_code': world.join_code})
+        self.assertEqual(response.json()['error'], 'You are already a member of this world.')
+        
+        response = await self.async_client.get(reverse('core:api_worlds'))
+        self.assertEqual([row['id'] for row in response.json()['worlds']], [world.id])
+        
+        response = await self.async_client.post(reverse('core:leave_world', args=[world.id]))
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(await WorldUser.objects.filter(world=world).aexists())
+
+
+class WorldAccessTests(TestCase):
+    
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.world = World.objects.create(name="Atlas", owner=self.owner)
+    
+    def roles(self, user):
+        """The user's membership map, leaving it cached"""
+        return WorldAccess(user).memberships
+    
+    def test_warm_map_costs_no_queries(self):
+        WorldUser.objects.create(world=self.world, user=self.player, role='creator')
+        with self.assertNumQueries(2):
+            self.assertEqual(self.roles(self.player), {self.world.id: 'creator'})
+        with self.assertNumQueries(0):
+            resolver = WorldAccess(self.player)
+            self.assertTrue(resolver.can_view(self.world.id))
+            self.assertTrue(resolver.can_see_hidden(self.world.id))
+            self.assertFalse(resolver.is_owner(self.world.id))
+            self.assertEqual(resolver.world_ids(), [self.world.id])
+    
+    def test_membership_changes_invalidate_the_map(self):
+        self.assertEqual(self.roles(self.player), {})
+        membership = WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        self.assertEqual(self.roles(self.player), {self.world.id: 'player'})
+        
+        membership.role = 'co_creator'
+        membership.save()
+        self.assertEqual(self.roles(self.player), {self.world.id: 'co_creator'})
+        
+        membership.delete()
+        self.assertEqual(self.roles(self.player), {})
+    
+    def test_ownership_changes_invalidate_the_map(self):
+        self.assertEqual(self.roles(self.owner), {self.world.id: access.ROLE_OWNER})
+        self.assertEqual(self.roles(self.player), {})
+        
+        self.world.owner = self.player
+        self.world.save()
+        self.assertEqual(self.roles(self.owner), {})
+        self.assertEqual(self.roles(self.player), {self.world.id: access.ROLE_OWNER})
+        
+        WorldUser.objects.create(world=self.world, user=self.owner, role='player')
+        self.assertEqual(self.roles(self.owner), {self.world.id: 'player'})
+        self.client.force_login(self.player)
+        self.assertTrue(self.client.post(reverse('core:delete_world', args=[self.world.id])).json()['success'])
+        self.assertEqual(self.roles(self.owner), {})
+        self.assertEqual(self.roles(self.player), {})
+        
+        kept = World.objects.create(name="Kept", owner=self.owner)
+        self.assertEqual(self.roles(self.owner), {kept.id: access.ROLE_OWNER})
+        kept.delete()
+        self.assertEqual(self.roles(self.owner), {})
+    
+    def test_map_is_dropped_again_when_the_transaction_commits(self):
+        membership = WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        key = access._cache_key(self.player.pk)
+        stale = self.roles(self.player)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            membership.role = 'creator'
+            membership.save()
+            self.assertIsNone(caches['default'].get(key))
+            # A concurrent request caches what it read before the commit
+            caches['default'].set(key, stale)
+        self.assertTrue(callbacks)
+        self.assertIsNone(caches['default'].get(key))
+        self.assertEqual(self.roles(self.player), {self.world.id: 'creator'})
+
+
+class ReadReplicaRoutingTests(TransactionTestCase):
+    
+    databases = {'default', 'replica'}
+    
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Atlas", owner=self.user)
+        self.client.force_login(self.user)
+    
+    @contextmanager
+    def queries_by_alias(self):
+        queries = {alias: [] for alias in connections}
+        with ExitStack() as stack:
+            for alias in queries:
+                def record(execute, sql, params, many, context, alias=alias):
+                    queries[alias].append(sql)
+                    return execute(sql, params, many, context)
+                stack.enter_context(connections[alias].execute_wrapper(record))
+            yield queries
+    
+    def world_reads(self, queries):
+        return [sql for sql in queries if sql.startswith('SELECT') and '"core_world"' in sql]
+    
+    def test_read_only_views_read_from_the_replica(self):
+        # dashboard is a sync view, api_worlds an async one
+        for name in ('core:dashboard', 'core:api_worlds'):
+            with self.queries_by_alias() as queries:
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+            self.assertTrue(self.world_reads(queries['replica']), name)
+            self.assertEqual(self.world_reads(queries['default']), [], name)
+    
+    def test_writes_stay_on_default(self):
+        with self.queries_by_alias() as queries:
+            response = self.client.post(reverse('core:create_world'), {'world_name': "Second", 'theme_color': '#8b7355'})
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(queries['replica'], [])
+        self.assertTrue(any(sql.startswith('INSERT INTO "core_world"') for sql in queries['default']))
+        
+        @read_only
+        def rename():
+            world = World.objects.get(pk=self.world.pk)
+            world.name = "Renamed"
+            world.save()
+        
+        with self.queries_by_alias() as queries:
+            rename()
+        self.assertEqual(len(self.world_reads(queries['replica'])), 1)
+        self.assertTrue(any(sql.startswith('UPDATE "core_world"') for sql in queries['default']))
+        self.assertFalse(any(sql.startswith(('INSERT', 'UPDATE', 'DELETE')) for sql in queries['replica']))
+        
+        # A transaction reads its own writes
+        with transaction.atomic():
+            self.assertEqual(read_only(read_alias)(), 'default')
+        self.assertEqual(read_only(read_alias)(), 'replica')
+        self.assertEqual(read_alias(), 'default')
+    
+    def test_databases_use_write_ahead_logging(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wal.sqlite3')
+            for alias, name in (('default', path), ('replica', f"file:{path}?mode=ro")):
+                settings_dict = {**settings.DATABASES[alias], 'NAME': name}
+                wrapper = connections[alias].__class__(settings_dict, alias=f"{alias}_wal_check")
+                try:
+                    with wrapper.cursor() as cursor:
+                        cursor.execute("PRAGMA journal_mode")
+                        self.assertEqual(cursor.fetchone()[0], 'wal')
+                finally:
+                    wrapper.close()
+
+
+class QueryBudgetTests(TestCase):
+    
+    def test_every_named_route_has_a_budget(self):
+        self.assertEqual(unbudgeted_routes(), [])
+    
+    def test_routes_stay_within_budget_at_every_scale(self):
+        results = profile_routes([1, 8])
+        self.assertEqual(check_budgets(results), [])
+
+
+class QueryPlanTests(TestCase):
+    
+    def test_routes_neither_scan_tables_nor_sort_in_temporary_b_trees(self):
+        self.assertEqual(check_plans(explain_routes(4)), [])
+    
+    def test_scans_and_sorts_are_reported(self):
+        world = World.objects.create(name="Plans", owner=User.objects.create_user(username='dm', email='dm@example.com'))
+        with captured_plans() as plans:
+            list(Category.objects.filter(description="Unindexed").order_by())
+            list(Category.objects.filter(world=world, parent=None).order_by('created_at'))
+            list(Category.objects.filter(world=world, parent=None))
+        violations = check_plans({'core:world_detail': plans})
+        self.assertEqual(len(violations), 2)
+        self.assertIn("SCAN core_category", violations[0])
+        self.assertIn("USE TEMP B-TREE FOR ORDER BY", violations[1])
+
+
+class InstrumentationTests(TestCase):
+    
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='dm', email='dm@example.com', password='password')
+        World.objects.create(name="Timed", owner=self.user)
+        self.client.force_login(self.user)
+    
+    def test_server_timing_counts_queries_of_sync_and_async_views(self):
+        for name in ('core:dashboard', 'core:api_worlds'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name))
+            self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertRegex(self.client.get(reverse('core:dashboard'))['Server-Timing'], r'tpl;dur=(?!0\.0\b)')
+    
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse('core:dashboard'))
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 403)
+        
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get(reverse('core:metrics')).content.decode()
+        self.assertIn('plothook_request_duration_seconds_count{view="core:dashboard"} 1', body)
+        self.assertIn('plothook_template_render_seconds_bucket{view="core:dashboard",le="+Inf"} 1', body)
+    
+    def test_benchmark_query_counts_go_past_the_query_log_limit(self):
+        with QueryCounter() as queries, connection.cursor() as cursor:
+            for _ in range(connection.queries_limit + 100):
+                cursor.execute("SELECT 1")
+        self.assertEqual(queries.count, connection.queries_limit + 100)
+
+
+class SearchTests(TestCase):
+    
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.stranger = User.objects.create_user(username='stranger', email='stranger@example.com')
+        self.world = World.objects.create(name="Dragon Coast", description="Cliffs and harbors", owner=self.owner)
+        WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        self.keep = Category.objects.create(world=self.world, name="Dragon Keep", description="A fortress")
+        self.lair = Category.objects.create(world=self.world, name="Dragon Lair", description="Secret", is_hidden=True)
+        self.other = World.objects.create(name="Dragon Wastes", owner=self.stranger)
+    
+    def names(self, user, term, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:search'), {'q': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return sorted(result['name'].replace('<mark>', '').replace('</mark>', '') for result in response.json()['results'])
+    
+    def test_last_term_matches_as_prefix(self):
+        self.assertEqual(self.names(self.player, "drag"), ["Dragon Coast", "Dragon Keep"])
+        self.assertEqual(self.names(self.player, "dragon ke"), ["Dragon Keep"])
+        # Only the last term is a prefix
+        self.assertEqual(self.names(self.player, "drag keep"), [])
+        self.client.force_login(self.player)
+        result = self.client.get(reverse('core:search'), {'q': "fortr"}).json()['results'][0]
+        self.assertEqual(result['description'], "A <mark>fortress</mark>")
+    
+    def test_hidden_categories_and_other_worlds_are_filtered(self):
+        # Small scopes are filtered by scope tokens in the MATCH, large ones
+        # against the membership map
+        for limit in (search.SCOPE_FILTER_LIMIT, 0):
+            with mock.patch.object(search, 'SCOPE_FILTER_LIMIT', limit):
+                self.assertEqual(self.names(self.player, "dragon"), ["Dragon Coast", "Dragon Keep"])
+                self.assertEqual(self.names(self.owner, "dragon"), ["Dragon Coast", "Dragon Keep", "Dragon Lair"])
+                self.assertEqual(self.names(self.stranger, "dragon"), ["Dragon Wastes"])
+        
+        WorldUser.objects.filter(user=self.player).update(role='co_creator')
+        access.invalidate(self.player.pk)
+        self.assertIn("Dragon Lair", self.names(self.player, "lair"))
+    
+    def test_index_follows_category_writes(self):
+        self.assertEqual(self.names(self.player, "tower"), [])
+        tower = Category.objects.create(world=self.world, name="Tower")
+        self.assertEqual(self.names(self.player, "tower"), ["Tower"])
+        
+        tower.name = "Spire"
+        tower.save()
+        self.assertEqual(self.names(self.player, "tower"), [])
+        self.assertEqual(self.names(self.player, "spire"), ["Spire"])
+        
+        tower.is_hidden = True
+        tower.save()
+        self.assertEqual(self.names(self.player, "spire"), [])
+        self.assertEqual(self.names(self.owner, "spire"), ["Spire"])
+        
+        tower.delete()
+        self.assertEqual(self.names(self.owner, "spire"), [])
+    
+    def test_pages_reach_past_the_ranked_candidates(self):
+        Category.objects.bulk_create([Category(world=self.world, name=f"Ruin {i}", path='', depth=0) for i in range(5)])
+        search.rebuild_index()
+        # The first page is ranked in the window, the others past it
+        with mock.patch.object(search, 'RANK_CANDIDATES', 3):
+            seen = []
+            for page in (1, 2, 3):
+                self.client.force_login(self.player)
+                data = self.client.get(reverse('core:search'), {'q': "ruin", 'page': page, 'page_size': 2}).json()
+                seen.extend(result['id'] for result in data['results'])
+                self.assertEqual(data['has_next'], page < 3)
+        self.assertEqual(sorted(seen), sorted(Category.objects.filter(name__startswith="Ruin").values_list('id', flat=True)))
+    
+    def test_pages_skip_deleted_worlds_on_both_sides_of_the_ranked_candidates(self):
+        older = [Category.objects.create(world=self.world, name=f"Ruin {i}") for i in range(3)]
+        doomed = World.objects.create(name="Doomed", owner=self.owner)
+        for i in range(2):
+            Category.objects.create(world=doomed, name=f"Ruin {i}")
+        # Resolved before the deletion, as in a request already under way
+        resolver = WorldAccess(self.owner)
+        self.assertIn(doomed.id, resolver.world_ids())
+        soft_delete_world(doomed)
+        
+        # The two newest matches belong to the deleted world
+        with mock.patch.object(search, 'RANK_CANDIDATES', 3):
+            for limit in (search.SCOPE_FILTER_LIMIT, 0):
+                with mock.patch.object(search, 'SCOPE_FILTER_LIMIT', limit):
+                    seen, page, has_next = [], 1, True
+                    while has_next:
+                        results, has_next = search.search(resolver, "ruin", page=page, page_size=2)
+                        seen.extend(result['id'] for result in results)
+                        page += 1
+                    self.assertEqual(sorted(seen), sorted(category.id for category in older))
+
+
+class WorldDeletionTests(TestCase):
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com', password='password')
+        self.player = User.objects.create_user(username='player', email='player@example.com', password='password')
+        self.world = World.objects.create(name="Doomed", owner=self.owner)
+        WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        parent = None
+        for depth in range(5):
+            parent = Category.objects.create(world=self.world, parent=parent, name=f"Level {depth}")
+        entry = None
+        for i in range(3):
+            entry = Entry.objects.create(
+                world=self.world, category=parent, parent_entry=entry, author=self.owner, title=f"Entry {i}",
+                content=image_document("x" * (documents.BLOB_THRESHOLD + i)),
+            )
+    
+    def test_deleted_world_is_hidden_then_purged(self):
+        self.client.force_login(self.player)
+        self.assertEqual(len(self.client.get(reverse('core:api_worlds')).json()['worlds']), 1)
+        
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('core:delete_world', args=[self.world.id]))
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(Category.objects.filter(world=self.world).count(), 5)
+        
+        self.client.force_login(self.player)
+        self.assertEqual(self.client.get(reverse('core:api_worlds')).json()['worlds'], [])
+        self.assertEqual(self.client.get(reverse('core:world_detail', args=[self.world.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('core:search'), {'q': 'Level'}).json()['results'], [])
+        
+        self.assertEqual(purge_deleted_worlds(batch_size=2), [self.world.id])
+        self.assertFalse(World.objects.filter(pk=self.world.pk).exists())
+        self.assertFalse(Category.objects.filter(world_id=self.world.pk).exists())
+        self.assertFalse(WorldUser.objects.filter(world_id=self.world.pk).exists())
+        self.assertFalse(Entry.objects.filter(world_id=self.world.pk).exists())
+        self.assertFalse(EntryBlob.objects.exists())
+
+
+class WorldTransferTests(TestCase):
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.ghost = User.objects.create_user(username='ghost', email='ghost@example.com')
+        self.world = World.objects.create(name="Atlas", description="Maps of everything", owner=self.owner)
+        WorldUser.objects.create(world=self.world, user=self.player, role='co_creator')
+        WorldUser.objects.create(world=self.world, user=self.ghost, role='player')
+        coast = Category.objects.create(world=self.world, name="Coast")
+        Category.objects.create(world=self.world, parent=coast, name="Harbor", is_hidden=True)
+        cliffs = Category.objects.create(world=self.world, parent=coast, name="Cliffs", rank="v")
+        # A newer parent than its child, so ids alone aren't parent-first
+        inland = Category.objects.create(world=self.world, name="Inland")
+        cliffs.parent = inland
+        cliffs.save()
+        Category.objects.create(world=self.world, parent=cliffs, name="Caves")
+    
+    def tree(self, world):
+        by_id = {category.id: category for category in Category.objects.filter(world=world)}
+        for category in by_id.values():
+            parent = by_id.get(category.parent_id)
+            self.assertEqual(category.path, (parent.path if parent else '') + Category.path_segment(category.id))
+            self.assertEqual(category.depth, parent.depth + 1 if parent else 0)
+        return sorted(
+            (category.depth, category.name, by_id[category.parent_id].name if category.parent_id else None,
+             category.rank, category.is_hidden)
+            for category in by_id.values()
+        )
+    
+    def test_export_and_import_round_trip_through_commands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'atlas.jsonl')
+            call_command('export_world', self.world.id, output=path, stdout=io.StringIO())
+            with open(path, 'rb') as file:
+                kinds = [json.loads(line)['type'] for line in file]
+            self.assertEqual(kinds, ['world'] + ['category'] * 5 + ['member'] * 2)
+            
+            self.ghost.delete()
+            output = io.StringIO()
+            call_command('import_world', path, owner='player', name="Atlas copy", batch_size=2, stdout=output)
+        
+        copy = World.objects.get(name="Atlas copy")
+        self.assertEqual((copy.owner, copy.description), (self.player, "Maps of everything"))
+        self.assertNotEqual(copy.join_code, self.world.join_code)
+        self.assertEqual(self.tree(copy), self.tree(self.world))
+        self.assertEqual((copy.category_count, copy.member_count), (5, 0))
+        self.assertIn("ghost", output.getvalue())
+        
+        self.client.force_login(self.player)
+        results = self.client.get(reverse('core:search'), {'q': 'Caves'}).json()['results']
+        self.assertEqual({result['world_id'] for result in results}, {self.world.id, copy.id})
+    
+    def test_export_and_import_endpoints(self):
+        self.client.force_login(self.player)
+        export_url = reverse('core:export_world', args=[self.world.id])
+        self.assertEqual(self.client.get(export_url).status_code, 404)
+        
+        self.client.force_login(self.owner)
+        response = self.client.get(export_url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        export = b''.join(response.streaming_content)
+        
+        stranger = User.objects.create_user(username='stranger', email='stranger@example.com')
+        self.client.force_login(stranger)
+        import_url = reverse('core:import_world')
+        response = self.client.post(import_url, export, content_type='application/x-ndjson')
+        result = response.json()
+        copy = World.objects.get(pk=result['world']['id'])
+        self.assertEqual((copy.owner, copy.name), (stranger, "Atlas"))
+        self.assertEqual((result['categories'], result['members'], result['missing_members']), (5, 2, []))
+        self.assertEqual(self.tree(copy), self.tree(self.world))
+        self.assertEqual(
+            set(copy.world_users.values_list('user__username', 'role')),
+            {('player', 'co_creator'), ('ghost', 'player')},
+        )
+        self.client.force_login(self.player)
+        self.assertEqual(self.client.get(reverse('core:world_detail', args=[copy.id])).status_code, 200)
+    
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('core:export_world', args=[self.world.id]))
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(json.loads(lines[0])['owner'], 'dm')
+        self.assertEqual(len(lines), 8)
+    
+    def test_invalid_imports_change_nothing(self):
+        self.client.force_login(self.owner)
+        lines = b''.join(transfer.export_world(World.objects.select_related('owner').get(pk=self.world.pk))).splitlines()
+        worlds = World.objects.count()
+        for body, error in [
+            (b'not json', "Line 1 is not valid JSON."),
+            (lines[1], "The export must start with a world line."),
+            (b'\n'.join([lines[0], lines[3], lines[1]]), "comes before its parent"),
+            (b'\n'.join([lines[0], lines[1], lines[1]]), "repeats category"),
+            (b'\n'.join([lines[0], b'{"type": "member", "username": "player", "role": "king"}']), "unknown role"),
+        ]:
+            response = self.client.post(reverse('core:import_world'), body, content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.json()['error'])
+        self.assertEqual(World.objects.count(), worlds)
+        
+        with self.settings(WORLD_IMPORT_MAX_SIZE=10):
+            response = self.client.post(reverse('core:import_world'), lines[0], content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 413)
+    
+    def test_version_1_exports_keep_their_sort_order(self):
+        lines = [
+            {'type': 'world', 'version': 1, 'name': "Old atlas", 'owner': 'dm'},
+            {'type': 'category', 'id': 1, 'parent': None, 'name': "Late", 'sort_order': 10},
+            {'type': 'category', 'id': 2, 'parent': None, 'name': "Early", 'sort_order': -3},
+            {'type': 'category', 'id': 3, 'parent': None, 'name': "Middle", 'sort_order': 0},
+        ]
+        world, *_ = transfer.import_world(json.dumps(line) for line in lines)
+        self.assertEqual([category.name for category in world.categories.all()], ["Early", "Middle", "Late"])
+
+
+class CategoryPathTests(TestCase):
+    
+    def setUp(self):
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Atlas", owner=self.owner)
+        self.a = Category.objects.create(world=self.world, name="A")
+        self.b = Category.objects.create(world=self.world, name="B")
+        self.c = Category.objects.create(world=self.world, parent=self.b, name="C")
+        self.d = Category.objects.create(world=self.world, parent=self.c, name="D")
+    
+    def assert_paths(self):
+        """Every stored path is its parent's path plus its own segment"""
+        by_id = {category.id: category for category in Category.objects.filter(world=self.world)}
+        for category in by_id.values():
+            parent = by_id.get(category.parent_id)
+            self.assertEqual(category.path, (parent.path if parent else '') + Category.path_segment(category.id))
+            self.assertEqual(category.depth, parent.depth + 1 if parent else 0)
+        return by_id
+    
+    def test_create_sets_path_and_depth(self):
+        self.assertEqual((self.a.path, self.a.depth), (Category.path_segment(self.a.id), 0))
+        self.assertEqual(
+            (self.d.path, self.d.depth),
+            (Category.path_segment(self.b.id) + Category.path_segment(self.c.id) + Category.path_segment(self.d.id), 2),
+        )
+        self.assertEqual([category.name for category in self.d.get_ancestors()], ["B", "C"])
+        self.assertEqual([category.name for category in self.b.get_descendants()], ["C", "D"])
+        self.assert_paths()
+    
+    def test_move_reprefixes_subtree(self):
+        self.b.parent = self.a
+        self.b.save()
+        by_id = self.assert_paths()
+        self.assertEqual(by_id[self.d.id].depth, 3)
+        self.assertEqual([category.name for category in self.a.get_descendants()], ["B", "C", "D"])
+        
+        self.c.refresh_from_db()
+        self.c.parent = None
+        self.c.save()
+        by_id = self.assert_paths()
+        self.assertEqual((by_id[self.c.id].depth, by_id[self.d.id].depth), (0, 1))
+        self.assertEqual(self.a.get_descendant_count(), 1)
+    
+    def test_stale_instance_keeps_moved_path(self):
+        # Loaded before its parent moves under A
+        stale = Category.objects.get(pk=self.c.pk)
+        self.b.parent = self.a
+        self.b.save()
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(
+            Category.objects.filter(pk=self.c.pk).values_list('path', 'depth').get(),
+            (Category.path_segment(self.a.id) + Category.path_segment(self.b.id) + Category.path_segment(self.c.id), 2),
+        )
+        self.assertEqual(stale.path, self.c.path)
+        
+        # Moving the stale instance re-prefixes its subtree from the stored path
+        stale.parent = None
+        stale.save()
+        by_id = self.assert_paths()
+        self.assertEqual(by_id[self.d.id].depth, 1)
+    
+    def test_move_beneath_itself_is_rejected(self):
+        self.b.parent = self.d
+        with self.assertRaises(ValueError):
+            self.b.save()
+        self.assert_paths()
+    
+    def test_deep_tree_moves(self):
+        chain = [self.a]
+        for depth in range(1, 40):
+            chain.append(Category.objects.create(world=self.world, parent=chain[-1], name=f"Level {depth}"))
+        self.assertEqual(chain[-1].depth, 39)
+        self.assertEqual(len(chain[-1].path), 40 * Category.PATH_STEP)
+        
+        # Cut the chain in the middle, then hang the lower half under D
+        middle = chain[20]
+        middle.parent = None
+        middle.save()
+        by_id = self.assert_paths()
+        self.assertEqual(by_id[chain[-1].id].depth, 19)
+        
+        middle.parent = self.d
+        middle.save()
+        by_id = self.assert_paths()
+        self.assertEqual(by_id[chain[-1].id].depth, 22)
+        self.assertEqual(self.b.get_descendant_count(), 2 + 20)
+        self.assertEqual(self.a.get_descendant_count(), 19)
+
+
+class CategoryReorderTests(TestCase):
+    
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.world = World.objects.create(name="Atlas", owner=self.owner)
+        WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        self.north = Category.objects.create(world=self.world, name="North")
+        self.south = Category.objects.create(world=self.world, name="South")
+        self.north_towns = Category.objects.create(world=self.world, parent=self.north, name="Towns")
+        self.south_towns = Category.objects.create(world=self.world, parent=self.south, name="Towns")
+        self.harbor = Category.objects.create(world=self.world, parent=self.north_towns, name="Harbor")
+        self.west = Category.objects.create(world=self.world, name="West")
+        self.client.force_login(self.owner)
+    
+    def move(self, *moves):
+        return self.client.post(
+            reverse('core:move_categories', args=[self.world.id]), json.dumps({'moves': list(moves)}),
+            content_type='application/json',
+        )
+    
+    def names(self, parent=None):
+        return list(Category.objects.filter(world=self.world, parent=parent).values_list('name', flat=True))
+    
+    def test_ranks_order_as_strings(self):
+        # Inserting over and over right after the first key
+        keys = [ranks.between(None, None)]
+        keys.append(ranks.between(keys[0], None))
+        for _ in range(200):
+            keys.append(ranks.between(keys[0], keys[-1]))
+        keys.append(ranks.between(None, keys[0]))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertTrue(all(ranks.is_valid(key) for key in keys))
+        self.assertTrue(ranks.needs_rebalance(max(keys, key=len)))
+        spread = ranks.spread(1000)
+        self.assertEqual(spread, sorted(spread))
+        self.assertLessEqual(max(map(len, spread)), 3)
+        self.assertEqual(
+            [ranks.for_integer(value) for value in (-5, 0, 3, 40)],
+            sorted(ranks.for_integer(value) for value in (-5, 0, 3, 40)),
+        )
+        with self.assertRaises(ValueError):
+            ranks.between('k', 'k')
+    
+    def test_reordering_writes_one_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.move({'id': self.west.id, 'after': self.north.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(), ["North", "West", "South"])
+        writes = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "core_category"')]
+        self.assertEqual(len(writes), 1)
+        
+        self.move({'id': self.south.id, 'before': self.north.id})
+        self.assertEqual(self.names(), ["South", "North", "West"])
+    
+    def test_moves_and_rebalances_refresh_cached_cards(self):
+        caches[fragments.CACHE_ALIAS].clear()
+        url = reverse('core:world_detail', args=[self.world.id])
+        
+        def card_ranks():
+            content = self.client.get(url).content.decode()
+            return dict(re.findall(r'data-category-id="(\d+)" data-rank="([^"]*)"', content))
+        
+        card_ranks()
+        self.move({'id': self.west.id, 'after': self.north.id})
+        self.west.refresh_from_db()
+        self.assertEqual(card_ranks()[str(self.west.id)], self.west.rank)
+        
+        self.assertGreater(reordering.rebalance_siblings(self.world.id, None), 0)
+        stored = dict(Category.objects.filter(world=self.world, parent=None).values_list('id', 'rank'))
+        self.assertEqual(card_ranks(), {str(pk): rank for pk, rank in stored.items()})
+    
+    def test_moving_updates_paths_and_allows_swapping_same_names(self):
+        response = self.move(
+            {'id': self.north_towns.id, 'parent': self.south.id},
+            {'id': self.south_towns.id, 'parent': self.north.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.north_towns.refresh_from_db()
+        self.harbor.refresh_from_db()
+        self.assertEqual(self.north_towns.parent, self.south)
+        self.assertEqual(self.harbor.path, self.south.path + Category.path_segment(self.north_towns.id) + Category.path_segment(self.harbor.id))
+        
+        self.move({'id': self.harbor.id, 'parent': None, 'before': self.north.id})
+        self.harbor.refresh_from_db()
+        self.assertEqual((self.harbor.depth, self.harbor.path), (0, Category.path_segment(self.harbor.id)))
+        self.assertEqual(self.names(), ["Harbor", "North", "South", "West"])
+    
+    def test_invalid_batches_change_nothing(self):
+        before = list(Category.objects.values_list('id', 'parent_id', 'rank', 'path'))
+        for moves, error in [
+            ([{'id': self.north.id, 'parent': self.harbor.id}], "beneath itself"),
+            ([{'id': self.north_towns.id, 'parent': self.south.id}], "already has a subcategory named"),
+            ([{'id': self.west.id, 'after': self.harbor.id}], "is not a sibling"),
+            ([{'id': self.west.id, 'after': self.north.id}, {'id': 10 ** 9}], "not found"),
+            ([], "Send a list of moves."),
+        ]:
+            response = self.move(*moves)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.json()['error'])
+        self.assertEqual(list(Category.objects.values_list('id', 'parent_id', 'rank', 'path')), before)
+        
+        self.client.force_login(self.player)
+        self.assertEqual(self.move({'id': self.west.id}).status_code, 404)
+    
+    @override_settings(CATEGORY_REBALANCE_IN_BACKGROUND=False)
+    def test_long_ranks_are_rebalanced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(120):
+                self.assertEqual(self.move({'id': self.west.id, 'after': self.north.id}).status_code, 200)
+                self.assertEqual(self.move({'id': self.south.id, 'after': self.north.id}).status_code, 200)
+        longest = max(Category.objects.filter(parent=None).values_list('rank', flat=True), key=len)
+        self.assertLessEqual(len(longest), ranks.REBALANCE_LENGTH)
+        self.assertEqual(self.names(), ["North", "South", "West"])
+        
+        Category.objects.filter(pk=self.west.pk).update(rank='z' * 40 + 'h')
+        call_command('rebalance_category_ranks', stdout=io.StringIO())
+        self.assertEqual(self.names(), ["North", "South", "West"])
+        self.assertEqual(max(len(rank) for rank in Category.objects.values_list('rank', flat=True)), 1)
+
+
+def image_document(src, text="A tavern by the river."):
+    return {'type': 'doc', 'content': [
+        {'type': 'heading', 'attrs': {'level': 1}, 'content': [{'type': 'text', 'text': "The Drowned Lantern"}]},
+        {'type': 'paragraph', 'content': [
+            {'type': 'text', 'text': text},
+            {'type': 'image', 'attrs': {'src': src, 'alt': "Sign"}},
+        ]},
+    ]}
+
+
+class ChangeLogTests(TestCase):
+    
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.world = World.objects.create(name="Atlas", owner=self.owner)
+        self.membership = WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        self.north = Category.objects.create(world=self.world, name="North")
+        self.client.force_login(self.player)
+    
+    def sync(self, since):
+        response = self.client.get(reverse('core:sync'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_writes_are_logged(self):
+        self.north.name = "Far North"
+        self.north.save()
+        category_id, membership_id = self.north.id, self.membership.id
+        self.north.delete()
+        self.membership.delete()
+        self.assertEqual(
+            list(WorldChange.objects.order_by('id').values_list('kind', 'object_id', 'action', 'user_id')),
+            [
+                (changes.WORLD, self.world.id, changes.CREATE, None),
+                (changes.MEMBERSHIP, membership_id, changes.CREATE, self.player.id),
+                (changes.CATEGORY, category_id, changes.CREATE, None),
+                (changes.CATEGORY, category_id, changes.UPDATE, None),
+                (changes.CATEGORY, category_id, changes.DELETE, None),
+                (changes.MEMBERSHIP, membership_id, changes.DELETE, self.player.id),
+            ],
+        )
+    
+    def test_sync_returns_changed_cards(self):
+        cursor = changes.latest_sequence()
+        self.assertEqual(self.sync(cursor)['cursor'], cursor)
+        
+        south = Category.objects.create(world=self.world, name="South")
+        vault = Category.objects.create(world=self.world, name="Vault", is_hidden=True)
+        north_id = self.north.id
+        self.north.delete()
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['cursor'], changes.latest_sequence())
+        self.assertEqual([world['id'] for world in data['worlds']], [self.world.id])
+        self.assertEqual(data['worlds'][0]['category_count'], 2)
+        # Players don't see hidden categories
+        self.assertEqual([category['id'] for category in data['categories']], [south.id])
+        self.assertEqual(data['removed_categories'], sorted([north_id, vault.id]))
+        
+        self.client.force_login(self.owner)
+        self.assertEqual(len(self.sync(cursor)['categories']), 2)
+    
+    def test_sync_removes_worlds_the_user_loses(self):
+        cursor = changes.latest_sequence()
+        self.assertTrue(self.client.post(reverse('core:leave_world', args=[self.world.id])).json()['success'])
+        data = self.sync(cursor)
+        self.assertEqual(data['worlds'], [])
+        self.assertEqual(data['removed_worlds'], [self.world.id])
+        
+        other = World.objects.create(name="Other", owner=self.owner)
+        WorldUser.objects.create(world=other, user=self.player, role='player')
+        cursor = changes.latest_sequence()
+        self.client.force_login(self.owner)
+        self.assertTrue(self.client.post(reverse('core:delete_world', args=[other.id])).json()['success'])
+        self.assertEqual(self.sync(cursor)['removed_worlds'], [other.id])
+        self.client.force_login(self.player)
+        self.assertEqual(self.sync(cursor)['removed_worlds'], [other.id])
+    
+    def test_sync_pages_and_rejects_bad_cursors(self):
+        cursor = changes.latest_sequence()
+        Category.objects.bulk_create([Category(world=self.world, name=f"Region {i}") for i in range(3)])
+        changes.record_many(changes.CATEGORY, changes.CREATE, [
+            (self.world.id, category.id, None) for category in Category.objects.filter(name__startswith="Region")
+        ])
+        access = WorldAccess(self.player)
+        first = changes.changes_since(access, cursor, page_size=2)
+        self.assertTrue(first['has_more'])
+        second = changes.changes_since(access, first['cursor'], page_size=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['categories']) + len(second['categories']), 3)
+        
+        for since in (None, 'soon', -1):
+            params = {} if since is None else {'since': since}
+            self.assertEqual(self.client.get(reverse('core:sync'), params).status_code, 400)
+    
+    def test_compaction_drops_superseded_and_expired_changes(self):
+        cursor = changes.latest_sequence()
+        for name in ("Far North", "High North"):
+            self.north.name = name
+            self.north.save()
+        self.assertEqual(changes.compact(), 2)
+        self.assertEqual(
+            list(WorldChange.objects.filter(kind=changes.CATEGORY).values_list('action', flat=True)),
+            [changes.UPDATE],
+        )
+        # A client behind the dropped entries still gets the category once
+        self.assertEqual([category['name'] for category in self.sync(cursor)['categories']], ["High North"])
+        
+        WorldChange.objects.update(created_at=timezone.now() - timedelta(days=changes.DEFAULT_RETENTION_DAYS + 1))
+        latest = changes.latest_sequence()
+        call_command('compact_change_log', batch_size=2, stdout=io.StringIO())
+        self.assertFalse(WorldChange.objects.exists())
+        self.assertEqual(changes.horizon(), latest)
+        self.assertTrue(self.sync(cursor)['reset'])
+        self.assertFalse(self.sync(latest)['reset'])
+    
+    def test_pages_rendered_after_full_compaction_sync(self):
+        WorldChange.objects.update(created_at=timezone.now() - timedelta(days=changes.DEFAULT_RETENTION_DAYS + 1))
+        changes.compact()
+        self.assertFalse(WorldChange.objects.exists())
+        self.assertEqual(changes.latest_sequence(), changes.horizon())
+        
+        response = self.client.get(reverse('core:dashboard'))
+        cursor = int(re.search(r'data-sync-cursor="(\d+)"', response.content.decode()).group(1))
+        self.assertEqual(cursor, changes.horizon())
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['cursor'], cursor)
+        
+        # A reset hands out a cursor that syncs too
+        reset = self.sync(0)
+        self.assertTrue(reset['reset'])
+        self.assertFalse(self.sync(reset['cursor'])['reset'])
+    
+    def test_bulk_writes_are_logged(self):
+        cursor = changes.latest_sequence()
+        south = Category.objects.create(world=self.world, name="South")
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('core:move_categories', args=[self.world.id]),
+            json.dumps({'moves': [{'id': south.id, 'before': self.north.id}]}), content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+        self.client.force_login(self.player)
+        ranks_by_id = {category['id']: category['rank'] for category in self.sync(cursor)['categories']}
+        self.assertLess(ranks_by_id[south.id], Category.objects.get(pk=self.north.id).rank)
+        
+        worlds = provision_worlds(self.owner, ["Table 1", "Table 2"])
+        self.assertEqual(
+            set(WorldChange.objects.filter(kind=changes.WORLD, action=changes.CREATE).values_list('world_id', flat=True)),
+            {self.world.id} | {world.id for world in worlds},
+        )
+
+
+class EntryTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Realm", owner=self.user)
+        self.category = Category.objects.create(world=self.world, name="Places")
+        self.client.force_login(self.user)
+    
+    def create_entry(self, **kwargs):
+        return Entry.objects.create(world=self.world, category=self.category, author=self.user, **kwargs)
+    
+    def test_content_is_stored_compressed_with_blobs_split_out(self):
+        src = 'data:image/png;base64,' + 'A' * documents.BLOB_THRESHOLD
+        document = image_document(src, text="A tavern by the river. " * 40)
+        entry = self.create_entry(title="Lantern", content=document)
+        
+        self.assertEqual(entry.plaintext.splitlines()[0], "The Drowned Lantern")
+        self.assertTrue(entry.summary.startswith("The Drowned Lantern A tavern by the river."))
+        self.assertTrue(entry.summary.endswith('…'))
+        self.assertLessEqual(len(entry.summary), documents.SUMMARY_LENGTH + 1)
+        self.assertEqual(len(documents.blob_digests(documents.load(entry.content_data))), 1)
+        self.assertLess(len(entry.content_data), entry.content_size)
+        self.assertEqual(EntryBlob.objects.get(entry=entry).data, src.encode())
+        
+        loaded = Entry.objects.get(pk=entry.pk)
+        self.assertEqual(loaded.get_deferred_fields(), {'content_data', 'plaintext'})
+        self.assertEqual(loaded.content, document)
+        
+        loaded.content = image_document('small')
+        loaded.save()
+        self.assertFalse(EntryBlob.objects.exists())
+        self.assertEqual(Entry.objects.get(pk=entry.pk).content, image_document('small'))
+    
+    def test_category_page_lists_entries_without_loading_documents(self):
+        for i in range(55):
+            self.create_entry(title=f"Entry {i:02d}", content=image_document('small', text=f"Summary {i}."))
+        self.create_entry(title="Secret", is_hidden=True, content=image_document('small'))
+        url = reverse('core:category_detail', args=[self.world.id, self.category.id])
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        content = response.content.decode()
+        self.assertIn("Summary 0.", content)
+        self.assertIn("Page 1 of 2", content)
+        self.assertNotIn("Secret", content)
+        entry_queries = [query['sql'] for query in queries if 'FROM "core_entry"' in query['sql']]
+        self.assertTrue(entry_queries)
+        for sql in entry_queries:
+            self.assertNotIn('content_data', sql)
+            self.assertNotIn('plaintext', sql)
+        
+        self.assertIn("Entry 54", self.client.get(url, {'page': 2}).content.decode())
+
+
+def mention_document(*targets):
+    return {'type': 'doc', 'content': [
+        {'type': 'paragraph', 'content': [
+            {'type': 'text', 'text': "See "},
+            {'type': 'mention', 'attrs': {'id': target.pk, 'label': target.title}},
+        ]}
+        for target in targets
+    ]}
+
+
+class CrossReferenceTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Realm", owner=self.user)
+        self.client.force_login(self.user)
+        self.a, self.b, self.c, self.d = [self.create_entry(name) for name in "ABCD"]
+    
+    def create_entry(self, title, world=None, **kwargs):
+        return Entry.objects.create(world=world or self.world, author=self.user, title=title, **kwargs)
+    
+    def edges(self):
+        return set(CrossReference.objects.values_list('source_entry__title', 'target_entry__title', 'reference_type'))
+    
+    def links(self, entry, **params):
+        return self.client.get(reverse('core:entry_links', args=[self.world.id, entry.id]), params)
+    
+    def test_saving_diffs_mentions_against_stored_edges(self):
+        elsewhere = self.create_entry("Elsewhere", world=World.objects.create(name="Other", owner=self.user))
+        CrossReference.objects.create(source_entry=self.a, target_entry=self.d, reference_type='related')
+        self.a.content = mention_document(self.b, self.c, self.d, self.a, elsewhere)
+        self.a.save()
+        self.assertEqual(self.edges(), {('A', 'B', 'mentions'), ('A', 'C', 'mentions'), ('A', 'D', 'related')})
+        self.assertEqual(CrossReference.objects.get(target_entry=self.b).context, "See @B")
+        
+        kept = CrossReference.objects.get(target_entry=self.b).pk
+        self.a.content = mention_document(self.b)
+        with CaptureQueriesContext(connection) as queries:
+            self.a.save()
+        self.assertEqual(self.edges(), {('A', 'B', 'mentions'), ('A', 'D', 'related')})
+        self.assertEqual(CrossReference.objects.get(target_entry=self.b).pk, kept)
+        writes = [query['sql'] for query in queries if 'core_crossreference' in query['sql'] and not query['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('DELETE'))
+    
+    def test_backlinks_and_neighborhood(self):
+        # A -> B -> C -> A, and C -> D with D hidden
+        self.d.is_hidden = True
+        self.d.save()
+        for source, targets in ((self.a, [self.b]), (self.b, [self.c]), (self.c, [self.a, self.d])):
+            source.content = mention_document(*targets)
+            source.save()
+        
+        data = self.links(self.a, hops=2, direction='out').json()
+        self.assertEqual([entry['title'] for entry in data['backlinks']], ['C'])
+        self.assertEqual(data['backlinks'][0]['reference_type'], 'mentions')
+        self.assertEqual([(entry['title'], entry['depth']) for entry in data['neighborhood']], [('B', 1), ('C', 2)])
+        
+        data = self.links(self.a, hops=1).json()
+        self.assertEqual([(entry['title'], entry['depth']) for entry in data['neighborhood']], [('B', 1), ('C', 1)])
+        data = self.links(self.c, hops=3, direction='in').json()
+        self.assertEqual([(entry['title'], entry['depth']) for entry in data['neighborhood']], [('B', 1), ('A', 2)])
+        
+        player = User.objects.create_user(username='player', email='player@example.com')
+        WorldUser.objects.create(world=self.world, user=player, role='player')
+        self.assertIn('D', [entry['title'] for entry in self.links(self.a, hops=3).json()['neighborhood']])
+        self.client.force_login(player)
+        self.assertNotIn('D', [entry['title'] for entry in self.links(self.a, hops=3).json()['neighborhood']])
+        self.assertEqual(self.links(self.d).status_code, 404)
+        self.assertEqual(self.links(self.a, hops=9).status_code, 400)
+        self.assertEqual(self.links(self.a, direction='sideways').status_code, 400)
+    
+    def test_reindex_rebuilds_edges_in_worker_processes(self):
+        self.a.content = mention_document(self.b, self.c)
+        self.a.save()
+        self.b.content = mention_document(self.c)
+        self.b.save()
+        expected = self.edges()
+        CrossReference.objects.all().delete()
+        CrossReference.objects.create(source_entry=self.c, target_entry=self.d, context="stale")
+        
+        self.assertEqual(reindex_world(self.world.id, workers=2, batch_size=1), (3, 0, 1))
+        self.assertEqual(self.edges(), expected)
+        self.assertEqual(reindex_world(self.world.id, workers=1), (0, 0, 0))
+
+
+class FakeSocket:
+    """Drives an ASGI WebSocket application from a test"""
+    
+    def __init__(self, app, path, cookie=None, origin=b'http://testserver'):
+        headers = [(b'host', b'testserver')]
+        if origin:
+            headers.append((b'origin', origin))
+        if cookie:
+            headers.append((b'cookie', f'sessionid={cookie}'.encode()))
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': path, 'headers': headers}
+        self.task = asyncio.ensure_future(app(scope, self.incoming.get, self.outgoing.put))
+    
+    async def receive(self):
+        """The next message sent to the client, skipping the accept"""
+        while True:
+            event = await asyncio.wait_for(self.outgoing.get(), 2)
+            if event['type'] == 'websocket.close':
+                return event
+            if event['type'] == 'websocket.send':
+                return json.loads(event['text'])
+    
+    def send(self, **message):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+    
+    async def disconnect(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 2)
+
+
+class CollabTests(TestCase):
+    
+    def setUp(self):
+        self.dm = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Realm", owner=self.dm)
+        self.entry = Entry.objects.create(world=self.world, author=self.dm, title="Session notes", content={'type': 'doc', 'content': []})
+        self.cookies = {'dm': self.login(self.dm)}
+        for username, role in (('writer', 'co_creator'), ('player', 'player'), ('stranger', None)):
+            user = User.objects.create_user(username=username, email=f'{username}@example.com')
+            if role:
+                WorldUser.objects.create(world=self.world, user=user, role=role)
+            self.cookies[username] = self.login(user)
+        self.path = f'/ws/entries/{self.entry.id}/'
+    
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.cookies['sessionid'].value
+    
+    def connect(self, app, username, **kwargs):
+        return FakeSocket(app, self.path, self.cookies.get(username), **kwargs)
+    
+    async def test_steps_are_broadcast_once_per_tick(self):
+        app = CollabApplication(Hub(LocalBroker(), tick=0.05))
+        dm, writer, player = [self.connect(app, name) for name in ('dm', 'writer', 'player')]
+        inits = [await socket.receive() for socket in (dm, writer, player)]
+        self.assertEqual([init['canEdit'] for init in inits], [True, True, False])
+        self.assertEqual({init['version'] for init in inits}, {0})
+        # A quiet document flushes at once, so make it busy first
+        dm.send(type='presence', selection=None)
+        for socket in (dm, writer, player):
+            self.assertEqual((await socket.receive())['type'], 'presence')
+        
+        dm.send(type='steps', version=0, steps=[{'stepType': 'replace', 'n': 1}])
+        writer.send(type='steps', version=1, steps=[{'stepType': 'replace', 'n': 2}, {'stepType': 'replace', 'n': 3}])
+        writer.send(type='presence', selection={'anchor': 3, 'head': 3})
+        message = await player.receive()
+        self.assertEqual(message['type'], 'steps')
+        self.assertEqual(message['version'], 0)
+        self.assertEqual([step['n'] for step in message['steps']], [1, 2, 3])
+        self.assertEqual(message['clientIDs'], [inits[0]['clientID']] + [inits[1]['clientID']] * 2)
+        self.assertEqual(await player.receive(), {'type': 'presence', 'clients': {str(inits[1]['clientID']): {'anchor': 3, 'head': 3}}})
+        
+        dm.send(type='steps', version=1, steps=[{'stepType': 'replace', 'n': 4}])
+        self.assertEqual((await dm.receive())['steps'][0]['n'], 1)
+        self.assertEqual((await dm.receive())['type'], 'presence')
+        self.assertEqual(await dm.receive(), {'type': 'conflict', 'version': 3})
+        player.send(type='steps', version=3, steps=[{'stepType': 'replace'}])
+        self.assertEqual(await player.receive(), {'type': 'error', 'error': 'You can only view this entry.'})
+        
+        snapshot = {'type': 'doc', 'content': [{'type': 'paragraph', 'content': [{'type': 'text', 'text': "Typed together"}]}]}
+        dm.send(type='snapshot', version=3, doc=snapshot)
+        await writer.receive()
+        await writer.receive()
+        late = self.connect(app, 'writer')
+        init = await late.receive()
+        self.assertEqual((init['doc'], init['version'], init['steps']), (snapshot, 3, []))
+        for socket in (dm, writer, player, late):
+            await socket.disconnect()
+        entry = await Entry.objects.with_content().aget(pk=self.entry.pk)
+        self.assertEqual(entry.content, snapshot)
+        self.assertEqual(entry.summary, "Typed together")
+    
+    async def test_sockets_outside_the_world_are_refused(self):
+        app = CollabApplication(Hub(LocalBroker()))
+        refused = [
+            self.connect(app, 'stranger'),
+            self.connect(app, None),
+            self.connect(app, 'dm', origin=b'https://evil.example'),
+            FakeSocket(app, '/ws/entries/0/', self.cookies['dm']),
+        ]
+        for socket in refused:
+            self.assertEqual(await socket.receive(), {'type': 'websocket.close', 'code': 4403})
+        
+        self.entry.is_hidden = True
+        await self.entry.asave(update_fields=['is_hidden'])
+        self.assertEqual(await self.connect(app, 'player').receive(), {'type': 'websocket.close', 'code': 4403})
+        writer = self.connect(app, 'writer')
+        self.assertEqual((await writer.receive())['type'], 'init')
+        await writer.disconnect()
+    
+    async def test_revoked_access_applies_to_open_sockets(self):
+        app = CollabApplication(Hub(LocalBroker()))
+        writer = self.connect(app, 'writer')
+        await writer.receive()
+        membership = await WorldUser.objects.aget(world=self.world, user__username='writer')
+        membership.role = 'player'
+        await membership.asave(update_fields=['role'])
+        writer.send(type='steps', version=0, steps=[{'stepType': 'replace'}])
+        self.assertEqual(await writer.receive(), {'type': 'error', 'error': 'You can only view this entry.'})
+        
+        await membership.adelete()
+        writer.send(type='presence', selection=None)
+        self.assertEqual(await writer.receive(), {'type': 'websocket.close', 'code': 4403})
+        await writer.disconnect()
+    
+    async def test_socket_broker_shares_a_document_between_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'collab.sock')
+            server = BrokerServer(path)
+            await server.start()
+            first, second = [CollabApplication(Hub(SocketBroker(path), tick=0.01)) for _ in range(2)]
+            dm, writer = self.connect(first, 'dm'), self.connect(second, 'writer')
+            # Client IDs come from the broker, so workers never hand out the same one
+            self.assertNotEqual((await dm.receive())['clientID'], (await writer.receive())['clientID'])
+            
+            writer.send(type='steps', version=0, steps=[{'stepType': 'replace', 'n': 1}])
+            message = await dm.receive()
+            self.assertEqual((message['version'], message['steps']), (0, [{'stepType': 'replace', 'n': 1}]))
+            dm.send(type='steps', version=0, steps=[{'stepType': 'replace', 'n': 2}])
+            self.assertEqual(await dm.receive(), {'type': 'conflict', 'version': 1})
+            
+            await dm.disconnect()
+            await writer.disconnect()
+            await server.close()
+
+
+class MediaTests(TestCase):
+    
+    def setUp(self):
+        # Stored files outlive the test transaction, so each test gets its own root
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        # User ids are reused across tests, so drop membership maps cached by earlier ones
+        caches['default'].clear()
+        self.dm = User.objects.create_user(username='dm', email='dm@example.com')
+        self.player = User.objects.create_user(username='player', email='player@example.com')
+        self.world = World.objects.create(name="Realm", owner=self.dm)
+        self.other_world = World.objects.create(name="Sequel", owner=self.dm)
+        WorldUser.objects.create(world=self.world, user=self.player, role='player')
+        self.client.force_login(self.dm)
+        self.data = bytes(range(256)) * 40
+    
+    def upload(self, world, data=None, name='map.png', **fields):
+        return self.client.post(reverse('core:upload_media', args=[world.id]), {
+            'file': SimpleUploadedFile(name, self.data if data is None else data), **fields,
+        })
+    
+    def stored_files(self):
+        return [name for _, _, names in os.walk(media.blob_root()) for name in names]
+    
+    def test_uploads_are_stored_once_per_digest(self):
+        first = self.upload(self.world).json()
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(
+            (first['media']['digest'], first['media']['size'], first['media']['mime_type'], first['deduplicated']),
+            (digest, len(self.data), 'image/png', False),
+        )
+        entry = Entry.objects.create(world=self.other_world, author=self.dm, title="Coast")
+        second = self.upload(self.other_world, name='../coast map.png', entry_id=entry.id).json()
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(second['media']['filename'], 'coast_map.png')
+        self.assertEqual(second['media']['entry_id'], entry.id)
+        
+        self.assertEqual(MediaFile.objects.get().ref_count, 2)
+        self.assertEqual(self.stored_files(), [digest])
+        with open(media.blob_path(digest), 'rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(os.listdir(media.upload_root()), [])
+    
+    def test_uploads_are_limited_to_authors_and_size(self):
+        self.assertEqual(self.upload(self.world, entry_id=999).status_code, 400)
+        self.assertEqual(self.client.post(reverse('core:upload_media', args=[self.world.id])).status_code, 400)
+        with self.settings(MEDIA_MAX_UPLOAD_SIZE=1000):
+            self.assertEqual(self.upload(self.world).status_code, 413)
+        self.client.force_login(self.player)
+        self.assertEqual(self.upload(self.world).status_code, 404)
+        self.assertFalse(Media.objects.exists())
+        self.assertEqual(os.listdir(media.upload_root()), [])
+    
+    def test_serving_honors_ranges_and_conditions(self):
+        url = self.upload(self.world).json()['media']['url']
+        hidden_entry = Entry.objects.create(world=self.world, author=self.dm, title="Secret", is_hidden=True)
+        hidden_url = self.upload(self.world, data=b"secret", name='notes.txt', entry_id=hidden_entry.id).json()['media']['url']
+        self.client.force_login(self.player)
+        
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{hashlib.sha256(self.data).hexdigest()}"')
+        self.assertEqual((response['Accept-Ranges'], response['Content-Length']), ('bytes', str(len(self.data))))
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        
+        response = self.client.get(url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+        response = self.client.get(url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+        response = self.client.get(url, headers={'Range': f'bytes={len(self.data)}-'})
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.data)}'))
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'}).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag}).status_code, 206)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        
+        self.assertEqual(self.client.get(hidden_url).status_code, 404)
+        self.client.force_login(User.objects.create_user(username='stranger', email='stranger@example.com'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+    
+    def test_unused_files_are_collected(self):
+        first = self.upload(self.world).json()['media']
+        self.upload(self.other_world)
+        self.upload(self.world, data=b"only here", name='notes.txt')
+        
+        response = self.client.post(reverse('core:delete_media', args=[self.world.id, first['id']]))
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(media.collect_garbage(), (0, 0))
+        self.assertEqual(MediaFile.objects.get(pk=first['digest']).ref_count, 1)
+        
+        # Purging a world releases its media without signals
+        self.world.is_active = False
+        self.world.deleted_at = self.world.created_at
+        self.world.save()
+        self.assertEqual(purge_deleted_worlds(batch_size=1), [self.world.id])
+        self.assertEqual(list(MediaFile.objects.values_list('pk', 'ref_count')), [(first['digest'], 1)])
+        self.assertEqual(self.stored_files(), [first['digest']])
+        
+        # Leftovers of rolled-back stores and abandoned uploads go once old enough
+        orphan = media.blob_path('ab' * 32)
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, 'wb') as file:
+            file.write(b"orphan")
+        abandoned = os.path.join(media.upload_root(), 'upload-abandoned')
+        open(abandoned, 'wb').close()
+        self.assertEqual(media.collect_garbage(), (0, 0))
+        stale = time.time() - media.ORPHAN_GRACE_SECONDS - 60
+        for path in (orphan, abandoned):
+            os.utime(path, (stale, stale))
+        self.assertEqual(media.collect_garbage(), (1, 6))
+        self.assertEqual(self.stored_files(), [first['digest']])
+        self.assertFalse(os.path.exists(abandoned))
+
+
+class FragmentCacheTests(TestCase):
+    
+    def setUp(self):
+        caches[fragments.CACHE_ALIAS].clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.worlds = [World.objects.create(name=f"World {i}", owner=self.user) for i in range(3)]
+        self.client.force_login(self.user)
+    
+    def dashboard(self):
+        response = self.client.get(reverse('core:dashboard'))
+        return response.content.decode(), response['Server-Timing']
+    
+    def test_unchanged_cards_are_served_from_cache(self):
+        _, timing = self.dashboard()
+        self.assertIn('frag;desc="0 hits, 3 misses"', timing)
+        _, timing = self.dashboard()
+        self.assertIn('frag;desc="3 hits, 0 misses"', timing)
+        self.assertEqual(metrics.FRAGMENT_LOOKUPS.value('world_card', 'hit'), 3)
+        self.assertEqual(metrics.FRAGMENT_LOOKUPS.value('world_card', 'miss'), 3)
+    
+    def test_saves_counters_and_owner_renames_refresh_their_cards(self):
+        self.dashboard()
+        world = self.worlds[0]
+        world.name = "Renamed"
+        world.save()
+        content, timing = self.dashboard()
+        self.assertIn("Renamed", content)
+        self.assertIn('frag;desc="2 hits, 1 misses"', timing)
+        
+        Category.objects.create(world=world, name="Regions")
+        content, _ = self.dashboard()
+        self.assertIn("1 category", content)
+        
+        self.user.username = 'dungeon_master'
+        self.user.save(update_fields=['username'])
+        content, timing = self.dashboard()
+        self.assertIn('dungeon_master', content)
+        self.assertIn('frag;desc="0 hits, 3 misses"', timing)
+    
+    def test_category_cards_follow_category_edits(self):
+        world = self.worlds[0]
+        category = Category.objects.create(world=world, name="Regions")
+        url = reverse('core:world_detail', args=[world.id])
+        self.client.get(url)
+        category.name = "Realms"
+        category.save()
+        self.assertIn("Realms", self.client.get(url).content.decode())
+
+
+class StaticAssetTests(SimpleTestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+    
+    def test_minifiers_keep_semantics(self):
+        source = (
+            "var a = 1 // one\n"
+            "++a\n"
+            "let re = /a\\/[/]/g, s = `x ${a + `${'//'}`} y`\n"
+            "/* block */ return a / 2\n"
+        )
+        self.assertEqual(
+            assets.minify_js(source),
+            "var a=1\n++a\nlet re=/a\\/[/]/g,s=`x ${a+`${'//'}`} y`\nreturn a/2\n",
+        )
+        self.assertEqual(
+            assets.minify_css("a :hover , b > c { color: red ; /* x */ font: 'A  B' ; }\n"),
+            "a :hover,b>c{color:red;font:'A  B'}\n",
+        )
+    
+    def test_templates_reference_hashed_names(self):
+        self.assertRegex(static('js/script.js'), r'^/static/js/script\.[0-9a-f]{12}\.js$')
+        self.assertIn(static('css/styles.css'), self.client.get(reverse('core:landing')).content.decode())
+    
+    def test_hashed_assets_are_precompressed_and_immutable(self):
+        url = static('js/script.js')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        minified = gzip.decompress(b''.join(response.streaming_content))
+        
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content), minified)
+        
+        cached = self.client.get(url, headers={'If-None-Match': plain['ETag']})
+        self.assertEqual(cached.status_code, 304)
+    
+    def test_unhashed_and_missing_assets(self):
+        self.assertEqual(self.client.get('/static/js/script.js')['Cache-Control'], assets.REVALIDATE_CACHE_CONTROL)
+        self.assertEqual(self.client.get('/static/js/missing.js').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+
+class ParticleModuleTests(TestCase):
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='dm', email='dm@example.com')
+        self.world = World.objects.create(name="Realm", owner=self.user)
+        self.client.force_login(self.user)
+    
+    def test_detail_pages_load_the_shared_particle_module(self):
+        category = Category.objects.create(world=self.world, name="Regions")
+        for url in (
+            reverse('core:world_detail', args=[self.world.id]),
+            reverse('core:category_detail', args=[self.world.id, category.id]),
+        ):
+            content = self.client.get(url).content.decode()
+            self.assertIn(static('js/particles.js'), content)
+            self.assertNotIn('handleCollision', content)
@@ -0,0 +1,319 @@
+"""
+Moving worlds between instances as JSON Lines.
+
+An export is one JSON object per line: a ``world`` header first, then every
+``category`` ordered by depth so each parent comes before its children,
+then every ``member`` by username. ``export_world()`` and its async
+counterpart stream the lines from server-side cursors, reading categories
+through an index in that order, so memory stays flat however large the
+world is. Version 1 exports, which ordered siblings by an integer
+``sort_order`` rather than a ``rank``, can still be imported.
+
+``import_world()`` rebuilds a world from those lines in a single
+transaction. Categories are written in batches by multi-row ``INSERT``
+statements, which skip the per-object work of ``bulk_create`` that would
+otherwise dominate a large import. New ids are handed out up front, past
+the table's AUTOINCREMENT sequence, so each row goes in with its final path
+and a parent never has to wait for its batch to be written: the statement
+count follows the number of categories, not the depth of the tree. Members are
+matched to existing users by username and bulk created; the rest are
+reported as missing. Bulk writes send no signals, so counters, caches, the
+change log and the search index are updated here. The world's own creation
+is logged, but not each imported category: no client has seen the world yet.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import access, changes, fragments, ranks, search
+from .models import World, WorldUser, Category
+
+
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = {1, 2}
+
+# Rows per server-side fetch and lines per yielded chunk
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+DEFAULT_MAX_IMPORT_SIZE = 256 * 1024 * 1024
+
+CATEGORY_FIELDS = ('id', 'parent_id', 'name', 'description', 'rank', 'is_hidden')
+# Columns of the raw INSERT the import writes categories with
+CATEGORY_COLUMNS = (
+    'id', 'world_id', 'parent_id', 'name', 'description', 'rank', 'is_hidden',
+    'path', 'depth', 'created_at', 'updated_at',
+)
+MEMBER_ROLES = {role for role, _ in WorldUser.ROLE_CHOICES}
+
+
+def max_import_size():
+    return getattr(settings, 'WORLD_IMPORT_MAX_SIZE', DEFAULT_MAX_IMPORT_SIZE)
+
+
+class WorldImportError(ValueError):
+    """The lines aren't a world export this instance can import"""
+
+
+def _encode(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def _world_record(world):
+    return {
+        'type': 'world',
+        'version': FORMAT_VERSION,
+        'name': world.name,
+        'description': world.description,
+        'theme_color': world.theme_color,
+        'owner': world.owner.username,
+    }
+
+
+def _category_record(row):
+    category_id, parent_id, name, description, rank, is_hidden = row
+    return {
+        'type': 'category', 'id': category_id, 'parent': parent_id, 'name': name,
+        'description': description, 'rank': rank, 'is_hidden': is_hidden,
+    }
+
+
+def _member_record(row):
+    username, role = row
+    return {'type': 'member', 'username': username, 'role': role}
+
+
+def _sections(world):
+    """(queryset, record) for each kind of row, in export order"""
+    return [
+        (
+            Category.objects.filter(world_id=world.pk).order_by('depth', 'path').values_list(*CATEGORY_FIELDS),
+            _category_record,
+        ),
+        (
+            WorldUser.objects.filter(world_id=world.pk).order_by('pk').values_list('user__username', 'role'),
+            _member_record,
+        ),
+    ]
+
+
+def export_world(world):
+    """Yield ``world`` (with its owner loaded) as JSON Lines, several lines per chunk"""
+    yield _encode(_world_record(world))
+    for queryset, record in _sections(world):
+        lines = []
+        for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            lines.append(_encode(record(row)))
+            if len(lines) == EXPORT_CHUNK_SIZE:
+                yield b''.join(lines)
+                lines = []
+        if lines:
+            yield b''.join(lines)
+
+
+async def aexport_world(world):
+    """
+    Async counterpart of export_world() for streaming responses under ASGI.
+    Each chunk is read on the thread the ORM's sync calls run on, so the
+    cursor stays on one connection.
+    """
+    chunks = export_world(world)
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def _records(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise WorldImportError(f"Line {number} is not valid JSON.")
+        if not isinstance(record, dict):
+            raise WorldImportError(f"Line {number} is not a JSON object.")
+        yield number, record
+
+
+def import_world(lines, owner=None, name=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create a world from the JSON Lines of an export, owned by ``owner`` (by
+    default the user with the exported owner's username) and optionally
+    renamed. Returns (world, categories imported, members imported,
+    usernames of members with no account here).
+    """
+    try:
+        with transaction.atomic():
+            return _WorldImport(owner, batch_size).run(_records(lines), name)
+    except IntegrityError:
+        raise WorldImportError("Two categories with the same parent have the same name.")
+
+
+class _WorldImport:
+    
+    def __init__(self, owner, batch_size):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.version = None
+        # Exported category id -> (new id, new path)
+        self.categories = {}
+        self.pending = []
+        self.next_id = None
+        self.members = []
+        self.usernames = set()
+        self.member_count = 0
+        self.member_ids = []
+        self.missing = []
+        self.now = connection.ops.adapt_datetimefield_value(timezone.now())
+    
+    def run(self, records, name):
+        self.world = self.create_world(next(records, (None, None)), name)
+        for number, record in records:
+            kind = record.get('type')
+            try:
+                if kind == 'category':
+                    self.add_category(number, record)
+                elif kind == 'member':
+                    self.add_member(number, record)
+                else:
+                    raise WorldImportError(f"Line {number} has an unknown type {kind!r}.")
+            except WorldImportError:
+                raise
+            except (KeyError, TypeError, ValueError):
+                raise WorldImportError(f"Line {number} is missing a field or has one of the wrong type.")
+        self.flush_categories()
+        self.flush_members()
+        self.finish()
+        return self.world, len(self.categories), self.member_count, self.missing
+    
+    def create_world(self, first, name):
+        _, header = first
+        if header is None or header.get('type') != 'world':
+            raise WorldImportError("The export must start with a world line.")
+        self.version = header.get('version')
+        if self.version not in SUPPORTED_VERSIONS:
+            raise WorldImportError(f"Unsupported export version {header.get('version')!r}.")
+        if self.owner is None:
+            self.owner = get_user_model().objects.filter(username=header.get('owner')).first()
+            if self.owner is None:
+                raise WorldImportError(f"There is no user named {header.get('owner')!r} to own the world.")
+        name = name or header.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise WorldImportError("The world line has no name.")
+        return World.objects.create(
+            name=name.strip()[:255],
+            description=header.get('description') or '',
+            theme_color=header.get('theme_color') or World._meta.get_field('theme_color').default,
+            owner=self.owner,
+        )
+    
+    def add_category(self, number, record):
+        exported_id, parent = record['id'], record.get('parent')
+        if exported_id in self.categories:
+            raise WorldImportError(f"Line {number} repeats category {exported_id}.")
+        if parent is None:
+            parent_id, parent_path = None, ''
+        elif parent in self.categories:
+            parent_id, parent_path = self.categories[parent]
+        else:
+            raise WorldImportError(f"Line {number}: category {exported_id} comes before its parent {parent}.")
+        new_id = self.allocate_id()
+        path = parent_path + Category.path_segment(new_id)
+        self.pending.append((
+            new_id,
+            self.world.pk,
+            parent_id,
+            str(record['name'])[:255],
+            str(record.get('description') or ''),
+            self.rank(number, record),
+            bool(record.get('is_hidden')),
+            path,
+            len(parent_path) // Category.PATH_STEP,
+            self.now,
+            self.now,
+        ))
+        self.categories[exported_id] = (new_id, path)
+        if len(self.pending) >= self.batch_size:
+            self.flush_categories()
+    
+    def allocate_id(self):
+        if self.next_id is None:
+            # Creating the world took the database's write lock, so nothing
+            # else can insert a category until this import commits
+            table = Category._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = %s), 0), "
+                    f"coalesce((SELECT max(id) FROM {table}), 0))",
+                    [table],
+                )
+                self.next_id = cursor.fetchone()[0]
+        self.next_id += 1
+        return self.next_id
+    
+    def rank(self, number, record):
+        if self.version == 1:
+            return ranks.for_integer(record.get('sort_order') or 0)
+        if not ranks.is_valid(record['rank']):
+            raise WorldImportError(f"Line {number} has an invalid rank {record['rank']!r}.")
+        return record['rank']
+    
+    def flush_categories(self):
+        if not self.pending:
+            return
+        placeholders = '(' + ', '.join(['%s'] * len(CATEGORY_COLUMNS)) + ')'
+        sql = (
+            f"INSERT INTO {Category._meta.db_table} ({', '.join(CATEGORY_COLUMNS)}) "
+            f"VALUES {', '.join([placeholders] * len(self.pending))}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in self.pending for value in row])
+        self.pending = []
+    
+    def add_member(self, number, record):
+        username, role = record['username'], record['role']
+        if role not in MEMBER_ROLES:
+            raise WorldImportError(f"Line {number} has an unknown role {role!r}.")
+        if username in self.usernames:
+            raise WorldImportError(f"Line {number} repeats member {username!r}.")
+        self.usernames.add(username)
+        self.members.append((username, role))
+        if len(self.members) >= self.batch_size:
+            self.flush_members()
+    
+    def flush_members(self):
+        if not self.members:
+            return
+        user_ids = dict(
+            get_user_model().objects.filter(username__in=[username for username, _ in self.members])
+            .values_list('username', 'pk')
+        )
+        memberships = []
+        for username, role in self.members:
+            user_id = user_ids.get(username)
+            if user_id is None:
+                self.missing.append(username)
+            elif user_id != self.owner.pk:
+                memberships.append(WorldUser(world=self.world, user_id=user_id, role=role))
+        WorldUser.objects.bulk_create(memberships)
+        changes.record_many(changes.MEMBERSHIP, changes.CREATE, [
+            (self.world.pk, membership.pk, membership.user_id) for membership in memberships
+        ])
+        self.member_count += len(memberships)
+        self.member_ids.extend(membership.user_id for membership in memberships)
+        self.members = []
+    
+    def finish(self):
+        World.objects.filter(pk=self.world.pk).update(
+            category_count=len(self.categories), member_count=self.member_count,
+        )
+        fragments.bump(World, self.world.pk)
+        access.invalidate(*self.member_ids)
+        if search.is_available():
+            search.index_world_categories(self.world.pk)
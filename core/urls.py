@@ -13,6 +13,7 @@ urlpatterns = [
     path('worlds/', views.world_list, name='world_list'),
     path('worlds/<int:world_id>/', views.world_detail, name='world_detail'),
     path('worlds/<int:world_id>/categories/<int:category_id>/', views.category_detail, name='category_detail'),
+    path('worlds/<int:world_id>/media/<int:media_id>/', views.media_file, name='media_file'),
     
     # API URLs
     path('api/worlds/', views.api_worlds, name='api_worlds'),
@@ -20,4 +21,14 @@ urlpatterns = [
     path('api/create-world/', views.create_world, name='create_world'),
     path('api/worlds/<int:world_id>/delete/', views.delete_world, name='delete_world'),
     path('api/worlds/<int:world_id>/leave/', views.leave_world, name='leave_world'),
+    path('api/worlds/<int:world_id>/export/', views.export_world, name='export_world'),
+    path('api/worlds/import/', views.import_world, name='import_world'),
+    path('api/worlds/<int:world_id>/categories/move/', views.move_categories, name='move_categories'),
+    path('api/sync/', views.sync, name='sync'),
+    path('api/worlds/<int:world_id>/entries/<int:entry_id>/links/', views.api_entry_links, name='entry_links'),
+    path('api/worlds/<int:world_id>/media/', views.upload_media, name='upload_media'),
+    path('api/worlds/<int:world_id>/media/<int:media_id>/delete/', views.delete_media, name='delete_media'),
+    
+    # Monitoring
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,40 +1,78 @@
+import base64
+import json
+import shutil
+import tempfile
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db import models
-from .models import World, WorldUser, Category
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .models import World, WorldUser, Category, Entry, Media
+from .access import WorldAccess
+from .deletion import soft_delete_world
+from .db_routers import read_only
+from . import changes
+from . import media as media_store
+from . import metrics as request_metrics
+from . import references
+from . import reordering
+from . import search as search_index
+from . import transfer
 
 
 # Create your views here.
 
+@read_only
 @login_required
 def dashboard(request):
     """Dashboard page view that displays the campaign/world cards"""
-    # Get worlds where user is owner or member
-    owned_worlds = World.objects.filter(owner=request.user)
-    member_worlds = World.objects.filter(world_users__user=request.user).exclude(owner=request.user)
+    # Read before the cards, so the page's script syncs anything newer
+    sync_cursor = changes.latest_sequence()
+    # Owned worlds first, then worlds the user is a member of
+    worlds = sorted(
+        World.objects.for_dashboard(request.user),
+        key=lambda world: world.role != 'owner',
+    )
     
     context = {
         'user': request.user,
-        'owned_worlds': owned_worlds,
-        'member_worlds': member_worlds,
+        'worlds': worlds,
+        'sync_cursor': sync_cursor,
     }
     return render(request, 'dashboard.html', context)
 
+@read_only
 @login_required
-def search(request):
-    """API endpoint for search functionality"""
+async def search(request):
+    """API endpoint for full-text search over the user's worlds and categories"""
     if request.method == 'GET':
         search_term = request.GET.get('q', '')
-        # For now, return empty results - this can be expanded later
-        # to search through actual database content
+        try:
+            page = int(request.GET.get('page', 1))
+            page_size = int(request.GET.get('page_size', search_index.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid page parameters'}, status=400)
+        
+        access = await WorldAccess.afor_request(request)
+        # The FTS query uses a raw cursor, which has no async API
+        results, has_next = await sync_to_async(search_index.search)(access, search_term, page, page_size)
         return JsonResponse({
-            'results': [],
-            'search_term': search_term
+            'results': results,
+            'search_term': search_term,
+            'page': page,
+            'has_next': has_next,
         })
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
+@read_only
 def landing(request):
     """Landing page for all users"""
     context = {
@@ -43,12 +81,14 @@ def landing(request):
     return render(request, 'landing.html', context)
 
 
+@read_only
 @login_required
 def world_list(request):
     """List all worlds the user has access to"""
     # Get worlds where user is owner or member
-    owned_worlds = World.objects.filter(owner=request.user)
-    member_worlds = World.objects.filter(world_users__user=request.user).exclude(owner=request.user)
+    worlds = World.objects.for_dashboard(request.user)
+    owned_worlds = [world for world in worlds if world.role == 'owner']
+    member_worlds = [world for world in worlds if world.role != 'owner']
     
     context = {
         'owned_worlds': owned_worlds,
@@ -57,15 +97,16 @@ def world_list(request):
     return render(request, 'core/world_list.html', context)
 
 
+@read_only
 @login_required
 def world_detail(request, world_id):
     """Show world details and categories"""
-    world = get_object_or_404(World, id=world_id)
+    world = get_object_or_404(World.objects.select_related('owner'), id=world_id, is_active=True)
     
     # Check if user has access to this world
-    if not world.world_users.filter(user=request.user).exists() and world.owner != request.user:
+    if not WorldAccess.for_request(request).can_view(world.id):
         messages.error(request, "You don't have access to this world.")
-        return redirect('world_list')
+        return redirect('core:world_list')
     
     # Get root categories (no parent)
     root_categories = world.categories.filter(parent=None, is_hidden=False)
@@ -73,60 +114,103 @@ def world_detail(request, world_id):
     context = {
         'world': world,
         'root_categories': root_categories,
+        'sync_cursor': changes.latest_sequence(),
     }
     return render(request, 'core/world_detail.html', context)
 
 
+ENTRY_PAGE_SIZE = 50
+
+
+@read_only
 @login_required
 def category_detail(request, world_id, category_id):
     """Show category details and its contents"""
-    world = get_object_or_404(World, id=world_id)
+    world = get_object_or_404(World, id=world_id, is_active=True)
     category = get_object_or_404(Category, id=category_id, world=world)
     
     # Check if user has access to this world
-    if not world.world_users.filter(user=request.user).exists() and world.owner != request.user:
+    access = WorldAccess.for_request(request)
+    if not access.can_view(world.id):
         messages.error(request, "You don't have access to this world.")
-        return redirect('world_list')
+        return redirect('core:world_list')
     
     # Check if category is hidden and user is not author
-    if category.is_hidden and not world.world_users.filter(user=request.user, role__in=['creator', 'co_creator']).exists():
+    if category.is_hidden and not access.can_see_hidden(world.id):
         messages.error(request, "This category is hidden from you.")
-        return redirect('world_detail', world_id=world_id)
+        return redirect('core:world_detail', world_id=world_id)
     
-    # Get subcategories and entries (we'll add entries later)
     subcategories = category.subcategories.filter(is_hidden=False)
     
+    # Listing columns only: documents stay in the database until opened
+    entries = category.entries.filter(is_hidden=False).for_listing()
+    entry_page = Paginator(entries, ENTRY_PAGE_SIZE).get_page(request.GET.get('page'))
+    
     context = {
         'world': world,
         'category': category,
         'subcategories': subcategories,
+        'entry_page': entry_page,
         'ancestors': category.get_ancestors(),
     }
     return render(request, 'core/category_detail.html', context)
 
 
 # API views for AJAX requests
+API_WORLD_FIELDS = (
+    'id', 'name', 'description', 'is_owner', 'join_code', 'theme_color',
+    'is_active', 'member_count', 'category_count', 'created_at',
+)
+API_WORLD_DEFAULT_FIELDS = ('id', 'name', 'description', 'is_owner', 'join_code')
+API_WORLD_PAGE_SIZE = 50
+API_WORLD_MAX_PAGE_SIZE = 200
+
+
+def encode_world_cursor(world):
+    """Opaque cursor for the (created_at, id) of the last world on a page"""
+    raw = json.dumps([world['created_at'].isoformat(), world['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_world_cursor(cursor):
+    created_at, world_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), int(world_id)
+
+
+@read_only
 @login_required
-def api_worlds(request):
-    """API endpoint to get user's worlds"""
-    worlds = World.objects.filter(
-        models.Q(owner=request.user) | 
-        models.Q(world_users__user=request.user)
-    ).distinct()
+async def api_worlds(request):
+    """
+    API endpoint to get user's worlds, newest first.
     
-    data = [{
-        'id': world.id,
-        'name': world.name,
-        'description': world.description,
-        'is_owner': world.owner == request.user,
-        'join_code': world.join_code,
-    } for world in worlds]
+    Supports keyset pagination (``cursor``/``limit``) and a comma-separated
+    ``fields`` selection so callers only pay for the columns they use.
+    """
+    fields = request.GET.get('fields')
+    fields = [field.strip() for field in fields.split(',')] if fields else list(API_WORLD_DEFAULT_FIELDS)
+    unknown = set(fields) - set(API_WORLD_FIELDS)
+    if unknown:
+        return JsonResponse({'error': f'Unknown fields: {", ".join(sorted(unknown))}'}, status=400)
     
-    return JsonResponse({'worlds': data})
+    try:
+        limit = min(max(int(request.GET.get('limit', API_WORLD_PAGE_SIZE)), 1), API_WORLD_MAX_PAGE_SIZE)
+        cursor = request.GET.get('cursor')
+        after = decode_world_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    
+    # Fetch one extra row to know whether there is a next page
+    user = await request.auser()
+    rows = [row async for row in World.objects.page_for_user(user, fields, after, limit + 1)]
+    next_cursor = encode_world_cursor(rows[limit - 1]) if len(rows) > limit else None
+    
+    data = [{field: row[field] for field in fields} for row in rows[:limit]]
+    
+    return JsonResponse({'worlds': data, 'next_cursor': next_cursor})
 
 
 @login_required
-def join_world(request):
+async def join_world(request):
     """API endpoint to join a world using join code"""
     if request.method == 'POST':
         join_code = request.POST.get('join_code', '').strip().upper()
@@ -139,25 +223,26 @@ def join_world(request):
         
         try:
             # Find world by join code
-            world = World.objects.get(join_code=join_code, is_active=True)
+            world = await World.objects.aget(join_code=join_code, is_active=True)
             
             # Check if user is already a member
-            if world.owner == request.user:
+            access = await WorldAccess.afor_request(request)
+            if access.is_owner(world.id):
                 return JsonResponse({
                     'success': False,
                     'error': 'You are already the owner of this world.'
                 }, status=400)
             
-            if world.world_users.filter(user=request.user).exists():
+            if access.is_member(world.id):
                 return JsonResponse({
                     'success': False,
                     'error': 'You are already a member of this world.'
                 }, status=400)
             
             # Add user to world as a player
-            WorldUser.objects.create(
+            await WorldUser.objects.acreate(
                 world=world,
-                user=request.user,
+                user=access.user,
                 role='player'
             )
             
@@ -186,14 +271,18 @@ def join_world(request):
 
 
 @login_required
-def delete_world(request, world_id):
+async def delete_world(request, world_id):
     """API endpoint to delete a world (owner only)"""
     if request.method == 'POST':
         try:
-            world = World.objects.get(id=world_id, owner=request.user)
+            access = await WorldAccess.afor_request(request)
+            if not access.is_owner(world_id):
+                raise World.DoesNotExist
+            world = await World.objects.aget(id=world_id, is_active=True)
             
-            # Delete the world (this will cascade to related objects)
-            world.delete()
+            # Hide the world now; its categories and members are purged in
+            # the background (see core.deletion)
+            await sync_to_async(soft_delete_world)(world)
             
             return JsonResponse({
                 'success': True,
@@ -215,14 +304,15 @@ def delete_world(request, world_id):
 
 
 @login_required
-def leave_world(request, world_id):
+async def leave_world(request, world_id):
     """API endpoint to leave a world (player only)"""
     if request.method == 'POST':
         try:
-            world = World.objects.get(id=world_id)
+            world = await World.objects.aget(id=world_id, is_active=True)
             
             # Check if user is the owner
-            if world.owner == request.user:
+            access = await WorldAccess.afor_request(request)
+            if access.is_owner(world.id):
                 return JsonResponse({
                     'success': False,
                     'error': 'World owners cannot leave their own world. Use delete instead.'
@@ -230,8 +320,8 @@ def leave_world(request, world_id):
             
             # Check if user is a member
             try:
-                world_user = WorldUser.objects.get(world=world, user=request.user)
-                world_user.delete()
+                world_user = await WorldUser.objects.aget(world=world, user=access.user)
+                await world_user.adelete()
                 
                 return JsonResponse({
                     'success': True,
@@ -259,7 +349,7 @@ def leave_world(request, world_id):
 
 
 @login_required
-def create_world(request):
+async def create_world(request):
     """API endpoint to create a new world"""
     if request.method == 'POST':
         world_name = request.POST.get('world_name', '').strip()
@@ -278,22 +368,10 @@ def create_world(request):
             }, status=400)
         
         try:
-            # Generate a unique join code
-            import random
-            import string
-            
-            def generate_join_code():
-                return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-            
-            join_code = generate_join_code()
-            while World.objects.filter(join_code=join_code).exists():
-                join_code = generate_join_code()
-            
-            # Create the world
-            world = World.objects.create(
+            # Create the world (World.save allocates a unique join code)
+            world = await World.objects.acreate(
                 name=world_name,
-                owner=request.user,
-                join_code=join_code,
+                owner=await request.auser(),
                 theme_color=theme_color,
                 is_active=True
             )
@@ -316,3 +394,262 @@ def create_world(request):
             }, status=500)
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+
+@login_required
+async def export_world(request, world_id):
+    """API endpoint to download a world as JSON Lines (owner only), streamed as it is read"""
+    access = await WorldAccess.afor_request(request)
+    world = None
+    if access.is_owner(world_id):
+        world = await World.objects.select_related('owner').filter(pk=world_id, is_active=True).afirst()
+    if world is None:
+        return JsonResponse({'error': 'World not found or you do not have permission to export it.'}, status=404)
+    
+    # Either handler buffers an iterator of the other kind in full
+    lines = transfer.aexport_world(world) if isinstance(request, ASGIRequest) else transfer.export_world(world)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="world-{world.id}.jsonl"'
+    return response
+
+
+@login_required
+def import_world(request):
+    """
+    API endpoint to create a world, owned by the user, from a JSON Lines
+    export sent as the request body. Members are matched by username.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    max_size = transfer.max_import_size()
+    if int(request.META.get('CONTENT_LENGTH') or 0) > max_size:
+        return JsonResponse({
+            'success': False,
+            'error': f'Exports can be at most {max_size // 2**20} MB.'
+        }, status=413)
+    
+    # Received in full before the import takes the write lock, so a slow
+    # client can't hold it
+    with tempfile.SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as body:
+        shutil.copyfileobj(request, body)
+        body.seek(0)
+        try:
+            world, categories, members, missing = transfer.import_world(body, request.user)
+        except transfer.WorldImportError as error:
+            return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'World "{world.name}" has been imported.',
+        'world': {
+            'id': world.id,
+            'name': world.name,
+            'join_code': world.join_code,
+            'theme_color': world.theme_color,
+        },
+        'categories': categories,
+        'members': members,
+        'missing_members': missing,
+    })
+
+
+@login_required
+def move_categories(request, world_id):
+    """
+    API endpoint to apply a batch of category moves from drag and drop
+    (authors only). The JSON body is ``{"moves": [{"id", "parent", "after"
+    or "before"}, ...]}``; the batch applies in full or not at all.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    if not WorldAccess.for_request(request).can_see_hidden(world_id):
+        return JsonResponse({
+            'success': False,
+            'error': 'World not found or you do not have permission to organize it.'
+        }, status=404)
+    
+    try:
+        moves = json.loads(request.body).get('moves')
+    except (ValueError, AttributeError):
+        moves = None
+    try:
+        moved = reordering.move_categories(world_id, moves)
+    except reordering.MoveError as error:
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'categories': [
+            {'id': category.id, 'parent': category.parent_id, 'rank': category.rank, 'depth': category.depth}
+            for category in moved
+        ],
+    })
+
+
+@read_only
+@login_required
+def sync(request):
+    """
+    API endpoint for the changes since ``since``, a cursor from a page or an
+    earlier sync: changed world cards and categories the user can see, and
+    the ids of those to remove. ``reset`` means the cursor is too old and
+    the client should reload.
+    """
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        since = -1
+    if since < 0:
+        return JsonResponse({'error': 'since must be a cursor from an earlier response'}, status=400)
+    return JsonResponse(changes.changes_since(WorldAccess.for_request(request), since))
+
+
+API_ENTRY_LINK_FIELDS = ('id', 'title', 'entry_type', 'summary')
+
+
+def serialize_linked_entry(entry, *extra):
+    return {field: getattr(entry, field) for field in API_ENTRY_LINK_FIELDS + extra}
+
+
+@read_only
+@login_required
+def api_entry_links(request, world_id, entry_id):
+    """
+    API endpoint for an entry's link graph: the entries that link to it, and
+    every entry within ``hops`` links following links ``out``, ``in`` or
+    ``both`` ways (the ``direction`` parameter).
+    """
+    access = WorldAccess.for_request(request)
+    if not access.can_view(world_id):
+        return JsonResponse({'error': 'World not found'}, status=404)
+    
+    direction = request.GET.get('direction', 'both')
+    try:
+        hops = int(request.GET.get('hops', 2))
+    except ValueError:
+        hops = 0
+    if not 1 <= hops <= references.MAX_HOPS or direction not in references.DIRECTIONS:
+        return JsonResponse({
+            'error': f'hops must be 1 to {references.MAX_HOPS} and direction one of {", ".join(references.DIRECTIONS)}'
+        }, status=400)
+    
+    include_hidden = access.can_see_hidden(world_id)
+    entry = Entry.objects.for_listing().filter(pk=entry_id, world_id=world_id).first()
+    if entry is None or (entry.is_hidden and not include_hidden):
+        return JsonResponse({'error': 'Entry not found'}, status=404)
+    
+    return JsonResponse({
+        'entry': serialize_linked_entry(entry),
+        'backlinks': [
+            serialize_linked_entry(linked, 'reference_type', 'context')
+            for linked in references.backlinks(entry.id, include_hidden)
+        ],
+        'neighborhood': [
+            serialize_linked_entry(linked, 'depth')
+            for linked in references.neighborhood(entry.id, hops, direction, include_hidden)
+        ],
+    })
+
+
+def serialize_media(media):
+    return {
+        'id': media.id,
+        'filename': media.filename,
+        'size': media.file_size,
+        'mime_type': media.mime_type,
+        'digest': media.file_id,
+        'entry_id': media.entry_id,
+        'url': reverse('core:media_file', args=[media.world_id, media.id]),
+    }
+
+
+@csrf_exempt
+@login_required
+def upload_media(request, world_id):
+    """
+    API endpoint to upload a file to a world (authors only). The file is
+    streamed to disk and hashed as it arrives, so the CSRF check, which
+    reads the body, only runs once the upload handler is in place.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    if not WorldAccess.for_request(request).can_see_hidden(world_id):
+        return JsonResponse({
+            'success': False,
+            'error': 'World not found or you do not have permission to upload to it.'
+        }, status=404)
+    
+    handler = media_store.HashingUploadHandler(request)
+    too_large = JsonResponse({
+        'success': False,
+        'error': f'Files can be at most {handler.max_size // 2**20} MB.'
+    }, status=413)
+    if int(request.META.get('CONTENT_LENGTH') or 0) > handler.max_size + media_store.MULTIPART_OVERHEAD:
+        return too_large
+    
+    request.upload_handlers = [handler]
+    try:
+        response = _store_upload(request, world_id)
+        return too_large if handler.too_large else response
+    finally:
+        handler.discard()
+
+
+@csrf_protect
+def _store_upload(request, world_id):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Please choose a file to upload.'}, status=400)
+    
+    entry_id = request.POST.get('entry_id') or None
+    if entry_id is not None:
+        entry_id = int(entry_id) if entry_id.isdigit() else None
+        if entry_id is None or not Entry.objects.filter(pk=entry_id, world_id=world_id).exists():
+            return JsonResponse({'success': False, 'error': 'Entry not found in this world.'}, status=400)
+    
+    media, deduplicated = media_store.store(upload, world_id, request.user, entry_id)
+    return JsonResponse({
+        'success': True,
+        'media': serialize_media(media),
+        'deduplicated': deduplicated,
+    })
+
+
+@login_required
+async def delete_media(request, world_id, media_id):
+    """API endpoint to remove a file from a world (authors only)"""
+    if request.method == 'POST':
+        access = await WorldAccess.afor_request(request)
+        deleted = 0
+        if access.can_see_hidden(world_id):
+            # Unused bytes are removed by media garbage collection
+            deleted, _ = await Media.objects.filter(pk=media_id, world_id=world_id).adelete()
+        if not deleted:
+            return JsonResponse({
+                'success': False,
+                'error': 'Media not found or you do not have permission to delete it.'
+            }, status=404)
+        return JsonResponse({'success': True})
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+
+@read_only
+@login_required
+def media_file(request, world_id, media_id):
+    """Serve a world's media file, answering conditional and Range requests"""
+    access = WorldAccess.for_request(request)
+    if not access.can_view(world_id):
+        raise Http404("Media not found")
+    media = Media.objects.annotate(entry_is_hidden=F('entry__is_hidden')).filter(pk=media_id, world_id=world_id).first()
+    if media is None or (media.entry_is_hidden and not access.can_see_hidden(world_id)):
+        raise Http404("Media not found")
+    return media_store.serve(request, media)
+
+
+@login_required
+def metrics(request):
+    """Prometheus endpoint for the per-view request metrics (staff only)"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
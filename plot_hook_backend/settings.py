@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,9 +26,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-+6i=90nomqls=i*&-y+iecpy#uuezsni21s!+=as-gnya&fj#&'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Set DJANGO_DEBUG=0 in production
+DEBUG = os.environ.get('DJANGO_DEBUG', '1').lower() not in ('0', 'false', 'no')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -42,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -55,15 +61,24 @@ ROOT_URLCONF = 'plot_hook_backend.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates are compiled once per process. Under runserver the
+            # autoreloader clears this cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+            # Node-level debug information is only needed for DEBUG error pages
+            'debug': DEBUG,
         },
     },
 ]
@@ -74,13 +89,91 @@ WSGI_APPLICATION = 'plot_hook_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Production SQLite profile: WAL lets readers run alongside the single
+# writer, IMMEDIATE transactions take the write lock up front instead of
+# failing with "database is locked" on upgrade, and connections persist
+# across requests. The pragmas run on every new connection.
+SQLITE_PRAGMAS = [
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=268435456',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(['PRAGMA journal_mode=WAL', *SQLITE_PRAGMAS]),
+        },
+    },
+    # Read-only connection to the same file, used for read-only views by
+    # core.db_routers.ReadReplicaRouter so readers never queue behind writes
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join([*SQLITE_PRAGMAS, 'PRAGMA query_only=1']),
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['core.db_routers.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Sessions, logged-in users, world access maps and fragment versions are
+# cached, and a logout, password change or membership change only
+# invalidates the cache of the process that made it. Every worker must
+# therefore share one cache: set DJANGO_CACHE_BACKEND and
+# DJANGO_CACHE_LOCATION, e.g. django.core.cache.backends.redis.RedisCache
+# and redis://127.0.0.1:6379/0. The per-process local-memory default is only
+# allowed with DEBUG.
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', LOCMEM_CACHE)
+CACHE_LOCATION = os.environ.get('DJANGO_CACHE_LOCATION', '')
+if CACHE_BACKEND == LOCMEM_CACHE and not DEBUG:
+    raise ImproperlyConfigured("Set DJANGO_CACHE_BACKEND to a cache shared by every worker when DEBUG is off.")
+
+
+def _cache(name, **options):
+    """A cache alias; aliases share the configured cache under their own key prefix"""
+    if CACHE_BACKEND == LOCMEM_CACHE:
+        return {'BACKEND': LOCMEM_CACHE, 'LOCATION': f'plot-hook-{name}', 'OPTIONS': options}
+    return {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': name}
+
+
+CACHES = {
+    'default': _cache('default'),
+    # Kept apart so application cache churn never evicts sessions
+    'sessions': _cache('sessions', MAX_ENTRIES=10000),
+    # Rendered world and category cards and their versions (core.fragments)
+    'fragments': _cache('fragments', MAX_ENTRIES=10000),
 }
 
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Collaborative editing (core.collab). The local broker serves one ASGI
+# worker; with several, run `manage.py collab_broker` and use
+# {'BACKEND': 'core.collab.SocketBroker', 'OPTIONS': {'path': '/run/plothook/collab.sock'}}
+COLLAB_BROKER = {
+    'BACKEND': 'core.collab.LocalBroker',
+}
+# How often buffered steps and cursor updates are sent to each socket
+COLLAB_TICK_MS = 16
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -100,6 +193,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher encodes new passwords. It stands in for Django's PBKDF2
+# hasher (same algorithm name); hashes made by the others, or with a
+# different PBKDF2_ITERATIONS, are re-encoded on their owner's next login
+PASSWORD_HASHERS = [
+    'accounts.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Work factor for accounts.hashers.PBKDF2PasswordHasher; measure it for the
+# deployment hardware with `manage.py calibrate_hashers`
+PBKDF2_ITERATIONS = 1_000_000
+
+# Threads that hash passwords for async login and signup (default: CPU count, at most 8)
+PASSWORD_HASHING_WORKERS = None
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -120,6 +231,27 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# `manage.py collectstatic` minifies, hashes and gzips the assets into
+# STATIC_ROOT, and core.middleware.StaticAssetMiddleware serves them
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Uploaded world media (core.media): stored once per SHA-256 digest under
+# MEDIA_ROOT/blobs and served through core.views.media_file
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_MAX_UPLOAD_SIZE = 512 * 1024 * 1024
+
+# Largest world export /api/worlds/import/ accepts (see core.transfer)
+WORLD_IMPORT_MAX_SIZE = 256 * 1024 * 1024
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.assets.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -128,6 +260,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Authentication settings
 AUTH_USER_MODEL = 'accounts.User'
+AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
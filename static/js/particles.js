@@ -0,0 +1,310 @@
+// Particle background for app pages
+//
+// PlotHookParticles.start(container) draws drifting, colliding particles on a
+// canvas behind the container's content. The engine:
+// - finds colliding pairs with a uniform grid, so each frame costs roughly
+//   O(particles) instead of comparing every pair
+// - draws particles in a few batched paths (one per opacity level) instead of
+//   one path and save/restore per particle
+// - stops animating while the tab is hidden
+// - measures how long each frame's work takes and sheds or restores particles
+//   to stay within FRAME_BUDGET_MS
+window.PlotHookParticles = (function() {
+    const MAX_PARTICLES = 500;
+    const MIN_PARTICLES = 60;
+    const PARTICLE_DENSITY = 0.0001; // particles per pixel
+    const MAX_SIZE = 1.15;
+    const MAX_SPEED = 0.8;
+    const OPACITY_LEVELS = 8;
+    const BACKGROUND = '#1a1a1a';
+    
+    // Collisions only happen within 2 * MAX_SIZE, so a particle's partners
+    // are all in its own or a neighbouring cell
+    const CELL_SIZE = Math.max(8, Math.ceil(2 * MAX_SIZE));
+    
+    // Particle work should leave most of a 60fps frame to the page
+    const FRAME_BUDGET_MS = 4;
+    const ADAPT_EVERY_FRAMES = 30;
+    
+    const systems = new WeakMap();
+    
+    function createParticle(width, height) {
+        const size = Math.random() * 1.0 + 0.15; // 0.15 to 1.15 pixels
+        const opacity = Math.random() * 0.15 + 0.025; // 0.025 to 0.175
+        return {
+            x: Math.random() * width,
+            y: Math.random() * height,
+            vx: (Math.random() - 0.5) * 0.6,
+            vy: (Math.random() - 0.5) * 0.6,
+            size: size,
+            cx: 0,
+            cy: 0,
+            level: Math.min(OPACITY_LEVELS - 1, Math.floor((opacity - 0.025) / 0.15 * OPACITY_LEVELS))
+        };
+    }
+    
+    function levelOpacity(level) {
+        return 0.025 + (level + 0.5) * 0.15 / OPACITY_LEVELS;
+    }
+    
+    function updateParticle(p, width, height) {
+        p.x += p.vx;
+        p.y += p.vy;
+        
+        // Bounce off walls
+        if (p.x <= p.size || p.x >= width - p.size) {
+            p.vx = -p.vx;
+            p.x = Math.max(p.size, Math.min(width - p.size, p.x));
+        }
+        if (p.y <= p.size || p.y >= height - p.size) {
+            p.vy = -p.vy;
+            p.y = Math.max(p.size, Math.min(height - p.size, p.y));
+        }
+        
+        // Add slight random movement, then limit velocity
+        p.vx = Math.max(-MAX_SPEED, Math.min(MAX_SPEED, p.vx + (Math.random() - 0.5) * 0.01));
+        p.vy = Math.max(-MAX_SPEED, Math.min(MAX_SPEED, p.vy + (Math.random() - 0.5) * 0.01));
+    }
+    
+    // Elastic collision between two overlapping particles
+    function collide(a, b) {
+        const dx = a.x - b.x;
+        const dy = a.y - b.y;
+        const reach = a.size + b.size;
+        const distanceSquared = dx * dx + dy * dy;
+        if (distanceSquared >= reach * reach || distanceSquared === 0) return;
+        
+        const distance = Math.sqrt(distanceSquared);
+        const nx = dx / distance;
+        const ny = dy / distance;
+        const speed = (a.vx - b.vx) * nx + (a.vy - b.vy) * ny;
+        if (speed < 0) return; // Already moving apart
+        
+        const impulse = 2 * speed / reach;
+        a.vx -= impulse * b.size * nx;
+        a.vy -= impulse * b.size * ny;
+        b.vx += impulse * a.size * nx;
+        b.vy += impulse * a.size * ny;
+        
+        // Separate particles to prevent sticking
+        const separation = (reach - distance) * 0.5;
+        a.x += nx * separation;
+        a.y += ny * separation;
+        b.x -= nx * separation;
+        b.y -= ny * separation;
+    }
+    
+    function createSystem(container) {
+        const canvas = document.createElement('canvas');
+        canvas.className = 'particle-canvas';
+        canvas.style.cssText = `
+            position: absolute;
+            top: 0;
+            left: 0;
+            width: 100%;
+            height: 100%;
+            pointer-events: none;
+            z-index: 0;
+        `;
+        container.insertBefore(canvas, container.firstChild);
+        
+        const system = {
+            canvas: canvas,
+            ctx: canvas.getContext('2d'),
+            particles: [],
+            target: MAX_PARTICLES,
+            frameId: null,
+            workMs: 0,
+            frames: 0,
+            cols: 0,
+            rows: 0,
+            head: null,
+            next: null
+        };
+        
+        resize(system, container);
+        for (let i = 0; i < system.target; i++) {
+            system.particles.push(createParticle(canvas.width, canvas.height));
+        }
+        return system;
+    }
+    
+    function resize(system, container) {
+        const canvas = system.canvas;
+        canvas.width = container.offsetWidth;
+        canvas.height = container.offsetHeight;
+        
+        // Larger areas get more particles, up to what the frame budget allows
+        const areaTarget = Math.floor(canvas.width * canvas.height * PARTICLE_DENSITY);
+        system.target = Math.max(system.target, Math.min(areaTarget, MAX_PARTICLES * 4));
+        system.particles.forEach(p => {
+            p.x = Math.random() * canvas.width;
+            p.y = Math.random() * canvas.height;
+        });
+        
+        system.cols = Math.ceil(canvas.width / CELL_SIZE) + 1;
+        system.rows = Math.ceil(canvas.height / CELL_SIZE) + 1;
+        system.head = new Int32Array(system.cols * system.rows);
+    }
+    
+    function handleCollisions(system) {
+        const particles = system.particles;
+        const cols = system.cols;
+        const rows = system.rows;
+        const head = system.head;
+        if (!system.next || system.next.length < particles.length) {
+            system.next = new Int32Array(Math.max(particles.length, MAX_PARTICLES));
+        }
+        const next = system.next;
+        
+        // Bucket particles into cells as linked lists: head[cell] is the
+        // first particle in the cell, next[i] the one after particle i
+        // (collisions can push a particle just past the edge, so clamp)
+        head.fill(-1);
+        for (let i = 0; i < particles.length; i++) {
+            const p = particles[i];
+            p.cx = Math.max(0, Math.min(cols - 1, Math.floor(p.x / CELL_SIZE)));
+            p.cy = Math.max(0, Math.min(rows - 1, Math.floor(p.y / CELL_SIZE)));
+            const cell = p.cy * cols + p.cx;
+            next[i] = head[cell];
+            head[cell] = i;
+        }
+        
+        // Each pair is checked once: later particles in the same cell, then
+        // the right, lower-left, lower and lower-right neighbour cells
+        for (let i = 0; i < particles.length; i++) {
+            const p = particles[i];
+            const cx = p.cx;
+            const cy = p.cy;
+            for (let j = next[i]; j !== -1; j = next[j]) {
+                collide(p, particles[j]);
+            }
+            if (cx + 1 < cols) {
+                for (let j = head[cy * cols + cx + 1]; j !== -1; j = next[j]) {
+                    collide(p, particles[j]);
+                }
+            }
+            if (cy + 1 < rows) {
+                const below = (cy + 1) * cols;
+                for (let nx = Math.max(0, cx - 1); nx <= Math.min(cols - 1, cx + 1); nx++) {
+                    for (let j = head[below + nx]; j !== -1; j = next[j]) {
+                        collide(p, particles[j]);
+                    }
+                }
+            }
+        }
+    }
+    
+    function draw(system) {
+        const ctx = system.ctx;
+        const canvas = system.canvas;
+        ctx.globalAlpha = 1;
+        ctx.fillStyle = BACKGROUND;
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        
+        ctx.fillStyle = '#ffffff';
+        for (let level = 0; level < OPACITY_LEVELS; level++) {
+            ctx.globalAlpha = levelOpacity(level);
+            ctx.beginPath();
+            for (const p of system.particles) {
+                if (p.level !== level) continue;
+                ctx.moveTo(p.x + p.size, p.y);
+                ctx.arc(p.x, p.y, p.size, 0, Math.PI * 2);
+            }
+            ctx.fill();
+        }
+        ctx.globalAlpha = 1;
+    }
+    
+    // Shed particles when frames run over budget, add them back when there
+    // is room again
+    function adapt(system) {
+        const particles = system.particles;
+        const canvas = system.canvas;
+        if (system.workMs > FRAME_BUDGET_MS && particles.length > MIN_PARTICLES) {
+            particles.length = Math.max(MIN_PARTICLES, Math.floor(particles.length * 0.85));
+        } else if (system.workMs < FRAME_BUDGET_MS / 2 && particles.length < system.target) {
+            const count = Math.min(system.target, Math.ceil(particles.length * 1.05) + 1);
+            while (particles.length < count) {
+                particles.push(createParticle(canvas.width, canvas.height));
+            }
+        }
+    }
+    
+    function step(system) {
+        const started = performance.now();
+        const canvas = system.canvas;
+        for (const p of system.particles) {
+            updateParticle(p, canvas.width, canvas.height);
+        }
+        handleCollisions(system);
+        draw(system);
+        
+        // Exponential moving average of the work per frame
+        system.workMs += (performance.now() - started - system.workMs) * 0.1;
+        system.frames += 1;
+        if (system.frames % ADAPT_EVERY_FRAMES === 0) {
+            adapt(system);
+        }
+    }
+    
+    function run(system) {
+        if (system.frameId !== null) return;
+        const loop = function() {
+            step(system);
+            system.frameId = requestAnimationFrame(loop);
+        };
+        system.frameId = requestAnimationFrame(loop);
+    }
+    
+    function stop(system) {
+        if (system.frameId === null) return;
+        cancelAnimationFrame(system.frameId);
+        system.frameId = null;
+    }
+    
+    function start(container) {
+        if (!container || systems.has(container)) return systems.get(container);
+        
+        const system = createSystem(container);
+        systems.set(container, system);
+        
+        let resizeFrame = null;
+        window.addEventListener('resize', () => {
+            if (resizeFrame !== null) return;
+            resizeFrame = requestAnimationFrame(() => {
+                resizeFrame = null;
+                resize(system, container);
+                if (system.frameId === null) {
+                    // Resizing clears the canvas; redraw it while paused
+                    draw(system);
+                }
+            });
+        });
+        
+        if (window.matchMedia && window.matchMedia('(prefers-reduced-motion: reduce)').matches) {
+            step(system);
+            return system;
+        }
+        
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) {
+                stop(system);
+            } else {
+                run(system);
+            }
+        });
+        if (!document.hidden) {
+            run(system);
+        }
+        return system;
+    }
+    
+    return {
+        start: start,
+        stop: function(container) {
+            const system = systems.get(container);
+            if (system) stop(system);
+        }
+    };
+})();
@@ -16,6 +16,12 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize sidebar toggle functionality
     initializeSidebarToggle();
+    
+    // Initialize auto-saving preference forms
+    initializePreferenceForms();
+    
+    // Initialize live card updates
+    initializeLiveSync();
 });
 
 function initializeDropdowns() {
@@ -92,9 +98,12 @@ function initializeSearch() {
     const joinButton = document.querySelector('.join-button');
     
     if (searchInput) {
+        let searchTimer = null;
         searchInput.addEventListener('input', function(e) {
-            const searchTerm = e.target.value.toLowerCase();
-            performSearch(searchTerm);
+            const searchTerm = e.target.value.trim();
+            // Debounce so a burst of keystrokes becomes a single request
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => performSearch(searchTerm), 200);
         });
         
         // Add placeholder animation
@@ -193,10 +202,8 @@ function handleJoinCode() {
                     // Clear input
                     joinInput.value = '';
                     
-                    // Reload page after a short delay to show the new world
-                    setTimeout(() => {
-                        window.location.reload();
-                    }, 1500);
+                    // Add the new world's card from the change log
+                    syncCards();
                 } else {
                     // Show error message
                     joinMessage.textContent = data.error;
@@ -219,36 +226,109 @@ function handleJoinCode() {
     }
 }
 
-function performSearch(searchTerm) {
-    // Get all navigation items
-    const navItems = document.querySelectorAll('.nav-item, .sub-nav-item, .sub-sub-nav-item');
+let searchController = null;
+
+function performSearch(searchTerm, page = 1) {
+    const resultsPanel = getSearchResultsPanel();
+    if (!resultsPanel) return;
     
-    navItems.forEach(item => {
-        const text = item.querySelector('.nav-item-text').textContent.toLowerCase();
-        const shouldShow = text.includes(searchTerm);
-        
-        if (searchTerm === '') {
-            item.style.display = 'flex';
-            item.style.opacity = '1';
-        } else {
-            if (shouldShow) {
-                item.style.display = 'flex';
-                item.style.opacity = '1';
-                // Highlight the matching text
-                highlightText(item, searchTerm);
-            } else {
-                item.style.opacity = '0.3';
-            }
+    // Cancel any request still in flight for an older search term
+    if (searchController) {
+        searchController.abort();
+    }
+    
+    if (searchTerm === '') {
+        searchController = null;
+        resultsPanel.innerHTML = '';
+        resultsPanel.style.display = 'none';
+        return;
+    }
+    
+    searchController = new AbortController();
+    const params = new URLSearchParams({ q: searchTerm, page: page });
+    
+    fetch(`/search/?${params}`, { signal: searchController.signal })
+    .then(response => response.json())
+    .then(data => renderSearchResults(resultsPanel, data, page > 1))
+    .catch(error => {
+        if (error.name !== 'AbortError') {
+            console.error('Error searching:', error);
         }
     });
 }
 
-function highlightText(element, searchTerm) {
-    const textElement = element.querySelector('.nav-item-text');
-    if (textElement) {
-        const text = textElement.textContent;
-        const regex = new RegExp(`(${searchTerm})`, 'gi');
-        textElement.innerHTML = text.replace(regex, '<mark style="background-color: #8b7355; color: white; padding: 1px 2px; border-radius: 2px;">$1</mark>');
+function getSearchResultsPanel() {
+    let resultsPanel = document.querySelector('.search-results');
+    if (!resultsPanel) {
+        const searchSection = document.querySelector('.search-section');
+        if (!searchSection) return null;
+        
+        resultsPanel = document.createElement('div');
+        resultsPanel.className = 'search-results';
+        searchSection.appendChild(resultsPanel);
+    }
+    return resultsPanel;
+}
+
+function renderSearchResults(resultsPanel, data, append) {
+    // Name and description snippets arrive HTML-escaped with <mark> highlights
+    const items = data.results.map(result => `
+        <a href="${result.url}" class="search-result">
+            <span class="search-result-type">${result.type === 'world' ? '🌍' : '📚'}</span>
+            <span class="search-result-body">
+                <span class="search-result-name">${result.name}</span>
+                ${result.description ? `<span class="search-result-description">${result.description}</span>` : ''}
+            </span>
+        </a>
+    `).join('');
+    
+    const existingMore = resultsPanel.querySelector('.search-more');
+    if (existingMore) {
+        existingMore.remove();
+    }
+    
+    if (append) {
+        resultsPanel.insertAdjacentHTML('beforeend', items);
+    } else {
+        resultsPanel.innerHTML = items || '<div class="search-empty">No results found</div>';
+    }
+    
+    if (data.has_next) {
+        const moreButton = document.createElement('button');
+        moreButton.type = 'button';
+        moreButton.className = 'search-more';
+        moreButton.textContent = 'More results';
+        moreButton.addEventListener('click', () => performSearch(data.search_term, data.page + 1));
+        resultsPanel.appendChild(moreButton);
+    }
+    
+    resultsPanel.style.display = 'block';
+}
+
+function bindWorldCard(card) {
+    // Handle card click (navigate to world)
+    card.addEventListener('click', function(e) {
+        // Don't navigate if clicking on menu button
+        if (e.target.closest('.campaign-menu')) {
+            return;
+        }
+        
+        const menuButton = this.querySelector('.campaign-menu');
+        if (menuButton) {
+            const worldId = menuButton.getAttribute('data-world-id');
+            if (worldId) {
+                window.location.href = `/worlds/${worldId}/`;
+            }
+        }
+    });
+    
+    // Handle menu button clicks
+    const menuButton = card.querySelector('.campaign-menu');
+    if (menuButton) {
+        menuButton.addEventListener('click', function(e) {
+            e.stopPropagation(); // Prevent card click
+            showWorldMenu(this);
+        });
     }
 }
 
@@ -262,32 +342,7 @@ function initializeCampaignCards() {
         return;
     }
     
-    campaignCards.forEach(card => {
-        // Handle card click (navigate to world)
-        card.addEventListener('click', function(e) {
-            // Don't navigate if clicking on menu button
-            if (e.target.closest('.campaign-menu')) {
-                return;
-            }
-            
-            const menuButton = this.querySelector('.campaign-menu');
-            if (menuButton) {
-                const worldId = menuButton.getAttribute('data-world-id');
-                if (worldId) {
-                    window.location.href = `/worlds/${worldId}/`;
-                }
-            }
-        });
-        
-        // Handle menu button clicks
-        const menuButton = card.querySelector('.campaign-menu');
-        if (menuButton) {
-            menuButton.addEventListener('click', function(e) {
-                e.stopPropagation(); // Prevent card click
-                showWorldMenu(this);
-            });
-        }
-    });
+    campaignCards.forEach(bindWorldCard);
     
     if (createCard) {
         createCard.addEventListener('click', function() {
@@ -318,196 +373,11 @@ function setActiveNavItem(activeElement) {
 }
 
 function initializeAnimatedBackground() {
+    // The engine lives in particles.js; start() ignores repeat calls
     const mainContent = document.querySelector('.main-content');
-    if (!mainContent) return;
-    
-    // Create canvas for particle system
-    const canvas = document.createElement('canvas');
-    canvas.className = 'particle-canvas';
-    canvas.style.cssText = `
-        position: absolute;
-        top: 0;
-        left: 0;
-        width: 100%;
-        height: 100%;
-        pointer-events: none;
-        z-index: 0;
-    `;
-    
-    // Insert canvas before the first child
-    mainContent.insertBefore(canvas, mainContent.firstChild);
-    
-    const ctx = canvas.getContext('2d');
-    
-    // Set canvas size
-    function resizeCanvas() {
-        canvas.width = mainContent.offsetWidth;
-        canvas.height = mainContent.offsetHeight;
-    }
-    
-    // Function to create a new particle
-    function createParticle() {
-        const size = Math.random() * 1.0 + 0.15; // 0.15 to 1.15 pixels
-        const opacity = Math.random() * 0.15 + 0.025; // 0.025 to 0.175
-        const x = Math.random() * canvas.width;
-        const y = Math.random() * canvas.height;
-        
-        return new Particle(x, y, size, opacity);
-    }
+    if (!mainContent || !window.PlotHookParticles) return;
     
-    // Function to add particles if needed after resize
-    function addParticlesIfNeeded() {
-        const currentArea = canvas.width * canvas.height;
-        const targetParticleDensity = 0.0001; // particles per pixel
-        const targetParticleCount = Math.floor(currentArea * targetParticleDensity);
-        
-        // Reposition existing particles to fill the new canvas area
-        particles.forEach(particle => {
-            particle.x = Math.random() * canvas.width;
-            particle.y = Math.random() * canvas.height;
-        });
-        
-        // Add particles if we have fewer than the target
-        while (particles.length < targetParticleCount) {
-            particles.push(createParticle());
-        }
-    }
-    
-    resizeCanvas();
-    window.addEventListener('resize', () => {
-        resizeCanvas();
-        addParticlesIfNeeded();
-    });
-    
-    // Particle class
-    class Particle {
-        constructor(x, y, size, opacity) {
-            this.x = x;
-            this.y = y;
-            this.size = size;
-            this.opacity = opacity;
-            this.vx = (Math.random() - 0.5) * 0.6; // Increased velocity X (-0.3 to 0.3)
-            this.vy = (Math.random() - 0.5) * 0.6; // Increased velocity Y (-0.3 to 0.3)
-            this.originalSize = size;
-            this.originalOpacity = opacity;
-        }
-        
-        update() {
-            // Update position
-            this.x += this.vx;
-            this.y += this.vy;
-            
-            // Bounce off walls
-            if (this.x <= this.size || this.x >= canvas.width - this.size) {
-                this.vx = -this.vx;
-                this.x = Math.max(this.size, Math.min(canvas.width - this.size, this.x));
-            }
-            
-            if (this.y <= this.size || this.y >= canvas.height - this.size) {
-                this.vy = -this.vy;
-                this.y = Math.max(this.size, Math.min(canvas.height - this.size, this.y));
-            }
-            
-            // Add slight random movement
-            this.vx += (Math.random() - 0.5) * 0.01;
-            this.vy += (Math.random() - 0.5) * 0.01;
-            
-            // Limit velocity
-            this.vx = Math.max(-0.8, Math.min(0.8, this.vx));
-            this.vy = Math.max(-0.8, Math.min(0.8, this.vy));
-        }
-        
-        draw() {
-            ctx.save();
-            ctx.globalAlpha = this.opacity;
-            ctx.fillStyle = '#ffffff';
-            ctx.beginPath();
-            ctx.arc(this.x, this.y, this.size, 0, Math.PI * 2);
-            ctx.fill();
-            ctx.restore();
-        }
-        
-        // Check collision with another particle
-        collidesWith(other) {
-            const dx = this.x - other.x;
-            const dy = this.y - other.y;
-            const distance = Math.sqrt(dx * dx + dy * dy);
-            return distance < (this.size + other.size);
-        }
-        
-        // Handle collision
-        handleCollision(other) {
-            const dx = this.x - other.x;
-            const dy = this.y - other.y;
-            const distance = Math.sqrt(dx * dx + dy * dy);
-            
-            if (distance === 0) return;
-            
-            // Normalize
-            const nx = dx / distance;
-            const ny = dy / distance;
-            
-            // Relative velocity
-            const relativeVelocityX = this.vx - other.vx;
-            const relativeVelocityY = this.vy - other.vy;
-            
-            // Calculate impulse
-            const speed = relativeVelocityX * nx + relativeVelocityY * ny;
-            
-            if (speed < 0) return; // Already moving apart
-            
-            // Elastic collision
-            const impulse = 2 * speed / (this.size + other.size);
-            
-            this.vx -= impulse * other.size * nx;
-            this.vy -= impulse * other.size * ny;
-            other.vx += impulse * this.size * nx;
-            other.vy += impulse * this.size * ny;
-            
-            // Separate particles to prevent sticking
-            const overlap = (this.size + other.size) - distance;
-            const separationX = nx * overlap * 0.5;
-            const separationY = ny * overlap * 0.5;
-            
-            this.x += separationX;
-            this.y += separationY;
-            other.x -= separationX;
-            other.y -= separationY;
-        }
-    }
-    
-    // Create particles with varying sizes and opacities
-    const particles = [];
-    
-    // Initial particle creation
-    for (let i = 0; i < 500; i++) {
-        particles.push(createParticle());
-    }
-    
-    // Animation loop
-    function animate() {
-        // Clear canvas with darker background
-        ctx.fillStyle = '#1a1a1a'; // Darker background for better particle visibility
-        ctx.fillRect(0, 0, canvas.width, canvas.height);
-        
-        // Update and draw particles
-        for (let i = 0; i < particles.length; i++) {
-            particles[i].update();
-            particles[i].draw();
-            
-            // Check collisions with other particles
-            for (let j = i + 1; j < particles.length; j++) {
-                if (particles[i].collidesWith(particles[j])) {
-                    particles[i].handleCollision(particles[j]);
-                }
-            }
-        }
-        
-        requestAnimationFrame(animate);
-    }
-    
-    // Start animation
-    animate();
+    window.PlotHookParticles.start(mainContent);
 }
 
 // Confirmation Modal Functions
@@ -604,8 +474,8 @@ function initializeConfirmationModal() {
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    // Reload page to reflect changes
-                    window.location.reload();
+                    // Patch the cards from the change log
+                    syncCards();
                                  } else {
                      // Show error message in console for debugging
                      console.error('Error deleting world:', data.error);
@@ -626,8 +496,8 @@ function initializeConfirmationModal() {
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    // Reload page to reflect changes
-                    window.location.reload();
+                    // Patch the cards from the change log
+                    syncCards();
                 } else {
                     console.error('Error leaving world:', data.error);
                 }
@@ -751,8 +621,8 @@ function leaveWorld(worldId) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            // Reload page to reflect changes
-            window.location.reload();
+            // Patch the cards from the change log
+            syncCards();
         } else {
             console.error('Error leaving world:', data.error);
         }
@@ -947,8 +817,8 @@ function createWorld() {
             // Hide modal
             hideCreateWorldModal();
             
-            // Reload page to show the new world
-            window.location.reload();
+            // Add the new world's card from the change log
+            syncCards();
         } else {
             console.error('Error creating world:', data.error);
         }
@@ -1120,10 +990,337 @@ function toggleSidebar() {
     console.log('Sidebar toggle: Saved state to localStorage:', !isCollapsed);
 }
 
+// Preference changes are held briefly and sent together, so a burst of
+// toggles becomes one request carrying only the values the user ended on
+const PREFERENCE_SAVE_DELAY = 400;
+let pendingPreferences = {};
+let preferenceTimer = null;
+
+function savePreference(name, value) {
+    pendingPreferences[name] = value;
+    clearTimeout(preferenceTimer);
+    preferenceTimer = setTimeout(flushPreferences, PREFERENCE_SAVE_DELAY);
+}
+
+function flushPreferences() {
+    const changes = pendingPreferences;
+    pendingPreferences = {};
+    preferenceTimer = null;
+    if (Object.keys(changes).length === 0) {
+        return Promise.resolve(null);
+    }
+    
+    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+    return fetch('/accounts/preferences/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': csrfToken,
+            'X-Requested-With': 'XMLHttpRequest',
+        },
+        body: new URLSearchParams(changes),
+        keepalive: true
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            console.error('Saving preferences failed:', data.error);
+        }
+        return data;
+    })
+    .catch(error => console.error('Saving preferences failed:', error));
+}
+
+function initializePreferenceForms() {
+    document.querySelectorAll('[data-preferences-form]').forEach(form => {
+        form.addEventListener('change', event => {
+            const input = event.target;
+            if (!input.name) {
+                return;
+            }
+            savePreference(input.name, input.type === 'checkbox' ? input.checked : input.value);
+        });
+    });
+    
+    // Don't drop a pending change when the user navigates away
+    window.addEventListener('pagehide', () => {
+        if (preferenceTimer) {
+            clearTimeout(preferenceTimer);
+            flushPreferences();
+        }
+    });
+}
+
+// Live sync: card lists are patched from /api/sync/ with the changes since
+// the cursor the page was rendered at, instead of reloading the page
+const SYNC_INTERVAL = 30000;
+let syncRequest = null;
+
+function initializeLiveSync() {
+    const grid = document.querySelector('[data-sync]');
+    if (!grid) {
+        return;
+    }
+    
+    setInterval(() => {
+        if (document.visibilityState === 'visible') {
+            syncCards();
+        }
+    }, SYNC_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible') {
+            syncCards();
+        }
+    });
+    window.addEventListener('focus', () => syncCards());
+}
+
+function syncCards() {
+    const grid = document.querySelector('[data-sync]');
+    if (!grid) {
+        return Promise.resolve();
+    }
+    // Callers share the request in flight rather than fetching the same page twice
+    if (!syncRequest) {
+        syncRequest = fetchChanges(grid).finally(() => {
+            syncRequest = null;
+        });
+    }
+    return syncRequest;
+}
+
+function fetchChanges(grid) {
+    const params = new URLSearchParams({ since: grid.dataset.syncCursor });
+    return fetch(`/api/sync/?${params}`, { headers: { 'Accept': 'application/json' } })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Sync failed with status ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        // The log was compacted past our cursor, so only a reload is complete
+        if (data.reset) {
+            window.location.reload();
+            return;
+        }
+        
+        if (grid.dataset.sync === 'worlds') {
+            patchWorldCards(grid, data);
+        } else if (!patchCategoryCards(grid, data)) {
+            return;
+        }
+        grid.dataset.syncCursor = data.cursor;
+        if (data.has_more) {
+            return fetchChanges(grid);
+        }
+    })
+    .catch(error => console.error('Error syncing:', error));
+}
+
+function patchWorldCards(grid, data) {
+    data.removed_worlds.forEach(worldId => {
+        const card = grid.querySelector(`.campaign-card[data-world-id="${worldId}"]`);
+        if (card) {
+            card.remove();
+        }
+    });
+    
+    data.worlds.forEach(world => {
+        const card = buildWorldCard(world);
+        const existing = grid.querySelector(`.campaign-card[data-world-id="${world.id}"]`);
+        if (existing) {
+            existing.replaceWith(card);
+            return;
+        }
+        
+        // Owned worlds come first, newest first, then joined ones
+        const firstCard = grid.querySelector('.campaign-card[data-world-id]');
+        const ownedMenus = grid.querySelectorAll('.campaign-menu[data-user-role="owner"]');
+        if (world.role === 'owner' || ownedMenus.length === 0) {
+            grid.insertBefore(card, firstCard || grid.querySelector('.create-card'));
+        } else {
+            ownedMenus[ownedMenus.length - 1].closest('.campaign-card').after(card);
+        }
+    });
+    
+    const emptyCard = grid.querySelector('.empty-worlds-card');
+    if (emptyCard && grid.querySelector('.campaign-card[data-world-id]')) {
+        emptyCard.remove();
+    }
+}
+
+function patchCategoryCards(grid, data) {
+    const worldId = Number(grid.dataset.worldId);
+    
+    // The world itself was deleted or is no longer shared with the user
+    if (data.removed_worlds.includes(worldId)) {
+        window.location.reload();
+        return false;
+    }
+    
+    data.removed_categories.forEach(categoryId => {
+        const card = grid.querySelector(`.campaign-card[data-category-id="${categoryId}"]`);
+        if (card) {
+            card.remove();
+        }
+    });
+    
+    data.categories.forEach(category => {
+        const existing = grid.querySelector(`.campaign-card[data-category-id="${category.id}"]`);
+        if (existing) {
+            existing.remove();
+        }
+        // Only this world's visible root categories have cards here
+        if (category.world_id !== worldId || category.parent_id !== null || category.is_hidden) {
+            return;
+        }
+        
+        const card = buildCategoryCard(category, worldId);
+        const next = Array.from(grid.querySelectorAll('.campaign-card[data-category-id]')).find(other => {
+            const rank = other.dataset.rank;
+            const name = other.querySelector('.campaign-title').textContent;
+            return rank > category.rank || (rank === category.rank && name > category.name);
+        });
+        grid.insertBefore(card, next || grid.querySelector('.create-card'));
+    });
+    
+    const emptyCard = grid.querySelector('.empty-worlds-card');
+    if (emptyCard && grid.querySelector('.campaign-card[data-category-id]')) {
+        emptyCard.remove();
+    }
+    return true;
+}
+
+function createElement(tagName, className, text) {
+    const element = document.createElement(tagName);
+    element.className = className;
+    if (text !== undefined) {
+        element.textContent = text;
+    }
+    return element;
+}
+
+function buildCard(badgeText, pattern) {
+    const card = createElement('div', 'campaign-card');
+    const patternElement = createElement('div', `campaign-pattern ${pattern.pattern}`);
+    patternElement.appendChild(createElement('div', `campaign-badge ${pattern.badge}`, badgeText.slice(0, 3).toUpperCase()));
+    card.appendChild(patternElement);
+    card.appendChild(createElement('div', 'campaign-info'));
+    return card;
+}
+
+function buildWorldCard(world) {
+    const card = buildCard(world.name, { pattern: 'pattern-world', badge: 'badge-world' });
+    card.dataset.worldId = world.id;
+    card.style.setProperty('--world-color', world.theme_color);
+    
+    const roleLabels = { owner: 'Creator', co_creator: 'Co-Creator' };
+    const memberLabel = world.member_count === 1 ? 'member' : 'members';
+    const categoryLabel = world.category_count === 1 ? 'category' : 'categories';
+    const info = card.querySelector('.campaign-info');
+    info.appendChild(createElement('div', 'campaign-title', world.name));
+    info.appendChild(createElement('div', 'campaign-stats', `${roleLabels[world.role] || 'Player'} • ${world.owner}`));
+    info.appendChild(createElement('div', 'campaign-stats',
+        `${world.member_count} ${memberLabel} • ${world.category_count} ${categoryLabel} • active ${timeSince(new Date(world.last_activity_at))} ago`));
+    
+    const menuButton = createElement('button', 'campaign-menu', '⋮');
+    menuButton.dataset.worldId = world.id;
+    menuButton.dataset.worldName = world.name;
+    menuButton.dataset.userRole = world.role === 'owner' ? 'owner' : 'player';
+    const actions = createElement('div', 'campaign-actions');
+    actions.appendChild(menuButton);
+    info.appendChild(actions);
+    
+    bindWorldCard(card);
+    return card;
+}
+
+function buildCategoryCard(category, worldId) {
+    const card = buildCard(category.name, { pattern: 'pattern-purple', badge: 'badge-purple' });
+    card.dataset.categoryId = category.id;
+    card.dataset.rank = category.rank;
+    
+    const info = card.querySelector('.campaign-info');
+    info.appendChild(createElement('div', 'campaign-title', category.name));
+    info.appendChild(createElement('div', 'campaign-stats', truncateWords(category.description, 15)));
+    
+    const menuButton = createElement('button', 'campaign-menu', '⋮');
+    menuButton.dataset.categoryId = category.id;
+    menuButton.dataset.categoryName = category.name;
+    const actions = createElement('div', 'campaign-actions');
+    actions.appendChild(menuButton);
+    info.appendChild(actions);
+    
+    bindCategoryCard(card, worldId);
+    return card;
+}
+
+function bindCategoryCard(card, worldId) {
+    card.addEventListener('click', function(e) {
+        // Don't navigate if clicking on menu button
+        if (e.target.closest('.campaign-menu')) {
+            return;
+        }
+        
+        // Navigate to category detail
+        const categoryId = this.querySelector('.campaign-menu').dataset.categoryId;
+        if (categoryId) {
+            window.location.href = `/worlds/${worldId}/categories/${categoryId}/`;
+        }
+    });
+    
+    // Handle menu button clicks (for future functionality)
+    const menuButton = card.querySelector('.campaign-menu');
+    if (menuButton) {
+        menuButton.addEventListener('click', function(e) {
+            e.stopPropagation(); // Prevent card click
+            console.log('Category menu clicked for:', this.dataset.categoryName);
+            // Add category menu functionality here
+        });
+    }
+}
+
+// Matches Django's truncatewords filter
+function truncateWords(text, count) {
+    const words = text.split(/\s+/).filter(word => word);
+    return words.length > count ? `${words.slice(0, count).join(' ')} …` : words.join(' ');
+}
+
+// Matches Django's timesince filter: the two largest adjacent units
+const TIME_UNITS = [
+    ['year', 365 * 24 * 60],
+    ['month', 30 * 24 * 60],
+    ['week', 7 * 24 * 60],
+    ['day', 24 * 60],
+    ['hour', 60],
+    ['minute', 1],
+];
+
+function timeSince(date) {
+    let minutes = Math.max(0, Math.floor((Date.now() - date.getTime()) / 60000));
+    const index = TIME_UNITS.findIndex(([, size]) => minutes >= size);
+    if (index === -1) {
+        return '0 minutes';
+    }
+    
+    const parts = [];
+    TIME_UNITS.slice(index, index + 2).forEach(([unit, size]) => {
+        const amount = Math.floor(minutes / size);
+        minutes -= amount * size;
+        if (amount > 0) {
+            parts.push(`${amount} ${unit}${amount === 1 ? '' : 's'}`);
+        }
+    });
+    return parts.join(', ');
+}
+
 // Export functions for potential use in other scripts
 window.PlotHook = {
     setActiveNavItem,
     performSearch,
+    syncCards,
+    savePreference,
     toggleDropdown,
     initializeAnimatedBackground,
     toggleSidebar